@@ -1,19 +1,37 @@
 from langgraph.graph import StateGraph, END
+from langgraph.types import Send
+from langchain_core.runnables import RunnableLambda
 from app.agent.state import AgentState
-from app.agent.nodes import parser_node, planner_node, batch_generator_node, aggregator_node
+from app.agent.nodes import (
+    parser_node, planner_node, aplanner_node,
+    generator_node, agenerator_node, aggregator_node
+)
 from app.services.debug_logger import DebugLogger
-from typing import Callable, Dict, Any
+from typing import Awaitable, Callable, Dict, Any, Optional
 
-def debug_wrapper(node_func: Callable, node_name: str):
+def debug_wrapper(node_func: Callable, node_name: str, anode_func: Optional[Callable[..., Awaitable[Dict]]] = None):
     """
     包装节点函数以增加 Debug 日志功能。
+    
+    如果提供了 `anode_func`，返回同时具备同步与异步实现的 Runnable:
+    `agent_app.invoke` 走同步版本，`agent_app.ainvoke` 走异步版本 (不阻塞事件循环)。
     """
     def wrapped_node(state: AgentState) -> Dict:
         result = node_func(state)
-        # 异步或同步写入日志
+        # 日志仅入队，由后台线程批量写入
+        DebugLogger.log_node_execution(node_name, state, result)
+        return result
+
+    if anode_func is None:
+        return wrapped_node
+
+    async def awrapped_node(state: AgentState) -> Dict:
+        result = await anode_func(state)
+        # 日志仅入队，由后台线程写入，不阻塞事件循环
         DebugLogger.log_node_execution(node_name, state, result)
         return result
-    return wrapped_node
+
+    return RunnableLambda(wrapped_node, afunc=awrapped_node, name=node_name)
 
 # --- 1. 初始化图 ---
 # StateGraph 是 LangGraph 的核心，它定义了状态的结构 (`AgentState`)。
@@ -23,16 +41,16 @@ workflow = StateGraph(AgentState)
 # 节点是执行具体逻辑的函数。它们接收当前状态，执行操作，并返回状态更新。
 
 # Parser 节点：负责解析 OpenAPI 文档
-# Parser 节点：负责解析 OpenAPI 文档
+# 纯 CPU 计算，异步执行时 LangGraph 会自动将同步节点放到线程池中运行
 workflow.add_node("parser", debug_wrapper(parser_node, "parser"))
 
 # Planner 节点：负责生成测试计划
 # Planner 节点：负责生成测试计划
-workflow.add_node("planner", debug_wrapper(planner_node, "planner"))
+workflow.add_node("planner", debug_wrapper(planner_node, "planner", aplanner_node))
 
 # Generator 节点：负责生成代码
-# 注意：目前使用 batch_generator_node 串行处理所有生成任务以简化实现
-workflow.add_node("generator", debug_wrapper(batch_generator_node, "generator"))
+# 每个 TestCase 通过 Send API 独立调度一次，并行执行 (Map-Reduce)
+workflow.add_node("generator", debug_wrapper(generator_node, "generator", agenerator_node))
 
 # Aggregator 节点：负责聚合代码
 # Aggregator 节点：负责聚合代码
@@ -60,28 +78,49 @@ workflow.add_conditional_edges(
     }
 )
 
-# Planner -> Generator
-# 如果规划失败，也应该处理（简化起见这里直接流转，依靠后续错误处理）
-def check_planner_success(state: AgentState):
+# Planner -> Generator (Map)
+# 为计划中的每个用例发送一个 Send，LangGraph 会在同一 superstep 内并行执行，
+# 并发上限由调用时 config 中的 `max_concurrency` 控制。
+def dispatch_cases(state: AgentState):
     if state.get("error"):
         return END
-    return "generator"
+    # 流水线模式下 Planner 已经生成了部分 (或全部) 用例的代码，只调度剩余用例；
+    # 超出 Token 预算的用例保留在计划中，但不生成代码
+    generated = state.get("generated_code_map") or {}
+    skipped = set(state.get("budget_skipped") or [])
+    pending = [case for case in state.get("test_plan") or [] if case.id not in generated and case.id not in skipped]
+    if not pending:
+        # 没有待生成的用例时直接进入聚合，避免空 Send 列表导致图提前结束
+        return "aggregator"
+    batch_size = (state.get("user_preferences") or {}).get("batch_size", 1)
+    if batch_size > 1:
+        # 批量模式: 同一 (endpoint, method) 的用例每 batch_size 个合并为一次 LLM 调用
+        return [
+            Send("generator", {**state, "test_cases": batch} if len(batch) > 1 else {**state, "test_case": batch[0]})
+            for batch in _batch_cases(pending, batch_size)
+        ]
+    return [Send("generator", {**state, "test_case": case}) for case in pending]
+
+def _batch_cases(cases, batch_size: int):
+    groups = {}
+    for case in cases:
+        groups.setdefault((case.endpoint, case.method.upper()), []).append(case)
+    return [group[i:i + batch_size] for group in groups.values() for i in range(0, len(group), batch_size)]
 
 workflow.add_conditional_edges(
     "planner",
-    check_planner_success,
-    {
-        "generator": "generator",
-        END: END
-    }
+    dispatch_cases,
+    ["generator", "aggregator", END]
 )
 
-# Generator -> Aggregator
+# Generator (Reduce) -> Aggregator
+# 所有并行分支完成后 generated_code_map 已由 reducer 合并，聚合器只执行一次
 workflow.add_edge("generator", "aggregator")
 
 # Aggregator -> END
 workflow.add_edge("aggregator", END)
 
 # --- 4. 编译图 ---
-# 编译后的 app 可被直接调用 (`app.invoke(inputs)`)
+# 编译后的 app 可被直接调用 (`app.invoke(inputs, config={"max_concurrency": N})`)
+# 在异步上下文中应使用 `await app.ainvoke(...)`，Planner/Generator 会使用异步 LLM 调用
 agent_app = workflow.compile()
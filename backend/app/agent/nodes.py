@@ -1,14 +1,29 @@
+import asyncio
 import json
 import re
 import yaml
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Any, Optional
 from app.agent.state import AgentState
 from app.services.parser_service import ParserService
-from app.agent.prompts.factory import PromptFactory
-from app.core.llm import get_llm
+from app.services.ref_resolver import RefResolver
+from app.services.rule_planner import RulePlanner
+from app.services.code_templates import CodeTemplateService
+from app.services.code_aggregator import CodeAggregator
+from app.services.code_validator import CodeValidator
+from app.services.spec_cache import spec_cache
+from app.services.spec_upload import SpecUploadService
+from app.core.settings import SettingsManager
+from app.agent.prompts.factory import PromptFactory, BATCH_CASE_MARKER, BATCH_END_MARKER
+from app.core.llm import invoke_llm, ainvoke_llm, astream_llm, add_usage, pool_concurrency
 from app.models.schemas import TestCase, LLMConfig
 from app.utils.json_parser import robust_json_parse
-from langchain_core.messages import SystemMessage, HumanMessage
+from app.utils.stream_json import IncrementalArrayParser
+from app.utils.token_utils import estimate_tokens
+from langgraph.config import get_stream_writer
+
+# 用例代码生成失败时写入 generated_code_map 的占位代码前缀
+GENERATION_ERROR_PREFIX = "// Error generating code:"
 
 def parser_node(state: AgentState) -> Dict:
     """
@@ -18,30 +33,320 @@ def parser_node(state: AgentState) -> Dict:
     1. 解析输入的 OpenAPI 字符串。
     2. 验证格式。
     3. 生成简化版的 Spec Summary 供 LLM 使用。
+    4. 构建按操作划分的 Spec 切片索引，供代码生成使用。
+    5. 计算每个操作的规范化哈希，供增量重新生成比较版本差异。
+    
+    解析结果及 3~5 的产物按内容哈希缓存，同一份 Spec 再次提交时直接复用。
     
     输出更新 State:
     - parse_result
     - spec_summary
+    - operation_index
+    - operation_hashes
     """
     print("--- 正在执行 Parser Node ---")
     content = state["openapi_spec_content"]
     
     try:
-        # 1. 解析
-        parsed = ParserService.parse_spec_content(content)
+        settings = SettingsManager.load_settings()
+        spec_cache.max_entries = settings.spec_cache_max_entries
+        # 1. 解析 (按内容哈希缓存)；上传的 Spec 直接从文件读取，文件名即内容哈希
+        if state.get("spec_id"):
+            content_hash = state["spec_id"]
+            parsed = ParserService.load_spec_file(SpecUploadService.path_for(content_hash), content_hash)
+        else:
+            content_hash, parsed = ParserService.load_spec(content)
         # 2. 验证
         ParserService.validate_spec(parsed)
-        # 3. 简化
-        summary = ParserService.simplify_spec(parsed)
+        
+        # 相同内容与 $ref 配置的摘要、切片索引及哈希直接复用
+        cache_key = ("prepared", content_hash, settings.ref_mode, settings.ref_inline_depth)
+        prepared = spec_cache.get(cache_key)
+        if prepared is None:
+            # 3. 简化 ($ref 解析结果在摘要与切片之间共享)
+            resolver = RefResolver(parsed)
+            summary = ParserService.simplify_spec(parsed, settings.ref_mode, settings.ref_inline_depth, resolver)
+            # 4. 操作切片索引
+            operation_index = ParserService.build_operation_index(parsed, settings.ref_mode, settings.ref_inline_depth, resolver)
+            # 5. 操作哈希
+            operation_hashes = ParserService.operation_hashes(parsed, resolver)
+            prepared = (summary, operation_index, operation_hashes)
+            spec_cache.set(cache_key, prepared)
+        summary, operation_index, operation_hashes = prepared
         
         return {
             "parse_result": parsed,
             "spec_summary": summary,
+            "operation_index": operation_index,
+            "operation_hashes": operation_hashes,
             "error": None
         }
     except Exception as e:
         return {"error": str(e)}
 
+def _reuse_previous(state: AgentState):
+    """
+    增量重新生成: 将新 Spec 的操作哈希与上一次结果比较。
+
+    Returns:
+        (reused_cases, reused_code, operations_to_plan, spec_diff)
+        未提供可用的 previous_result 时返回 ([], {}, None, {})，即完整规划。
+        未变更操作下的用例及其代码原样复用 (上次生成失败的用例只复用用例，代码重新生成)；
+        operations_to_plan 为新增与变更的 (path, METHOD)。
+    """
+    previous = state["user_preferences"].get("previous_result") or {}
+    old_hashes = previous.get("operation_hashes")
+    if not old_hashes:
+        return [], {}, None, {}
+    
+    diff = ParserService.diff_operations(old_hashes, state.get("operation_hashes") or {})
+    unchanged = {ParserService.parse_operation_key(key) for key in diff["unchanged"]}
+    previous_code = previous.get("generated_code") or {}
+    reused_cases, reused_code = [], {}
+    for item in previous.get("test_plan") or []:
+        case = TestCase(**item)
+        if ParserService.match_operation(unchanged, case.endpoint, case.method):
+            reused_cases.append(case)
+            code = previous_code.get(case.id)
+            if code is not None and not code.startswith(GENERATION_ERROR_PREFIX):
+                reused_code[case.id] = code
+    
+    operations = {ParserService.parse_operation_key(key) for key in diff["added"] + diff["changed"]}
+    print(f"Incremental run: {len(operations)} operation(s) to plan, {len(reused_cases)} case(s) reused")
+    return reused_cases, reused_code, operations, diff
+
+def _prepare_planner(state: AgentState, operations=None):
+    """
+    Planner 同步/异步版本共用的准备逻辑: 构建 LLM 配置及 Prompt 列表。
+
+    planning_mode:
+    - single:  整个 Spec 摘要一个 Prompt
+    - sharded: 按 tag / 路径前缀切分为不超过 plan_shard_token_budget 的分片，每个分片一个 Prompt
+    - auto:    摘要超出预算时才分片
+    - rules:   用例由 RulePlanner 生成；仅在 enrich_plan 时按 auto 方式构建 LLM 补充规划的 Prompt
+
+    给定 operations (增量重新生成) 时只为其中的操作规划，集合为空时不生成任何 Prompt。
+    配置了 planner_llm_config 时使用该模型及其层级对应的 Prompt 策略。
+    """
+    spec_summary = state["spec_summary"]
+    user_prefs = state["user_preferences"]
+    
+    # 构建 LLM Config 对象
+    llm_config = _stage_config(state, "planner")
+    
+    # 获取 Prompt 策略
+    tier = llm_config.tier
+    strategy = PromptFactory.get_strategy(tier)
+    
+    # 生成 Prompt
+    settings = SettingsManager.load_settings()
+    mode = user_prefs.get("planning_mode", "single")
+    if mode == "rules" and not user_prefs.get("enrich_plan"):
+        return llm_config, []
+    if operations is not None:
+        if not operations:
+            return llm_config, []
+        spec_summary = ParserService.simplify_spec(
+            state["parse_result"], settings.ref_mode, settings.ref_inline_depth, operations=operations
+        )
+    summaries = [spec_summary]
+    budget = settings.plan_shard_token_budget
+    if mode == "sharded" or (mode in ("auto", "rules") and estimate_tokens(spec_summary) > budget):
+        summaries = ParserService.shard_spec(
+            state["parse_result"], budget, settings.ref_mode, settings.ref_inline_depth, operations=operations
+        ) or summaries
+        print(f"Planning with {len(summaries)} spec shard(s)")
+    return llm_config, [strategy.plan_tests_prompt(summary) for summary in summaries]
+
+def _stage_config(state: AgentState, stage: str) -> LLMConfig:
+    """
+    返回指定阶段 (planner / generator) 使用的 LLM 配置，未单独配置时使用 llm_config。
+    """
+    user_prefs = state["user_preferences"]
+    return LLMConfig(**(user_prefs.get(f"{stage}_llm_config") or user_prefs["llm_config"]))
+
+def _escalation_config(state: AgentState, llm_config: LLMConfig) -> Optional[LLMConfig]:
+    """
+    阶段模型输出无法解析或未通过校验时的升级目标 (llm_config)。
+    阶段使用的就是 llm_config 或关闭了 escalate_on_failure 时返回 None。
+    """
+    user_prefs = state["user_preferences"]
+    if not user_prefs.get("escalate_on_failure", True):
+        return None
+    target = LLMConfig(**user_prefs["llm_config"])
+    return None if target == llm_config else target
+
+def _rule_cases(state: AgentState, operations=None) -> List[TestCase]:
+    """
+    planning_mode 为 rules 时，由 RulePlanner 按 Schema 规则确定性地生成用例 (不调用 LLM)。
+    """
+    user_prefs = state["user_preferences"]
+    if user_prefs.get("planning_mode") != "rules":
+        return []
+    if operations is not None and not operations:
+        return []
+    cases = RulePlanner.plan(
+        state["parse_result"],
+        include_boundary=user_prefs.get("include_boundary", False),
+        include_negative=user_prefs.get("include_negative", True),
+        operations=operations
+    )
+    print(f"Rule planner produced {len(cases)} case(s)")
+    return cases
+
+def _enrichment(rule_cases: List[TestCase], plans: List[List[TestCase]]) -> List[List[TestCase]]:
+    """
+    过滤 LLM 补充规划中与规则用例重复的用例 (相同的 endpoint, method, type, expected_status)。
+    """
+    if not rule_cases:
+        return plans
+    covered = {(c.endpoint, c.method.upper(), c.type, c.expected_status) for c in rule_cases}
+    return [
+        [c for c in plan if (c.endpoint, c.method.upper(), c.type, c.expected_status) not in covered]
+        for plan in plans
+    ]
+
+def _unique_case_id(case: TestCase, seen: set) -> TestCase:
+    """
+    保证用例 ID 在整个计划内唯一 (分片之间可能给出相同的 ID)，重复时追加序号。
+    """
+    case_id = case.id
+    suffix = 2
+    while case_id in seen:
+        case_id = f"{case.id}_{suffix}"
+        suffix += 1
+    seen.add(case_id)
+    return case if case_id == case.id else case.model_copy(update={"id": case_id})
+
+def _merge_plans(plans: List[List[TestCase]]) -> List[TestCase]:
+    """
+    按分片顺序合并多个测试计划，并使用例 ID 唯一。
+    """
+    seen = set()
+    return [_unique_case_id(case, seen) for plan in plans for case in plan]
+
+def _robust_parse(json_str: str):
+    """
+    使用配置中的字符串重复展开上限调用 `robust_json_parse`。
+    """
+    settings = SettingsManager.load_settings()
+    return robust_json_parse(json_str, settings.json_max_repeat, settings.json_max_expanded_chars)
+
+def _parse_plan(content: str) -> List[TestCase]:
+    """
+    从 LLM 的原始输出中提取并解析测试计划。
+    """
+    # 清理 Output (提取 JSON)
+    json_str = content
+    
+    # 1. 尝试提取 ```json ... ``` 或 ``` ... ```
+    pattern = r"```(?:json)?\s*(.*?)```"
+    match = re.search(pattern, content, re.DOTALL)
+    if match:
+        json_str = match.group(1).strip()
+        
+    # 2. 尝试寻找最外层的列表 [] 结构 (防止代码块外有额外文字)
+    # 寻找第一个 [ 和最后一个 ]
+    start = json_str.find('[')
+    end = json_str.rfind(']')
+    if start != -1 and end != -1 and end > start:
+        json_str = json_str[start:end+1]
+        
+    # 解析 JSON (使用 Robust Parser)
+    try:
+        plan_data = _robust_parse(json_str)
+        # Ensure it is a list
+        if not isinstance(plan_data, list):
+            if isinstance(plan_data, dict):
+                plan_data = [plan_data]
+            else:
+                raise ValueError("Parsed data is not a list or dict")
+    except Exception as je:
+         print(f"All parse attempts failed.")
+         print(f"Raw Content: {content}")
+         print(f"Extracted String: {json_str}")
+         raise je
+
+    return [TestCase(**item) for item in plan_data]
+
+def _plan_parses(content: str) -> bool:
+    """
+    LLM 缓存的校验回调: 无法解析为测试计划的 Planner 输出不写入缓存。
+    """
+    try:
+        _parse_plan(content)
+        return True
+    except Exception:
+        return False
+
+def _planner_error(e: Exception) -> Dict:
+    """
+    将 Planner 异常转换为带有排查提示的错误状态。
+    """
+    print(f"Planner Error: {e}")
+    error_msg = str(e)
+    if "Expecting" in error_msg: # JSON error usually contains "Expecting"
+         return {"error": f"Planning failed: LLM output is not valid JSON. Check logs for raw output. ({error_msg})"}
+    if "404" in error_msg and "url" in error_msg:
+         return {"error": f"Planning failed: LLM Endpoint not found (404). Please check your Base URL in Settings. (Original error: {error_msg})"}
+    return {"error": f"Planning failed: {error_msg}"}
+
+def _check_planner_budget(state: AgentState, prompts: List[str]) -> Optional[Dict]:
+    """
+    规划前检查 Token 预算: Planner Prompt 的估算值已超出预算时直接失败，避免无效的 LLM 调用。
+    """
+    budget = state["user_preferences"].get("token_budget")
+    if not budget:
+        return None
+    prompt_tokens = sum(estimate_tokens(prompt_text) for prompt_text in prompts)
+    if prompt_tokens > budget:
+        return {"error": f"Planning skipped: estimated planner prompt tokens ({prompt_tokens}) exceed the token budget ({budget})."}
+    return None
+
+def estimate_case_tokens(state: AgentState, case: TestCase) -> int:
+    """
+    估算单个用例代码生成的 Token 开销 (Prompt 估算值 + 预估的 Completion Token)。
+    """
+    if _template_code(state, case) is not None:
+        return 0
+    _, prompt = _case_prompt(state, case)
+    return estimate_tokens(prompt) + SettingsManager.load_settings().estimated_completion_tokens
+
+def _apply_token_budget(state: AgentState, test_plan: List[TestCase], planner_usage: Dict, generated: Optional[Dict] = None) -> List[str]:
+    """
+    按计划顺序为用例分配剩余预算，返回放不下的用例 ID (不会为它们生成代码)。
+    已有代码的用例 (增量复用) 不占用预算。
+    """
+    budget = state["user_preferences"].get("token_budget")
+    if not budget:
+        return []
+    remaining = budget - planner_usage.get("prompt_tokens", 0) - planner_usage.get("completion_tokens", 0)
+    case_state = {**state, "test_plan": test_plan}
+    skipped = []
+    for case in test_plan:
+        if generated and case.id in generated:
+            continue
+        cost = estimate_case_tokens(case_state, case)
+        if cost <= remaining:
+            remaining -= cost
+        else:
+            skipped.append(case.id)
+    if skipped:
+        print(f"Token budget exhausted, skipping {len(skipped)} case(s)")
+    return skipped
+
+def _planner_update(state: AgentState, test_plan: List[TestCase], planner_usage: Dict, reused_code: Dict, spec_diff: Dict) -> Dict:
+    update = {
+        "test_plan": test_plan,
+        "token_usage": {"planner": planner_usage},
+        "budget_skipped": _apply_token_budget(state, test_plan, planner_usage, reused_code),
+        "spec_diff": spec_diff
+    }
+    if reused_code:
+        # 复用的代码预先写入，dispatch_cases 不会再次调度这些用例
+        update["generated_code_map"] = reused_code
+    return update
+
 def planner_node(state: AgentState) -> Dict:
     """
     **规划器节点**
@@ -50,165 +355,604 @@ def planner_node(state: AgentState) -> Dict:
     1. 获取用户配置 (LLM, Tier)。
     2. 选择合适的 Prompt 策略。
     3. 调用 LLM 生成测试计划列表。
+    4. 设置了 Token 预算时，截掉预算放不下的用例。
+    5. 提供 previous_result 时只为新增或变更的操作规划，未变更操作的用例与代码原样复用。
+    6. planning_mode 为 rules 时由 RulePlanner 直接生成用例，可选地再由 LLM 补充 (enrich_plan)。
+    7. 使用 planner_llm_config 时，输出无法解析的分片单独升级到 llm_config 重新规划。
     
     输出更新 State:
     - test_plan
+    - token_usage (planner)
+    - budget_skipped
+    - spec_diff
+    - generated_code_map (仅增量模式下复用的代码)
     """
     print("--- 正在执行 Planner Node ---")
-    spec_summary = state["spec_summary"]
-    user_prefs = state["user_preferences"]
+    reused_cases, reused_code, operations, spec_diff = _reuse_previous(state)
+    rule_cases = _rule_cases(state, operations)
+    llm_config, prompts = _prepare_planner(state, operations)
+    use_cache = state["user_preferences"].get("use_cache", True)
+    budget_error = _check_planner_budget(state, prompts)
+    if budget_error:
+        return budget_error
     
-    # 构建 LLM Config 对象
-    llm_config = LLMConfig(**user_prefs["llm_config"])
-    llm = get_llm(llm_config)
+    # 调用 LLM (相同 Prompt 与模型参数命中缓存时不发起请求)，多个分片在线程池中并行规划
+    try:
+        usages = []
+        escalation = _escalation_config(state, llm_config)
+        def plan(prompt_text: str) -> List[TestCase]:
+            content, usage = invoke_llm(llm_config, prompt_text, use_cache, _plan_parses)
+            usages.append(usage)
+            try:
+                return _parse_plan(content)
+            except Exception as e:
+                if escalation is None:
+                    raise
+                _log_escalation("Plan", llm_config, escalation, e)
+            content, usage = invoke_llm(escalation, prompt_text, use_cache, _plan_parses)
+            usages.append({**usage, "escalations": 1})
+            return _parse_plan(content)
+        
+        if len(prompts) <= 1:
+            plans = [plan(prompt_text) for prompt_text in prompts]
+        else:
+            max_workers = min(len(prompts), pool_concurrency(llm_config))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                plans = list(executor.map(plan, prompts))
+        plans = [reused_cases, rule_cases] + _enrichment(rule_cases, plans)
+        return _planner_update(state, _merge_plans(plans), add_usage(*usages), reused_code, spec_diff)
+    except Exception as e:
+        return _planner_error(e)
+
+async def aplanner_node(state: AgentState) -> Dict:
+    """
+    **规划器节点 (异步版本)**
     
-    # 获取 Prompt 策略
-    tier = llm_config.tier
-    strategy = PromptFactory.get_strategy(tier)
+    与 `planner_node` 逻辑一致，但使用 `ainvoke` 调用 LLM，
+    在 `agent_app.ainvoke` 下执行时不会阻塞事件循环。
+    开启 `pipelined` 偏好时改用流式规划 (见 `_apipelined_plan`)。
+    """
+    print("--- 正在执行 Planner Node (async) ---")
+    reused_cases, reused_code, operations, spec_diff = _reuse_previous(state)
+    rule_cases = _rule_cases(state, operations)
+    llm_config, prompts = _prepare_planner(state, operations)
+    use_cache = state["user_preferences"].get("use_cache", True)
+    budget_error = _check_planner_budget(state, prompts)
+    if budget_error:
+        return budget_error
     
-    # 生成 Prompt
-    prompt_text = strategy.plan_tests_prompt(spec_summary)
+    # 规则用例无需等待 LLM，rules 模式下不使用流水线规划
+    if state["user_preferences"].get("pipelined") and not rule_cases:
+        return await _apipelined_plan(state, llm_config, prompts, use_cache, (reused_cases, reused_code, spec_diff))
     
-    # 调用 LLM
     try:
-        response = llm.invoke([HumanMessage(content=prompt_text)])
-        content = response.content
-        
-        # 清理 Output (提取 JSON)
-        json_str = content
+        semaphore = asyncio.Semaphore(pool_concurrency(llm_config))
+        usages = []
+        escalation = _escalation_config(state, llm_config)
         
-        # 1. 尝试提取 ```json ... ``` 或 ``` ... ```
-        pattern = r"```(?:json)?\s*(.*?)```"
-        match = re.search(pattern, content, re.DOTALL)
-        if match:
-            json_str = match.group(1).strip()
-            
-        # 2. 尝试寻找最外层的列表 [] 结构 (防止代码块外有额外文字)
-        # 寻找第一个 [ 和最后一个 ]
-        start = json_str.find('[')
-        end = json_str.rfind(']')
-        if start != -1 and end != -1 and end > start:
-            json_str = json_str[start:end+1]
-            
-        # 解析 JSON (多策略尝试)
-        # 解析 JSON (使用 Robust Parser)
-        try:
-            plan_data = robust_json_parse(json_str)
-            # Ensure it is a list
-            if not isinstance(plan_data, list):
-                if isinstance(plan_data, dict):
-                    plan_data = [plan_data]
-                else:
-                    raise ValueError("Parsed data is not a list or dict")
-        except Exception as je:
-             print(f"All parse attempts failed.")
-             print(f"Raw Content: {content}")
-             print(f"Extracted String: {json_str}")
-             raise je
-
-        test_cases = [TestCase(**item) for item in plan_data]
+        async def plan(prompt_text: str) -> List[TestCase]:
+            async with semaphore:
+                content, usage = await ainvoke_llm(llm_config, prompt_text, use_cache, _plan_parses)
+            usages.append(usage)
+            try:
+                return _parse_plan(content)
+            except Exception as e:
+                if escalation is None:
+                    raise
+                _log_escalation("Plan", llm_config, escalation, e)
+            content, usage = await ainvoke_llm(escalation, prompt_text, use_cache, _plan_parses)
+            usages.append({**usage, "escalations": 1})
+            return _parse_plan(content)
         
-        return {"test_plan": test_cases}
+        plans = await asyncio.gather(*(plan(prompt_text) for prompt_text in prompts))
+        plans = [reused_cases, rule_cases] + _enrichment(rule_cases, plans)
+        return _planner_update(state, _merge_plans(plans), add_usage(*usages), reused_code, spec_diff)
     except Exception as e:
-        print(f"Planner Error: {e}")
-        error_msg = str(e)
-        if "Expecting" in error_msg: # JSON error usually contains "Expecting"
-             return {"error": f"Planning failed: LLM output is not valid JSON. Check logs for raw output. ({error_msg})"}
-        if "404" in error_msg and "url" in error_msg:
-             return {"error": f"Planning failed: LLM Endpoint not found (404). Please check your Base URL in Settings. (Original error: {error_msg})"}
-        return {"error": f"Planning failed: {error_msg}"}
+        return _planner_error(e)
 
-def generator_node(state: AgentState, test_case: TestCase) -> Dict:
+def _get_writer():
     """
-    **生成器节点**
-    
-    注意：此节点设计为在循环或映射中被调用。
-    它不直接接收完整的 State 并返回更新的 State，而是处理单个 TestCase。
-    但是在当前 LangGraph 简单的线性结构中，我们将它适配为：
-    接收 State，处理其中 *一个* 待处理的任务，或者如果是并行映射，则逻辑略有不同。
+    获取 LangGraph 自定义流写入器；不在图执行上下文中时返回空操作。
+    """
+    try:
+        return get_stream_writer()
+    except Exception:
+        return lambda _: None
+
+async def _apipelined_plan(state: AgentState, llm_config: LLMConfig, prompts: List[str], use_cache: bool, reuse=([], {}, {})) -> Dict:
+    """
+    流水线规划: 流式读取 Planner 输出，每个 TestCase 的 JSON 对象闭合后立即解析，
+    并马上启动该用例的代码生成，使规划与生成重叠执行。多个分片的 Prompt 并行流式规划。
+
+    返回的 generated_code_map 中包含已生成的用例，`dispatch_cases` 不会再次调度它们。
+    设置了 Token 预算时，每个用例解析完成后按估算开销扣减剩余预算，放不下的用例不会启动生成。
+    reuse 为增量重新生成时复用的 (cases, code, spec_diff)，复用的用例排在计划最前面。
+    通过自定义流事件推送进度:
+    - {"event": "plan_case", "case": {...}}  用例解析完成
+    - {"event": "case", "id": ..., "code": ...}  用例代码生成完成
+    """
+    writer = _get_writer()
+    concurrency = pool_concurrency(llm_config)
+    generate_semaphore = asyncio.Semaphore(concurrency)
+    plan_semaphore = asyncio.Semaphore(concurrency)
+    reused_cases, reused_code, spec_diff = reuse
+    shard_plans: List[List[TestCase]] = [[] for _ in prompts]
+    seen_ids: set = {case.id for case in reused_cases}
+    tasks: Dict[str, asyncio.Task] = {}
+    case_usage: Dict[str, Dict] = {}
+    shard_usage: List[Dict] = [{} for _ in prompts]
+    budget = state["user_preferences"].get("token_budget")
+    remaining = [budget - sum(estimate_tokens(prompt_text) for prompt_text in prompts)] if budget else None
+    skipped: List[str] = []
     
-    为了简化实现并适配 LangGraph 的 `Send` API (Map-Reduce)，
-    我们假设这个函数被包装在一个可以并行调用的结构中。
+    async def generate(case: TestCase) -> str:
+        async with generate_semaphore:
+            code, err, usage = await agenerate_single_case({**state, "test_plan": [case]}, case.id)
+        update = _case_update(case, code, err, usage)
+        case_usage.update(update.get("token_usage", {}))
+        code = update["generated_code_map"][case.id]
+        writer({"event": "case", "id": case.id, "code": code})
+        return code
     
-    但在基础版本中，我们通过一个循环在图中顺序或并行执行。
-    这里实现为：接收单个 TestCase 和 上下文，返回生成的代码。
+    def dispatch(shard: int, case: TestCase, raw: str = ""):
+        case = _unique_case_id(case, seen_ids)
+        shard_plans[shard].append(case)
+        writer({"event": "plan_case", "case": case.model_dump()})
+        if remaining is not None:
+            # Planner 输出的该用例文本也计入预算
+            cost = estimate_tokens(raw) + estimate_case_tokens({**state, "test_plan": [case]}, case)
+            if cost > remaining[0]:
+                skipped.append(case.id)
+                return
+            remaining[0] -= cost
+        tasks[case.id] = asyncio.create_task(generate(case))
     
-    **实际 LangGraph 实现路径：**
-    我们会使用 LangGraph 的 conditional edges 来实现 Map-Reduce。
-    或者简单地，在此节点内部循环生成（如果不追求并行性能）。
+    async def plan_shard(shard: int, prompt_text: str):
+        parser = IncrementalArrayParser()
+        content_parts = []
+        async with plan_semaphore:
+            async for chunk in astream_llm(llm_config, prompt_text, use_cache, usage=shard_usage[shard], validate=_plan_parses):
+                content_parts.append(chunk)
+                for raw in parser.feed(chunk):
+                    try:
+                        dispatch(shard, TestCase(**_robust_parse(raw)), raw)
+                    except Exception as e:
+                        print(f"Skipping unparsable plan item: {e}")
+        
+        # 流中没有解析出任何用例时 (例如输出不是数组)，回退到完整解析，仍然失败时升级到 llm_config
+        if not shard_plans[shard]:
+            try:
+                cases = _parse_plan("".join(content_parts))
+            except Exception as e:
+                escalation = _escalation_config(state, llm_config)
+                if escalation is None:
+                    raise
+                _log_escalation("Plan", llm_config, escalation, e)
+                content, usage = await ainvoke_llm(escalation, prompt_text, use_cache, _plan_parses)
+                shard_usage[shard] = add_usage(shard_usage[shard], {**usage, "escalations": 1})
+                cases = _parse_plan(content)
+            for case in cases:
+                dispatch(shard, case)
     
-    为了演示 LangGraph 的逻辑，我们这里依然将其写为处理单个 Case 的逻辑，
-    稍后在 graph.py 中通过 `Send` API 进行并行调度。
-    """
-    # 注意：这只是一个逻辑单元，graph.py 中会定义如何调度它
-    pass
-
-# 由于 LangGraph 的 Map-Reduce 模式（Send API）需要特定的节点签名，
-# 我们重新定义 generator 逻辑以适配。
-# 这里的 generator_step 将接收 state 和 特定的 test_case 参数
+    try:
+        await asyncio.gather(*(plan_shard(i, prompt_text) for i, prompt_text in enumerate(prompts)))
+        codes = await asyncio.gather(*tasks.values())
+        # 计划按分片顺序输出，与非流水线模式保持一致
+        test_plan = reused_cases + [case for plan in shard_plans for case in plan]
+        return {
+            "test_plan": test_plan,
+            "generated_code_map": {**reused_code, **dict(zip(tasks.keys(), codes))},
+            "token_usage": {"planner": add_usage(*shard_usage), **case_usage},
+            "budget_skipped": skipped,
+            "spec_diff": spec_diff
+        }
+    except Exception as e:
+        for task in tasks.values():
+            task.cancel()
+        return _planner_error(e)
 
-def generate_single_case(state: AgentState, test_case_id: str):
+def _prepare_case(state: AgentState, test_case_id: str):
     """
-    辅助函数：生成单个用例的代码。
+    单用例生成同步/异步版本共用的准备逻辑。
+    
+    Returns:
+        (case, template_code)，如果用例不存在则返回 (None, None)；
+        template_code 为模板渲染的代码，需要调用 LLM 时为 None
     """
     # Find the case
     case = next((c for c in state["test_plan"] if c.id == test_case_id), None)
     if not case:
-        return None, "Case not found"
-        
-    spec_summary = state["spec_summary"]
+        return None, None
+    return case, _template_code(state, case)
+
+def _case_prompt(state: AgentState, case: TestCase):
+    """
+    构建用例的代码生成 Prompt，返回 (llm_config, prompt)。
+    配置了 generator_llm_config 时使用该模型及其层级对应的 Prompt 策略。
+    """
+    # 只携带当前用例对应操作的 Spec 切片；匹配不到时回退到完整摘要
+    api_context = ParserService.lookup_operation(
+        state.get("operation_index") or {}, case.endpoint, case.method
+    ) or state["spec_summary"]
     user_prefs = state["user_preferences"]
     target_language = user_prefs["target_language"]
     
-    llm_config = LLMConfig(**user_prefs["llm_config"])
-    llm = get_llm(llm_config)
+    llm_config = _stage_config(state, "generator")
     strategy = PromptFactory.get_strategy(llm_config.tier)
     
-    prompt = strategy.generate_code_prompt(case, spec_summary, target_language)
+    prompt = strategy.generate_code_prompt(case, api_context, target_language)
+    return llm_config, prompt
+
+def _template_code(state: AgentState, case: TestCase) -> Optional[str]:
+    """
+    尝试用模板直接渲染用例代码，模板无法完整覆盖或已关闭模板生成时返回 None。
+    """
+    user_prefs = state["user_preferences"]
+    if not user_prefs.get("template_codegen", True):
+        return None
+    api_context = ParserService.lookup_operation(state.get("operation_index") or {}, case.endpoint, case.method)
+    return CodeTemplateService.render(case, user_prefs["target_language"], api_context)
+
+def _render_templates(state: AgentState, cases: List[TestCase]) -> Dict[str, str]:
+    """
+    返回能由模板渲染的用例代码 {case_id: code}。
+    """
+    rendered = {}
+    for case in cases:
+        code = _template_code(state, case)
+        if code is not None:
+            rendered[case.id] = code
+    return rendered
+
+def _clean_code(code: str) -> str:
+    """
+    移除 LLM 输出中包裹代码的 Markdown 代码块标记。
+    """
+    # 简单清理
+    if "```" in code:
+        lines = code.split("\n")
+        # 移除第一行 ```language 和最后一行 ```
+        if lines[0].startswith("```"):
+            lines = lines[1:]
+        if lines[-1].startswith("```"):
+            lines = lines[:-1]
+        code = "\n".join(lines)
+    return code
+
+def _log_escalation(stage: str, llm_config: LLMConfig, escalation: LLMConfig, reason):
+    print(f"{stage} output from {llm_config.model_name} rejected ({reason}), escalating to {escalation.model_name}")
+
+def _code_escalation(state: AgentState, llm_config: LLMConfig, case: TestCase, code: str) -> Optional[LLMConfig]:
+    """
+    生成阶段模型的代码未通过 CodeValidator 校验时返回升级目标配置，否则返回 None。
+    """
+    escalation = _escalation_config(state, llm_config)
+    if escalation is None:
+        return None
+    problem = CodeValidator.check(code, state["user_preferences"]["target_language"])
+    if problem is None:
+        return None
+    _log_escalation(f"Case {case.id}", llm_config, escalation, problem)
+    return escalation
+
+def _code_check(state: AgentState) -> Callable[[str], bool]:
+    """
+    LLM 缓存的校验回调: 未通过 CodeValidator 的单用例代码不写入缓存。
+    """
+    language = state["user_preferences"]["target_language"]
+    return lambda content: CodeValidator.check(_clean_code(content), language) is None
+
+def _batch_check(state: AgentState, cases: List[TestCase]) -> Callable[[str], bool]:
+    """
+    LLM 缓存的校验回调: 含未通过 CodeValidator 的代码块的批量输出不写入缓存。
+    """
+    language = state["user_preferences"]["target_language"]
+    return lambda content: all(
+        CodeValidator.check(code, language) is None for code in _split_batch_code(content, cases).values()
+    )
+
+def _check_blocks(state: AgentState, llm_config: LLMConfig, blocks: Dict[str, str]):
+    """
+    可升级时拆出未通过校验的批量代码块，返回 (valid_blocks, rejected_ids, escalation)。
+    被拒绝的用例直接交给升级目标重新生成，不再经过生成阶段模型。
+    """
+    escalation = _escalation_config(state, llm_config)
+    if escalation is None:
+        return blocks, [], None
+    language = state["user_preferences"]["target_language"]
+    valid, rejected = {}, []
+    for case_id, code in blocks.items():
+        problem = CodeValidator.check(code, language)
+        if problem is None:
+            valid[case_id] = code
+        else:
+            _log_escalation(f"Case {case_id}", llm_config, escalation, problem)
+            rejected.append(case_id)
+    return valid, rejected, escalation
+
+def _generation_error(e: Exception) -> str:
+    error_msg = str(e)
+    if "404" in error_msg and "url" in error_msg:
+        return f"LLM 404 Error: Check Base URL. ({error_msg})"
+    return error_msg
+
+def generate_single_case(state: AgentState, test_case_id: str):
+    """
+    辅助函数：生成单个用例的代码，返回 (code, error, token_usage)。
+    生成阶段模型的代码未通过校验时，以同一 Prompt 升级到 llm_config 重新生成一次。
+    """
+    case, code = _prepare_case(state, test_case_id)
+    if case is None:
+        return None, "Case not found", None
+    if code is not None:
+        return code, None, None
+    llm_config, prompt = _case_prompt(state, case)
+    use_cache = state["user_preferences"].get("use_cache", True)
     
     try:
-        resp = llm.invoke([HumanMessage(content=prompt)])
-        code = resp.content
-        # 简单清理
-        if "```" in code:
-            lines = code.split("\n")
-            # 移除第一行 ```language 和最后一行 ```
-            if lines[0].startswith("```"):
-                lines = lines[1:]
-            if lines[-1].startswith("```"):
-                lines = lines[:-1]
-            code = "\n".join(lines)
-        return code, None
+        content, usage = invoke_llm(llm_config, prompt, use_cache, _code_check(state))
+        code = _clean_code(content)
+        escalation = _code_escalation(state, llm_config, case, code)
+        if escalation is not None:
+            content, escalated_usage = invoke_llm(escalation, prompt, use_cache, _code_check(state))
+            code, usage = _clean_code(content), add_usage(usage, {**escalated_usage, "escalations": 1})
+        return code, None, usage
     except Exception as e:
-        error_msg = str(e)
-        if "404" in error_msg and "url" in error_msg:
-            return None, f"LLM 404 Error: Check Base URL. ({error_msg})" 
-        return None, error_msg
+        return None, _generation_error(e), None
 
-def batch_generator_node(state: AgentState) -> Dict:
+async def agenerate_single_case(state: AgentState, test_case_id: str):
+    """
+    辅助函数：生成单个用例的代码 (异步版本)。
     """
-    **批量生成器节点**
+    case, code = _prepare_case(state, test_case_id)
+    if case is None:
+        return None, "Case not found", None
+    if code is not None:
+        return code, None, None
+    llm_config, prompt = _case_prompt(state, case)
+    use_cache = state["user_preferences"].get("use_cache", True)
     
-    为了简化，我们先在一个节点内串行生成所有代码。
-    未来优化：使用 LangGraph 的 Map-Reduce 并行生成。
+    try:
+        content, usage = await ainvoke_llm(llm_config, prompt, use_cache, _code_check(state))
+        code = _clean_code(content)
+        escalation = _code_escalation(state, llm_config, case, code)
+        if escalation is not None:
+            content, escalated_usage = await ainvoke_llm(escalation, prompt, use_cache, _code_check(state))
+            code, usage = _clean_code(content), add_usage(usage, {**escalated_usage, "escalations": 1})
+        return code, None, usage
+    except Exception as e:
+        return None, _generation_error(e), None
+
+def escalate_single_case(state: AgentState, case: TestCase, escalation: LLMConfig):
+    """
+    辅助函数：跳过生成阶段模型，直接用升级目标生成单个用例的代码，返回 (code, error, token_usage)。
+    """
+    _, prompt = _case_prompt(state, case)
+    use_cache = state["user_preferences"].get("use_cache", True)
+    try:
+        content, usage = invoke_llm(escalation, prompt, use_cache, _code_check(state))
+        return _clean_code(content), None, {**usage, "escalations": 1}
+    except Exception as e:
+        return None, _generation_error(e), None
+
+async def aescalate_single_case(state: AgentState, case: TestCase, escalation: LLMConfig):
+    """
+    辅助函数：直接用升级目标生成单个用例的代码 (异步版本)。
+    """
+    _, prompt = _case_prompt(state, case)
+    use_cache = state["user_preferences"].get("use_cache", True)
+    try:
+        content, usage = await ainvoke_llm(escalation, prompt, use_cache, _code_check(state))
+        return _clean_code(content), None, {**usage, "escalations": 1}
+    except Exception as e:
+        return None, _generation_error(e), None
+
+def _prepare_batch(state: AgentState, cases: List[TestCase]):
+    """
+    批量生成同步/异步版本共用的准备逻辑，返回 (llm_config, prompt)。
+    同一批用例属于同一个 (endpoint, method)，只携带一份接口上下文。
+    """
+    api_context = ParserService.lookup_operation(
+        state.get("operation_index") or {}, cases[0].endpoint, cases[0].method
+    ) or state["spec_summary"]
+    user_prefs = state["user_preferences"]
+    llm_config = _stage_config(state, "generator")
+    strategy = PromptFactory.get_strategy(llm_config.tier)
+    return llm_config, strategy.generate_batch_code_prompt(cases, api_context, user_prefs["target_language"])
+
+def _split_batch_code(content: str, cases: List[TestCase]) -> Dict[str, str]:
+    """
+    按分隔行将批量输出拆分为 {case_id: code}。
+    缺少结束行时以下一个用例的起始行为界；未知 ID 及空代码块被忽略。
+    """
+    case_ids = {case.id for case in cases}
+    blocks: Dict[str, str] = {}
+    current_id = None
+    lines: List[str] = []
     
-    输出更新 State:
-    - generated_code_map
+    def close():
+        code = _clean_code("\n".join(lines).strip()).strip()
+        if current_id in case_ids and code and current_id not in blocks:
+            blocks[current_id] = code
+    
+    for line in content.split("\n"):
+        stripped = line.strip()
+        if stripped.startswith(BATCH_CASE_MARKER):
+            if current_id is not None:
+                close()
+            current_id = stripped[len(BATCH_CASE_MARKER):].strip().strip("[]`")
+            lines = []
+        elif stripped.startswith(BATCH_END_MARKER):
+            if current_id is not None:
+                close()
+            current_id = None
+        elif current_id is not None:
+            lines.append(line)
+    if current_id is not None:
+        close()
+    return blocks
+
+def _split_usage(usage: Optional[Dict], cases: List[TestCase]) -> Dict[str, Dict]:
     """
-    print("--- 正在执行 Batch Generator Node ---")
-    test_plan = state["test_plan"]
-    code_map = {}
+    将一次批量调用的用量平均分摊到批内各用例 (余数计入第一个用例)。
+    """
+    if not usage:
+        return {}
+    n = len(cases)
+    shares = {}
+    for i, case in enumerate(cases):
+        share = dict(usage)
+        for key in ("prompt_tokens", "completion_tokens"):
+            share[key] = usage.get(key, 0) // n + (usage.get(key, 0) % n if i == 0 else 0)
+        for key in ("calls", "cached_calls"):
+            share[key] = usage.get(key, 0) if i == 0 else 0
+        shares[case.id] = share
+    return shares
+
+def generate_batch_cases(state: AgentState, cases: List[TestCase]) -> Dict:
+    """
+    一次 LLM 调用生成同一接口下多个用例的代码，返回状态更新。
+    可由模板渲染的用例不进入批量 Prompt；批量调用失败或某个用例的代码块缺失时，该用例回退为单用例生成；
+    代码块未通过校验时，该用例直接升级到 llm_config 重新生成。
+    """
+    templated = _render_templates(state, cases)
+    cases = [case for case in cases if case.id not in templated]
+    if not cases:
+        return {"generated_code_map": templated, "token_usage": {}}
+    llm_config, prompt = _prepare_batch(state, cases)
+    use_cache = state["user_preferences"].get("use_cache", True)
+    blocks, rejected, escalation, usage = {}, [], None, None
+    try:
+        content, usage = invoke_llm(llm_config, prompt, use_cache, _batch_check(state, cases))
+        blocks, rejected, escalation = _check_blocks(state, llm_config, _split_batch_code(content, cases))
+    except Exception as e:
+        print(f"Batch generation failed, falling back to single-case generation: {_generation_error(e)}")
     
-    for case in test_plan:
-        print(f"Generating code for case: {case.id}")
-        code, err = generate_single_case(state, case.id)
-        if code:
-            code_map[case.id] = code
+    update = {"generated_code_map": {**templated, **blocks}, "token_usage": _split_usage(usage, cases)}
+    case_state = {**state, "test_plan": cases}
+    for case in cases:
+        if case.id in rejected:
+            fallback = _case_update(case, *escalate_single_case(case_state, case, escalation))
+        elif case.id not in blocks:
+            fallback = _case_update(case, *generate_single_case(case_state, case.id))
         else:
-            code_map[case.id] = f"// Error generating code: {err}"
-            
+            continue
+        _merge_case_update(update, fallback)
+    return update
+
+async def agenerate_batch_cases(state: AgentState, cases: List[TestCase]) -> Dict:
+    """
+    `generate_batch_cases` 的异步版本，回退的单用例生成并发执行。
+    """
+    templated = _render_templates(state, cases)
+    cases = [case for case in cases if case.id not in templated]
+    if not cases:
+        return {"generated_code_map": templated, "token_usage": {}}
+    llm_config, prompt = _prepare_batch(state, cases)
+    use_cache = state["user_preferences"].get("use_cache", True)
+    blocks, rejected, escalation, usage = {}, [], None, None
+    try:
+        content, usage = await ainvoke_llm(llm_config, prompt, use_cache, _batch_check(state, cases))
+        blocks, rejected, escalation = _check_blocks(state, llm_config, _split_batch_code(content, cases))
+    except Exception as e:
+        print(f"Batch generation failed, falling back to single-case generation: {_generation_error(e)}")
+    
+    update = {"generated_code_map": {**templated, **blocks}, "token_usage": _split_usage(usage, cases)}
+    case_state = {**state, "test_plan": cases}
+    missing = [case for case in cases if case.id not in blocks]
+    results = await asyncio.gather(*(
+        aescalate_single_case(case_state, case, escalation) if case.id in rejected
+        else agenerate_single_case(case_state, case.id)
+        for case in missing
+    ))
+    for case, result in zip(missing, results):
+        _merge_case_update(update, _case_update(case, *result))
+    return update
+
+def _merge_case_update(update: Dict, case_update: Dict):
+    update["generated_code_map"].update(case_update["generated_code_map"])
+    for case_id, usage in case_update.get("token_usage", {}).items():
+        update["token_usage"][case_id] = add_usage(update["token_usage"].get(case_id), usage)
 
-    return {"generated_code_map": code_map}
+def _case_update(case: TestCase, code: str, err: str, usage: Optional[Dict] = None) -> Dict:
+    update = {"generated_code_map": {case.id: code if code else f"{GENERATION_ERROR_PREFIX} {err}"}}
+    if usage:
+        update["token_usage"] = {case.id: usage}
+    return update
+
+def generator_node(state: Dict) -> Dict:
+    """
+    **生成器节点 (Map 阶段)**
+    
+    由 graph.py 中的 `dispatch_cases` 通过 LangGraph `Send` API 为每个 TestCase 单独调度，
+    多个实例在同一 superstep 内并行执行，并发上限由运行配置中的 `max_concurrency` 控制。
+    
+    输入:
+    - 完整的 AgentState，外加 `test_case` (当前需要生成代码的用例)，
+      或批量模式下的 `test_cases` (同一接口的多个用例，一次 LLM 调用生成)
+    
+    输出更新 State:
+    - generated_code_map (仅包含当前用例，由 AgentState 上的 reducer 合并)
+    - token_usage (当前用例的 Token 用量)
+    """
+    if state.get("test_cases"):
+        print(f"Generating code for batch: {[case.id for case in state['test_cases']]}")
+        return generate_batch_cases(state, state["test_cases"])
+    case = state["test_case"]
+    print(f"Generating code for case: {case.id}")
+    code, err, usage = generate_single_case(state, case.id)
+    return _case_update(case, code, err, usage)
+
+async def agenerator_node(state: Dict) -> Dict:
+    """
+    **生成器节点 (异步版本)**
+    
+    与 `generator_node` 逻辑一致，使用 `ainvoke` 调用 LLM。
+    """
+    if state.get("test_cases"):
+        print(f"Generating code for batch: {[case.id for case in state['test_cases']]}")
+        return await agenerate_batch_cases(state, state["test_cases"])
+    case = state["test_case"]
+    print(f"Generating code for case: {case.id}")
+    code, err, usage = await agenerate_single_case(state, case.id)
+    return _case_update(case, code, err, usage)
+
+def estimate_run_tokens(state: AgentState) -> Dict:
+    """
+    在不调用 LLM 的情况下预估一次运行的 Token 开销。
+
+    返回 Planner Prompt 的估算值，以及每个操作生成一个用例代码的估算开销；
+    实际用例数由 Planner 决定，因此总开销约为 planner + 用例数 × 平均单用例开销。
+    """
+    parsed = parser_node(state)
+    if parsed.get("error"):
+        return {"error": parsed["error"]}
+    state = {**state, **parsed}
+    _, prompts = _prepare_planner(state)
+    
+    operations = []
+    for path, method in state["operation_index"]:
+        placeholder = TestCase(
+            id="estimate", name=f"{method} {path}", description="", endpoint=path,
+            method=method, type="positive", expected_status=200
+        )
+        case_state = {**state, "test_plan": [placeholder]}
+        # estimated_tokens 为 LLM 生成的开销；templated 表示该操作的简单正向用例可由模板直接渲染
+        llm_state = {**case_state, "user_preferences": {**state["user_preferences"], "template_codegen": False}}
+        operations.append({
+            "endpoint": path,
+            "method": method,
+            "estimated_tokens": estimate_case_tokens(llm_state, placeholder),
+            "templated": _template_code(case_state, placeholder) is not None
+        })
+    
+    return {
+        "planner_prompts": len(prompts),
+        "planner_prompt_tokens": sum(estimate_tokens(prompt_text) for prompt_text in prompts),
+        "estimated_completion_tokens_per_case": SettingsManager.load_settings().estimated_completion_tokens,
+        "operations": operations,
+        "token_budget": state["user_preferences"].get("token_budget")
+    }
 
 def aggregator_node(state: AgentState) -> Dict:
     """
@@ -216,7 +960,9 @@ def aggregator_node(state: AgentState) -> Dict:
     
     职责:
     1. 收集所有生成的代码片段。
-    2. 根据目标语言，组装成最终的可执行文件内容 (添加 Imports, Main 函数等)。
+    2. 根据目标语言，组装成最终的可执行文件内容 (合并 Imports、添加 package / 类声明等)。
+    
+    组装由 `CodeAggregator` 按计划顺序逐段产出后一次性拼接，开销与代码总长度成线性关系。
     
     输出更新 State:
     - final_output
@@ -227,57 +973,9 @@ def aggregator_node(state: AgentState) -> Dict:
     user_prefs = state.get("user_preferences", {})
     target_language = user_prefs.get("target_language", "curl")
     
-    final_output = ""
-    
     print(f"Aggregator: Test Plan size: {len(test_plan)}")
     
-    if target_language == "go":
-        # Go 语言聚合策略
-        final_output += "package main\n\n"
-        final_output += "import (\n"
-        final_output += "\t\"testing\"\n"
-        final_output += "\t\"net/http\"\n"
-        final_output += "\t\"net/http/httptest\"\n"
-        final_output += "\t\"strings\"\n"
-        final_output += "\t\"encoding/json\"\n"
-        final_output += ")\n\n"
-        
-        for case in test_plan:
-            code = code_map.get(case.id, "")
-            if code:
-                # 确保代码片段没有 package main 或多余的 imports
-                # 简单清理：如果包含 package main，移除之
-                if "package main" in code:
-                    code = code.replace("package main", "")
-                # 移除 import 块 (假设每个片段都有，这里简单粗暴做展示，实际应更智能解析)
-                # 更好的做法是在 Prompt 中要求不生成 package/import
-                
-                final_output += f"// Test Case: {case.name} ({case.id})\n"
-                final_output += code + "\n\n"
-                
-    elif target_language == "java":
-        # Java 语言聚合策略 (RestAssured)
-        final_output += "import org.junit.Test;\n"
-        final_output += "import static io.restassured.RestAssured.*;\n"
-        final_output += "import static org.hamcrest.Matchers.*;\n\n"
-        final_output += "public class ApiTest {\n\n"
-        
-        for case in test_plan:
-            code = code_map.get(case.id, "")
-            if code:
-                final_output += f"    // Test Case: {case.name} ({case.id})\n"
-                # 缩进处理
-                indented_code = "\n".join(["    " + line for line in code.split("\n")])
-                final_output += indented_code + "\n\n"
-                
-        final_output += "}\n"
-        
-    else:
-        # Default / cURL
-        for case in test_plan:
-            code = code_map.get(case.id, "")
-            if code:
-                final_output += f"# Test Case: {case.name} ({case.id})\n"
-                final_output += code + "\n\n"
-                
-    return {"final_output": final_output}
+    def entries():
+        return ((case.name, case.id, code_map.get(case.id)) for case in test_plan)
+    
+    return {"final_output": CodeAggregator.render(target_language, entries)}
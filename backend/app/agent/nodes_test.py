@@ -75,3 +75,20 @@ def test_robust_json_parsing_real_error_log_content():
     data = robust_json_parse(real_log_content)
     assert isinstance(data, list)
     assert len(data[0]["payload"]["name"]) == 1000
+
+def test_robust_json_parsing_valid_json_skips_preprocessing(monkeypatch):
+    import app.utils.json_parser as json_parser
+    monkeypatch.setattr(json_parser, "expand_string_repetition", lambda *args: pytest.fail("should not pre-process valid JSON"))
+    data = robust_json_parse('[{"name": "a * 3", "note": "x\\" * 2"}]')
+    assert data == [{"name": "a * 3", "note": 'x" * 2'}]
+
+def test_robust_json_parsing_respects_string_boundaries():
+    # 字符串内部的 `*` / `.repeat(` 与转义引号不应被当作运算符
+    invalid_json = '{"a": "he said \\"hi\\" * 3", "b": "x" * 3, "c": \'y\'.repeat(2), "d": "it\'s" * 2,}'
+    data = robust_json_parse(invalid_json)
+    assert data == {"a": 'he said "hi" * 3', "b": "xxx", "c": "yy", "d": "it'sit's"}
+
+def test_robust_json_parsing_caps_expansion():
+    data = robust_json_parse('{"a": "A" * 1000000000, "b": "B" * 50}', max_repeat=100, max_expanded_chars=120)
+    assert data["a"] == "A" * 100
+    assert data["b"] == "B" * 20
@@ -11,10 +11,28 @@ class IPromptStrategy(ABC):
         pass
 
     @abstractmethod
-    def generate_code_prompt(self, case: TestCase, spec_summary: str, language: str) -> str:
-        """生成代码的提示词"""
+    def generate_code_prompt(self, case: TestCase, api_context: str, language: str) -> str:
+        """
+        生成代码的提示词
+
+        Args:
+            api_context: 当前用例所属操作的 Spec 切片 (找不到时为完整的 Spec 摘要)
+        """
+        pass
+
+    @abstractmethod
+    def generate_batch_code_prompt(self, cases: List[TestCase], api_context: str, language: str) -> str:
+        """
+        为同一接口的多个用例生成代码的提示词 (批量模式)
+
+        模型需按 `BATCH_CASE_MARKER <case_id>` / `BATCH_END_MARKER` 分隔输出每个用例的代码。
+        """
         pass
 
+# 批量生成时每个用例代码块的起止分隔行
+BATCH_CASE_MARKER = "### CASE:"
+BATCH_END_MARKER = "### END CASE"
+
 class PromptFactory:
     """提示词策略工厂"""
 
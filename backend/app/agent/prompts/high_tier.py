@@ -1,6 +1,15 @@
-from app.agent.prompts.factory import IPromptStrategy
+import json
+from typing import List
+from app.agent.prompts.factory import IPromptStrategy, BATCH_CASE_MARKER, BATCH_END_MARKER
 from app.models.schemas import TestCase
 
+def _request_data_line(case: TestCase, inline: bool = False) -> str:
+    """规则规划器给出的具体请求数据，需原样用于生成的代码"""
+    if not case.request_data:
+        return ""
+    data = json.dumps(case.request_data, ensure_ascii=False)
+    return f"; 请求数据: {data}" if inline else f"\n- 请求数据 (请原样使用): {data}"
+
 class HighTierStrategy(IPromptStrategy):
     """
     高级模型策略 (例如 Gemini Pro, GPT-4)。
@@ -42,13 +51,13 @@ OpenAPI 摘要:
 **开始分析并生成计划：**
 """
 
-    def generate_code_prompt(self, case: TestCase, spec_summary: str, language: str) -> str:
+    def generate_code_prompt(self, case: TestCase, api_context: str, language: str) -> str:
         return f"""
 你是一名精通 {language} 的代码生成专家。请根据以下测试用例和 API 定义生成可执行的测试代码。
 
-**OpenAPI 定义：**
+**OpenAPI 定义 (当前接口)：**
 ```json
-{spec_summary}
+{api_context}
 ```
 
 **测试用例详情：**
@@ -56,7 +65,7 @@ OpenAPI 摘要:
 - 描述: {case.description}
 - 端点: {case.endpoint} [{case.method}]
 - 类型: {case.type}
-- 预期状态码: {case.expected_status}
+- 预期状态码: {case.expected_status}{_request_data_line(case)}
 
 **生成要求：**
 1. 生成完整的、独立的 {language} 测试函数或脚本。
@@ -66,5 +75,38 @@ OpenAPI 摘要:
 5. 请添加清晰的中文注释解释代码逻辑。
 6. 只输出代码，不要包含 Markdown 格式标记。
 
+**开始生成代码：**
+"""
+
+    def generate_batch_code_prompt(self, cases: List[TestCase], api_context: str, language: str) -> str:
+        case_details = "\n".join(
+            f"- [{case.id}] 名称: {case.name}; 描述: {case.description}; 类型: {case.type}; 预期状态码: {case.expected_status}{_request_data_line(case, inline=True)}"
+            for case in cases
+        )
+        return f"""
+你是一名精通 {language} 的代码生成专家。请根据以下 API 定义，为同一接口的多个测试用例分别生成可执行的测试代码。
+
+**OpenAPI 定义 (当前接口)：**
+```json
+{api_context}
+```
+
+**接口：** {cases[0].endpoint} [{cases[0].method}]
+
+**测试用例列表：**
+{case_details}
+
+**生成要求：**
+1. 为每个用例生成完整的、独立的 {language} 测试函数或脚本，函数名互不相同。
+2. 包含必要的导入语句。
+3. 请使用标准库或主流库 (Java: RestAssured, Go: net/http/httptest 或标准库)。
+4. 代码必须包含对响应状态码的断言。
+5. 请添加清晰的中文注释解释代码逻辑。
+6. 只输出代码，不要包含 Markdown 格式标记。
+7. 每个用例的代码必须单独成块，严格使用以下分隔格式 (方括号中的 ID 原样填写，不带方括号)：
+{BATCH_CASE_MARKER} <用例 ID>
+<代码>
+{BATCH_END_MARKER}
+
 **开始生成代码：**
 """
@@ -1,4 +1,5 @@
-from app.agent.prompts.factory import IPromptStrategy
+from typing import List
+from app.agent.prompts.factory import IPromptStrategy, BATCH_CASE_MARKER, BATCH_END_MARKER
 from app.models.schemas import TestCase
 import json
 
@@ -33,7 +34,7 @@ API 定义:
 ]
 """
 
-    def generate_code_prompt(self, case: TestCase, spec_summary: str, language: str) -> str:
+    def generate_code_prompt(self, case: TestCase, api_context: str, language: str) -> str:
         # 简单模型可能需要更明确的代码结构指引
         requirements = ""
         if language == "go":
@@ -45,10 +46,10 @@ API 定义:
 任务：编写 {language} 测试代码。
 
 API 上下文:
-{spec_summary}
+{api_context}
 
 当前测试用例:
-{json.dumps(case.dict(), ensure_ascii=False)}
+{json.dumps(case.model_dump(), ensure_ascii=False)}
 
 要求:
 1. {requirements}
@@ -56,5 +57,38 @@ API 上下文:
 3. 断言 HTTP 状态码是否为 {case.expected_status}。
 4. 仅输出代码文本。
 
+代码:
+"""
+
+    def generate_batch_code_prompt(self, cases: List[TestCase], api_context: str, language: str) -> str:
+        requirements = ""
+        if language == "go":
+            requirements = "使用 Go标准库 `net/http` 和 `testing` 包。函数必须以 `Test` 开头，且函数名互不相同。"
+        elif language == "java":
+            requirements = "使用 RestAssured。每个用例一个测试方法，方法名互不相同。"
+        
+        case_lines = "\n".join(json.dumps(case.model_dump(), ensure_ascii=False) for case in cases)
+        first_id = cases[0].id
+        return f"""
+任务：为同一个接口的 {len(cases)} 个测试用例分别编写 {language} 测试代码。
+
+API 上下文:
+{api_context}
+
+测试用例 (每行一个):
+{case_lines}
+
+要求:
+1. {requirements}
+2. 即使是简单的 GET 请求，也要写完整的函数。
+3. 断言 HTTP 状态码是否为该用例的 expected_status。
+4. 仅输出代码文本。
+5. 每个用例的代码前单独一行写 `{BATCH_CASE_MARKER} 用例id`，代码后单独一行写 `{BATCH_END_MARKER}`。
+
+输出示例:
+{BATCH_CASE_MARKER} {first_id}
+(用例 {first_id} 的代码)
+{BATCH_END_MARKER}
+
 代码:
 """
@@ -0,0 +1,141 @@
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from app.agent.graph import agent_app
+from app.core.llm import add_usage, resolve_backends
+from app.core.settings import AppSettings
+from app.models.schemas import GenerateRequest, LLMConfig
+
+def build_initial_state(request: GenerateRequest) -> Dict[str, Any]:
+    """
+    根据请求体构建 LangGraph 的初始状态。
+    """
+    return {
+        "openapi_spec_content": request.openapi_content or "",
+        "spec_id": request.spec_id,
+        "user_preferences": {
+            "target_language": request.target_language,
+            "llm_config": request.llm_config.model_dump(),
+            "planner_llm_config": request.planner_llm_config.model_dump() if request.planner_llm_config else None,
+            "generator_llm_config": request.generator_llm_config.model_dump() if request.generator_llm_config else None,
+            "escalate_on_failure": request.escalate_on_failure,
+            "include_boundary": request.include_boundary,
+            "include_negative": request.include_negative,
+            "use_cache": request.use_cache,
+            "pipelined": request.pipelined,
+            "planning_mode": request.planning_mode,
+            "enrich_plan": request.enrich_plan,
+            "template_codegen": request.template_codegen,
+            "batch_size": request.batch_size,
+            "token_budget": request.token_budget,
+            "previous_result": request.previous_result
+        },
+        # 初始化其他字段为空
+        "parse_result": {},
+        "spec_summary": "",
+        "operation_index": {},
+        "operation_hashes": {},
+        "spec_diff": {},
+        "test_plan": [],
+        "generated_code_map": {},
+        "token_usage": {},
+        "budget_skipped": [],
+        "final_output": "",
+        "error": None
+    }
+
+def build_run_config(settings: AppSettings, llm_config: Optional[LLMConfig] = None) -> Dict[str, Any]:
+    """
+    构建图执行配置。max_concurrency 限制 Generator 阶段并行分支的数量，llm_config 为代码生成阶段的配置；
+    配置了 LLM 后端池时按后端数量放大 (每个后端 max_concurrency 个并行请求)。
+    """
+    backends = len(resolve_backends(llm_config)) if llm_config is not None else 1
+    return {"max_concurrency": settings.max_concurrency * backends}
+
+def build_result(final_state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    从最终状态中提取返回给客户端的结果数据。
+    """
+    return {
+        "test_plan": [case.model_dump() for case in final_state.get("test_plan", [])],
+        "generated_code": final_state.get("generated_code_map", {}),
+        "token_usage": summarize_usage(final_state.get("token_usage") or {}),
+        "budget_skipped": final_state.get("budget_skipped") or [],
+        # 作为下一次增量重新生成的 previous_result 输入
+        "operation_hashes": final_state.get("operation_hashes") or {},
+        "spec_diff": final_state.get("spec_diff") or {}
+    }
+
+def summarize_usage(token_usage: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    将状态中的用量记录汇总为 {total, by_node, by_case}。
+    """
+    planner = token_usage.get("planner", {})
+    by_case = {key: usage for key, usage in token_usage.items() if key != "planner"}
+    generator = add_usage(*by_case.values())
+    return {
+        "total": add_usage(planner, generator),
+        "by_node": {"planner": add_usage(planner), "generator": generator},
+        "by_case": by_case
+    }
+
+async def astream_workflow(initial_state: Dict[str, Any], config: Dict[str, Any]) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    异步流式执行工作流。
+
+    依次产出:
+    - ("update", {node_name: state_update})  每个节点 (包括每个并行的 generator 分支) 完成时
+    - ("custom", {"event": ..., ...})        节点内部通过 stream writer 推送的事件 (如流水线规划)
+    - ("final", final_state)                 整个图执行结束后的完整状态
+    """
+    final_state = initial_state
+    async for mode, chunk in agent_app.astream(initial_state, config=config, stream_mode=["updates", "values", "custom"]):
+        if mode == "updates":
+            yield "update", chunk
+        elif mode == "custom":
+            yield "custom", chunk
+        else:
+            final_state = chunk
+    yield "final", final_state
+
+async def astream_progress_events(initial_state: Dict[str, Any], config: Dict[str, Any]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    将工作流执行过程转换为面向客户端的进度事件，按发生顺序产出 (event, data):
+
+    - parser:    解析完成
+    - plan_case: (仅流水线模式) 单个用例从 Planner 流中解析完成
+    - plan:      Planner 返回测试计划后立即推送
+    - case:      每个用例的代码生成完成后立即推送 (流水线模式下可能早于 plan)
+    - final:     Aggregator 聚合完成后的最终文件
+    - error:     任一阶段失败 (之后不会再有 final)
+    """
+    async for kind, payload in astream_workflow(initial_state, config):
+        if kind == "custom":
+            event = payload.get("event")
+            if event == "plan_case":
+                yield "plan_case", payload["case"]
+            elif event == "case":
+                yield "case", {"id": payload["id"], "code": payload["code"]}
+            continue
+
+        if kind == "final":
+            if payload.get("error"):
+                yield "error", {"error": payload["error"]}
+            else:
+                yield "final", {
+                    "final_output": payload.get("final_output", ""),
+                    "result": build_result(payload)
+                }
+            continue
+
+        for node_name, update in payload.items():
+            update = update or {}
+            if update.get("error"):
+                # 错误在最终状态中统一上报
+                continue
+            if node_name == "parser":
+                yield "parser", {"status": "completed"}
+            elif node_name == "planner":
+                test_plan = update.get("test_plan") or []
+                yield "plan", {"test_plan": [case.model_dump() for case in test_plan]}
+            elif node_name == "generator":
+                for case_id, code in (update.get("generated_code_map") or {}).items():
+                    yield "case", {"id": case_id, "code": code}
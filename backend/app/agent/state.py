@@ -1,7 +1,17 @@
-from typing import List, Dict, TypedDict, Annotated
+from typing import List, Dict, Optional, Tuple, TypedDict, Annotated
 import operator
 from app.models.schemas import TestCase, LLMConfig
 
+def merge_dicts(left: Dict, right: Dict) -> Dict:
+    """
+    字典合并 reducer: 并行分支返回的部分结果按 key 合并，后写入者覆盖。
+    """
+    if not left:
+        return dict(right or {})
+    if not right:
+        return left
+    return {**left, **right}
+
 class AgentState(TypedDict):
     """
     LangGraph 的状态定义。
@@ -10,10 +20,14 @@ class AgentState(TypedDict):
     
     # 原始输入
     openapi_spec_content: str  # 原始 OpenAPI 字符串
+    spec_id: Optional[str]     # 通过上传接口保存的 Spec (提供时 Parser 从文件读取，忽略 openapi_spec_content)
     parse_result: Dict         # 解析后的 OpenAPI 字典
     
     # 无需 LLM 处理的静态数据
     spec_summary: str          # 简化后的 Spec，用于 Prompt
+    operation_index: Dict[Tuple[str, str], str]  # (path, METHOD) -> 单个操作的 Spec 切片，用于代码生成 Prompt
+    operation_hashes: Dict[str, str]  # `METHOD path` -> 操作的规范化哈希，用于增量重新生成
+    spec_diff: Dict[str, List[str]]   # 与上一版本结果的操作差异 (added / changed / removed / unchanged)
     user_preferences: Dict     # 用户偏好 (语言, 模型配置等)
     
     # 动态生成的数据
@@ -21,12 +35,15 @@ class AgentState(TypedDict):
     
     # 生成的代码映射 (Map-Reduce 阶段使用)
     # key: test_case_id, value: generated_code
-    generated_code_map: Dict[str, str] 
+    # 每个并行的 generator 分支只返回自己的用例，由 merge_dicts 合并
+    generated_code_map: Annotated[Dict[str, str], merge_dicts]
+    
+    # Token 用量记录
+    # key: "planner" 或 test_case_id，value: {"prompt_tokens", "completion_tokens", "calls", "cached_calls", "estimated"}
+    # 发生过模型升级时另有 "escalations" (升级调用次数)
+    token_usage: Annotated[Dict[str, Dict], merge_dicts]
+    budget_skipped: List[str]  # 因超出 Token 预算而未生成代码的用例 ID
     
     # 最终输出
     final_output: str          # 组合后的最终代码文件内容
     error: str                 # 错误信息 (如果有)
-
-# 注意: LangGraph 的 StateGraph 可能需要 Annotated 来定义 reducer
-# 例如: generated_code_map: Annotated[Dict[str, str], merge_dicts]
-# 这里为了简单起见暂未添加 reducer，因为主要流程是线性的或 map-reduce
@@ -1,71 +1,100 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from app.models.schemas import GenerateRequest, GenerateResponse, TestCase
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from app.models.schemas import GenerateRequest, GenerateResponse, TaskStatusResponse
 from app.core.settings import SettingsManager, AppSettings
 from app.agent.graph import agent_app
-from langchain_core.messages import HumanMessage
+from app.agent.nodes import estimate_run_tokens
+from app.agent.runner import build_initial_state, build_run_config, build_result, astream_progress_events
+from app.services.task_manager import task_manager
+from app.services.llm_cache import get_llm_cache
+from app.services.spec_cache import spec_cache
+from app.core.resilience import provider_guards
+from app.services.spec_upload import SpecUploadService
+from app.services.result_store import get_result_store, TASK_FIELDS, CASE_FIELDS
+import asyncio
+import json
+import time
 import uuid
-import traceback
 
 router = APIRouter()
 
 @router.get("/settings", response_model=AppSettings)
 async def get_settings():
     """获取当前全局配置"""
-    return SettingsManager.load_settings()
+    return await asyncio.to_thread(SettingsManager.load_settings)
 
 @router.post("/settings", response_model=AppSettings)
 async def save_settings(settings: AppSettings):
     """保存全局配置"""
-    SettingsManager.save_settings(settings)
+    await asyncio.to_thread(SettingsManager.save_settings, settings)
     return settings
 
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """获取 LLM 响应缓存及 Spec 解析缓存的命中统计"""
+    cache = await asyncio.to_thread(get_llm_cache)
+    if cache is None:
+        return {"enabled": False, "spec_cache": spec_cache.get_stats()}
+    return {"enabled": True, **cache.get_stats(), "spec_cache": spec_cache.get_stats()}
+
+@router.get("/llm/providers")
+async def get_llm_providers():
+    """获取各 LLM Provider 的熔断状态、延迟与错误率的滑动平均及进行中的请求数"""
+    return provider_guards.stats()
+
+@router.post("/specs")
+async def upload_spec(request: Request):
+    """
+    上传 OpenAPI Spec，返回 spec_id 供 `GenerateRequest.spec_id` 使用。
+
+    - 原始请求体: 直接发送 JSON / YAML 内容 (除 multipart/form-data 外的任意 Content-Type)
+    - gzip: 设置 `Content-Encoding: gzip`
+
+    内容边接收边写入临时文件，不会在内存中保留完整副本；解压后超过 upload_max_bytes 时返回 413。
+    multipart/form-data 上传返回 415。
+    """
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise HTTPException(status_code=415, detail="Multipart uploads are not supported; send the raw spec as the request body instead.")
+    settings = await asyncio.to_thread(SettingsManager.load_settings)
+    compressed = request.headers.get("content-encoding", "").lower() == "gzip"
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.upload_max_bytes:
+        raise HTTPException(status_code=413, detail=f"Spec exceeds the upload limit of {settings.upload_max_bytes} bytes.")
+
+    return await SpecUploadService.receive(request.stream(), compressed)
+
 @router.post("/generate", response_model=GenerateResponse)
 async def generate_test_cases(request: GenerateRequest):
     """
     触发测试用例生成工作流。
     """
     task_id = str(uuid.uuid4())
+    started_at = time.time()
     
     # 构建初始状态
-    initial_state = {
-        "openapi_spec_content": request.openapi_content,
-        "user_preferences": {
-            "target_language": request.target_language,
-            "llm_config": request.llm_config.dict(),
-            "include_boundary": request.include_boundary,
-            "include_negative": request.include_negative
-        },
-        # 初始化其他字段为空
-        "parse_result": {},
-        "spec_summary": "",
-        "test_plan": [],
-        "generated_code_map": {},
-        "final_output": "",
-        "error": None
-    }
+    initial_state = build_initial_state(request)
     
     try:
         # 调用 LangGraph
-        # 注意: 这里是同步调用 invoke，生产环境对于长时间任务应使用后台任务或异步队列
+        # 使用 ainvoke 异步执行，LLM 调用期间不会阻塞事件循环 (其他请求及 /health 可正常响应)
         print(f"Starting workflow for task {task_id}")
-        final_state = agent_app.invoke(initial_state)
+        settings = await asyncio.to_thread(SettingsManager.load_settings)
+        final_state = await agent_app.ainvoke(initial_state, config=build_run_config(settings, request.generator_llm_config or request.llm_config))
         
         if final_state.get("error"):
+            await asyncio.to_thread(_persist_result, task_id, "failed", None, "", final_state["error"], started_at)
             return GenerateResponse(
                 task_id=task_id,
                 status="failed",
                 error=final_state["error"]
             )
-            
-        result_data = {
-            "test_plan": [case.dict() for case in final_state.get("test_plan", [])],
-            "generated_code": final_state.get("generated_code_map", {})
-        }
         
+        result = build_result(final_state)
+        await asyncio.to_thread(_persist_result, task_id, "completed", result, final_state.get("final_output", ""), None, started_at)
         return GenerateResponse(
             task_id=task_id,
             status="completed",
-            result=result_data
+            result=result
         )
         
     except Exception as e:
@@ -75,3 +104,160 @@ async def generate_test_cases(request: GenerateRequest):
             status="failed",
             error=str(e)
         )
+
+@router.post("/generate/estimate")
+async def estimate_generation(request: GenerateRequest):
+    """
+    在不调用 LLM 的情况下预估本次生成的 Token 开销 (Planner Prompt 及每个操作的单用例开销)。
+    """
+    estimate = await asyncio.to_thread(estimate_run_tokens, build_initial_state(request))
+    if estimate.get("error"):
+        raise HTTPException(status_code=400, detail=estimate["error"])
+    return estimate
+
+def _persist_result(task_id: str, status: str, result, final_output: str, error, started_at: float):
+    """将同步 / 流式接口的结果写入持久化存储 (存储被禁用或写入失败时忽略)"""
+    try:
+        store = get_result_store()
+        if store is not None:
+            timings = {"queued_seconds": 0.0, "duration_seconds": round(time.time() - started_at, 3), "stages": {}}
+            store.save(task_id, status, result, final_output, error, timings, started_at)
+    except Exception as e:
+        print(f"Failed to persist result of task {task_id}: {e}")
+
+def _format_sse(event: str, data: dict) -> str:
+    """按 Server-Sent Events 协议格式化单个事件"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/generate/stream")
+async def generate_test_cases_stream(request: GenerateRequest):
+    """
+    以 Server-Sent Events 流式返回生成进度。
+
+    事件顺序: task -> parser -> plan -> case (每个用例一个) -> final，失败时以 error 结束。
+    """
+    task_id = str(uuid.uuid4())
+    initial_state = build_initial_state(request)
+    settings = await asyncio.to_thread(SettingsManager.load_settings)
+    config = build_run_config(settings, request.generator_llm_config or request.llm_config)
+
+    async def event_stream():
+        started_at = time.time()
+        yield _format_sse("task", {"task_id": task_id})
+        try:
+            async for event, data in astream_progress_events(initial_state, config):
+                if event == "final":
+                    await asyncio.to_thread(_persist_result, task_id, "completed", data["result"], data["final_output"], None, started_at)
+                elif event == "error":
+                    await asyncio.to_thread(_persist_result, task_id, "failed", None, "", data["error"], started_at)
+                yield _format_sse(event, data)
+        except Exception as e:
+            print(f"Streaming workflow failed: {e}")
+            yield _format_sse("error", {"error": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # 禁止代理缓冲，确保事件实时到达客户端
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/tasks", response_model=GenerateResponse)
+async def submit_task(request: GenerateRequest):
+    """
+    提交后台生成任务，立即返回 task_id (status=processing)。
+    通过 `GET /tasks/{task_id}` 查询进度，`GET /tasks/{task_id}/result` 获取结果。
+    """
+    task_id = str(uuid.uuid4())
+    settings = await asyncio.to_thread(SettingsManager.load_settings)
+    task_manager.configure(settings.max_workers, settings.task_ttl_seconds)
+    task_manager.submit(task_id, build_initial_state(request), build_run_config(settings, request.generator_llm_config or request.llm_config))
+    return GenerateResponse(task_id=task_id, status="processing")
+
+@router.get("/tasks/{task_id}", response_model=TaskStatusResponse)
+async def get_task_status(task_id: str):
+    """查询后台任务的状态与进度 (已完成用例数 / 用例总数)"""
+    record = task_manager.get(task_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found or expired.")
+    return record.to_status()
+
+@router.get("/tasks/{task_id}/result", response_model=GenerateResponse)
+async def get_task_result(task_id: str):
+    """
+    获取任务的完整结果。任务未完成时 status 为 processing 且 result 为空。
+    已结束的任务从持久化存储读取；大结果建议使用分页接口 `GET /tasks/{task_id}/cases`。
+    """
+    record = task_manager.get(task_id)
+    if record is not None:
+        # 先读取 result 再检查 persisted: 持久化完成后 result 才会被释放
+        result = record.result
+        if not record.persisted:
+            return GenerateResponse(task_id=task_id, status=record.status, result=result, error=record.error)
+    
+    store = await _require_store(task_id)
+    task = await asyncio.to_thread(store.get_task, task_id, ["status", "error"])
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found or expired.")
+    result = await asyncio.to_thread(store.get_result, task_id) if task["status"] == "completed" else None
+    return GenerateResponse(task_id=task_id, status=task["status"], result=result, error=task["error"])
+
+async def _require_store(task_id: str):
+    store = await asyncio.to_thread(get_result_store)
+    if store is None:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found (result store is disabled).")
+    return store
+
+def _parse_fields(fields: str, allowed) -> list:
+    """解析逗号分隔的字段列表，包含未知字段时返回 400"""
+    selected = [field.strip() for field in fields.split(",") if field.strip()] if fields else []
+    unknown = [field for field in selected if field not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}")
+    return selected
+
+@router.get("/tasks/{task_id}/artifacts")
+async def get_task_artifacts(task_id: str, fields: str = Query("", description="逗号分隔的任务级字段，为空时返回全部")):
+    """读取已持久化任务的任务级数据 (状态、最终文件、Token 用量、耗时等)，支持字段选择"""
+    selected = _parse_fields(fields, TASK_FIELDS)
+    store = await _require_store(task_id)
+    task = await asyncio.to_thread(store.get_task, task_id, selected or None)
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found or expired.")
+    return task
+
+@router.get("/tasks/{task_id}/output")
+async def get_task_output(task_id: str):
+    """以流的形式下载已持久化任务的最终代码文件 (按块从存储读取)"""
+    store = await _require_store(task_id)
+    task = await asyncio.to_thread(store.get_task, task_id, ["status"])
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found or expired.")
+    if task["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Task {task_id} has no output (status: {task['status']}).")
+    return StreamingResponse(store.iter_final_output(task_id), media_type="text/plain; charset=utf-8")
+
+@router.get("/tasks/{task_id}/cases")
+async def list_task_cases(
+    task_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    fields: str = Query("", description="逗号分隔的用例字段 (含 code)，为空时返回全部")
+):
+    """按计划顺序分页读取已持久化任务的用例及代码，支持字段选择"""
+    selected = _parse_fields(fields, CASE_FIELDS)
+    store = await _require_store(task_id)
+    task = await asyncio.to_thread(store.get_task, task_id, ["case_count"])
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found or expired.")
+    items = await asyncio.to_thread(store.list_cases, task_id, offset, limit, selected or None)
+    return {"task_id": task_id, "total": task["case_count"], "offset": offset, "limit": limit, "items": items}
+
+@router.get("/tasks/{task_id}/cases/{case_id}")
+async def get_task_case(task_id: str, case_id: str):
+    """读取已持久化任务中的单个用例及其代码"""
+    store = await _require_store(task_id)
+    case = await asyncio.to_thread(store.get_case, task_id, case_id)
+    if case is None:
+        raise HTTPException(status_code=404, detail=f"Case {case_id} of task {task_id} not found.")
+    return case
@@ -1,23 +1,397 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Set, Tuple
+import httpx
 from langchain_openai import ChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.messages import HumanMessage
 from app.models.schemas import LLMConfig
+from app.core.settings import SettingsManager
+from app.services.llm_cache import LLMCache, get_llm_cache
+from app.core.resilience import Failover, ProviderGuard, provider_guards, call_with_failover, acall_with_failover
+from app.utils.token_utils import estimate_tokens
 import os
 
-def get_llm(config: LLMConfig):
+# 所有节点使用统一的采样温度，同时也是缓存 Key 的一部分
+DEFAULT_TEMPERATURE = 0.2
+
+def normalize_base_url(base_url: str) -> str:
     """
-    获取通用的 ChatOpenAI 实例。
-    所有厂商 (DeepSeek, Qwen, Google-via-OpenAI) 都应兼容 OpenAI 格式。
+    清理用户输入的 Base URL，去掉 `/chat/completions` 后缀与结尾的斜杠。
     """
-    base_url = config.base_url.strip()
+    base_url = base_url.strip()
     if base_url.endswith("/chat/completions"):
         base_url = base_url[:-17]  # Remove /chat/completions
     
     # Remove trailing slash to be safe, though OpenAI client usually handles it
-    base_url = base_url.rstrip("/")
+    return base_url.rstrip("/")
+
+# 正在关闭的异步客户端任务 (保留引用，避免任务在完成前被回收)
+_closing_tasks: Set[asyncio.Task] = set()
+
+class _Provider:
+    """
+    单个 Provider (base_url) 共享的 HTTP 连接池。
+    同步与异步客户端分别维护一个 keep-alive 连接池。
+
+    in_use 为进行中的调用数；被淘汰或因配置变化而退役的连接池在 in_use 归零后才关闭，
+    不会中断进行中的请求 (包括持续时间超过 idle_seconds 的流式调用)。
+    """
+
+    def __init__(self, pool_size: int, idle_seconds: int, timeout: httpx.Timeout):
+        limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=idle_seconds
+        )
+        self.http_client = httpx.Client(limits=limits, timeout=timeout)
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+        self.in_use = 0
+        self.retired = False
+
+    def close(self):
+        self.http_client.close()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            task = loop.create_task(self.http_async_client.aclose())
+            _closing_tasks.add(task)
+            task.add_done_callback(_closing_tasks.discard)
+            return
+        # 没有运行中的事件循环时在临时循环中关闭
+        try:
+            asyncio.run(self.http_async_client.aclose())
+        except Exception as e:
+            print(f"Failed to close async LLM client: {e}")
+
+class LLMClientRegistry:
+    """
+    LLM 客户端注册表。
+
+    - ChatOpenAI 实例按 (base_url, api_key, model, temperature) 复用，避免每个用例重复构建。
+    - 同一 base_url 下的所有实例共享一个 HTTP 连接池 (keep-alive)，避免重复的 TCP/TLS 握手。
+    - 超过 idle_seconds 未使用的实例会被淘汰，Provider 下没有实例且没有进行中的调用时关闭其连接池。
+    - 连接与读取超时有限，停滞的 Provider 以超时错误结束调用，交由重试与故障转移处理。
+    """
+
+    def __init__(self, pool_size: int = 20, idle_seconds: int = 300, connect_timeout: float = 10.0, read_timeout: float = 120.0):
+        self.pool_size = pool_size
+        self.idle_seconds = idle_seconds
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._clients: Dict[Tuple[str, str, str, float], Tuple[ChatOpenAI, float]] = {}
+        self._providers: Dict[str, _Provider] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, pool_size: int, idle_seconds: int, connect_timeout: float = 10.0, read_timeout: float = 120.0):
+        """
+        应用最新配置。连接池大小或超时变化后，新的 Provider 连接池按新配置创建，
+        旧连接池在其进行中的调用结束后关闭。
+        """
+        with self._lock:
+            if (pool_size, connect_timeout, read_timeout) != (self.pool_size, self.connect_timeout, self.read_timeout):
+                self.pool_size = pool_size
+                self.connect_timeout = connect_timeout
+                self.read_timeout = read_timeout
+                self._reset()
+            self.idle_seconds = idle_seconds
+
+    def get(self, config: LLMConfig, temperature: float = DEFAULT_TEMPERATURE) -> ChatOpenAI:
+        """
+        获取 (或创建) 实例，不登记为进行中的调用；发起调用请使用 `lease`。
+        """
+        with self._lock:
+            return self._get(config, temperature)[0]
+
+    @contextmanager
+    def lease(self, config: LLMConfig, temperature: float = DEFAULT_TEMPERATURE) -> Iterator[ChatOpenAI]:
+        """
+        获取实例并在 with 块内登记为进行中的调用，期间其连接池不会被关闭。
+        """
+        with self._lock:
+            llm, provider = self._get(config, temperature)
+            provider.in_use += 1
+        try:
+            yield llm
+        finally:
+            with self._lock:
+                provider.in_use -= 1
+                close = provider.retired and provider.in_use == 0
+            if close:
+                provider.close()
 
-    return ChatOpenAI(
-        model=config.model_name,
-        api_key=config.api_key,
-        base_url=base_url,
-        temperature=0.2
+    def size(self) -> Tuple[int, int]:
+        """返回 (ChatOpenAI 实例数, Provider 连接池数)"""
+        with self._lock:
+            return len(self._clients), len(self._providers)
+
+    def _get(self, config: LLMConfig, temperature: float) -> Tuple[ChatOpenAI, _Provider]:
+        # 调用方需持有 self._lock
+        base_url = normalize_base_url(config.base_url)
+        key = (base_url, config.api_key, config.model_name, temperature)
+        now = time.monotonic()
+        self._evict_idle(now)
+        provider = self._providers.get(base_url)
+        if provider is None:
+            timeout = httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+            provider = _Provider(self.pool_size, self.idle_seconds, timeout)
+            self._providers[base_url] = provider
+        entry = self._clients.get(key)
+        if entry is not None:
+            llm = entry[0]
+        else:
+            llm = ChatOpenAI(
+                model=config.model_name,
+                api_key=config.api_key,
+                base_url=base_url,
+                temperature=temperature,
+                http_client=provider.http_client,
+                http_async_client=provider.http_async_client,
+                # 流式调用时也返回 Token 用量
+                stream_usage=True,
+                # 重试由 app.core.resilience 统一处理 (限流、Retry-After 与熔断)，避免两层重试叠加
+                max_retries=0
+            )
+        self._clients[key] = (llm, now)
+        return llm, provider
+
+    def _evict_idle(self, now: float):
+        # 调用方需持有 self._lock；仍有进行中调用的连接池保留到下一次淘汰检查
+        deadline = now - self.idle_seconds
+        for key in [k for k, (_, last_used) in self._clients.items() if last_used < deadline]:
+            del self._clients[key]
+        active = {key[0] for key in self._clients}
+        for base_url in [b for b, p in self._providers.items() if b not in active and p.in_use == 0]:
+            self._providers.pop(base_url).close()
+
+    def _reset(self):
+        # 调用方需持有 self._lock；仍有进行中调用的连接池标记为退役，由最后一个调用结束时关闭
+        self._clients.clear()
+        for provider in self._providers.values():
+            if provider.in_use:
+                provider.retired = True
+            else:
+                provider.close()
+        self._providers.clear()
+
+llm_registry = LLMClientRegistry()
+
+@contextmanager
+def lease_llm(config: LLMConfig) -> Iterator[ChatOpenAI]:
+    """
+    获取通用的 ChatOpenAI 实例，在 with 块内完成一次调用。
+    所有厂商 (DeepSeek, Qwen, Google-via-OpenAI) 都应兼容 OpenAI 格式。
+    
+    实例从 `llm_registry` 中复用，同一 Provider 共享 keep-alive 连接池；
+    with 块结束前该连接池不会因空闲淘汰或配置变化而被关闭。
+    """
+    settings = SettingsManager.load_settings()
+    llm_registry.configure(
+        settings.llm_pool_size, settings.llm_pool_idle_seconds, settings.llm_connect_timeout, settings.llm_read_timeout
     )
+    with llm_registry.lease(config) as llm:
+        yield llm
+
+def _invoke(config: LLMConfig, prompt: str):
+    with lease_llm(config) as llm:
+        return llm.invoke([HumanMessage(content=prompt)])
+
+async def _ainvoke(config: LLMConfig, prompt: str):
+    with lease_llm(config) as llm:
+        return await llm.ainvoke([HumanMessage(content=prompt)])
+
+def get_guard(config: LLMConfig) -> ProviderGuard:
+    """
+    获取 Provider (base_url + api_key) 的限流 / 重试 / 熔断保护。
+    """
+    return provider_guards.get(normalize_base_url(config.base_url), config.api_key, SettingsManager.load_settings())
+
+def _backend_pool(config: LLMConfig) -> Tuple[List[LLMConfig], List[float]]:
+    """
+    展开 LLM 后端池，返回 (后端配置列表, 路由权重列表)。
+
+    主配置在前 (权重 1.0)，其后为 `config.backends` (为 None 时使用配置文件中的 llm_backends)；
+    相同 (base_url, api_key, model) 的后端只保留一个。
+    """
+    extra = config.backends if config.backends is not None else SettingsManager.load_settings().llm_backends
+    backends = [config.model_copy(update={"backends": None})]
+    weights = [1.0]
+    seen = {(normalize_base_url(config.base_url), config.api_key, config.model_name)}
+    for backend in extra or []:
+        model_name = backend.model_name or config.model_name
+        key = (normalize_base_url(backend.base_url), backend.api_key, model_name)
+        if key in seen:
+            continue
+        seen.add(key)
+        backends.append(LLMConfig(base_url=backend.base_url, api_key=backend.api_key, model_name=model_name, tier=config.tier))
+        weights.append(backend.weight)
+    return backends, weights
+
+def resolve_backends(config: LLMConfig) -> List[LLMConfig]:
+    """返回 LLM 后端池中的全部后端配置 (主配置在前)"""
+    return _backend_pool(config)[0]
+
+def pool_concurrency(config: LLMConfig) -> int:
+    """
+    后端池的并发上限: 每个后端 max_concurrency 个并行请求。
+    """
+    return SettingsManager.load_settings().max_concurrency * len(resolve_backends(config))
+
+def _estimated_call_tokens(prompt: str) -> int:
+    # Token 限流按 Prompt 估算值加预估的 Completion Token 预占
+    return estimate_tokens(prompt) + SettingsManager.load_settings().estimated_completion_tokens
+
+def _cache_key(config: LLMConfig, prompt: str) -> str:
+    return LLMCache.make_key(prompt, config.model_name, normalize_base_url(config.base_url), DEFAULT_TEMPERATURE)
+
+def make_usage(prompt: str, content: str, message=None, cached: bool = False) -> Dict[str, Any]:
+    """
+    构造单次调用的 Token 用量记录。
+
+    优先使用 Provider 返回的 `usage_metadata`；缺失时使用本地估算并标记 estimated。
+    命中缓存的调用不产生费用，用量记为 0。
+    """
+    if cached:
+        return {"prompt_tokens": 0, "completion_tokens": 0, "calls": 0, "cached_calls": 1, "estimated": False}
+    metadata = getattr(message, "usage_metadata", None) if message is not None else None
+    if metadata:
+        return {
+            "prompt_tokens": metadata.get("input_tokens", 0),
+            "completion_tokens": metadata.get("output_tokens", 0),
+            "calls": 1,
+            "cached_calls": 0,
+            "estimated": False
+        }
+    return {
+        "prompt_tokens": estimate_tokens(prompt),
+        "completion_tokens": estimate_tokens(content),
+        "calls": 1,
+        "cached_calls": 0,
+        "estimated": True
+    }
+
+def add_usage(*usages: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    累加多条用量记录。
+    """
+    total = {"prompt_tokens": 0, "completion_tokens": 0, "calls": 0, "cached_calls": 0, "estimated": False}
+    for usage in usages:
+        if not usage:
+            continue
+        for key in ("prompt_tokens", "completion_tokens", "calls", "cached_calls"):
+            total[key] += usage.get(key, 0)
+        total["estimated"] = total["estimated"] or usage.get("estimated", False)
+        if usage.get("escalations"):
+            # 升级到更强模型的调用次数，仅在发生过升级时出现
+            total["escalations"] = total.get("escalations", 0) + usage["escalations"]
+    return total
+
+def _accepted(content: str, validate: Optional[Callable[[str], bool]]) -> bool:
+    """输出是否可以写入 (或从) 缓存: 调用方的校验拒绝的输出不缓存，避免重试时反复命中同一份坏结果"""
+    return validate is None or validate(content)
+
+def invoke_llm(config: LLMConfig, prompt: str, use_cache: bool = True,
+               validate: Optional[Callable[[str], bool]] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    调用 LLM，返回 (文本内容, Token 用量)，命中缓存时不发起请求。
+
+    Args:
+        config: LLM 配置
+        prompt: 完整的 Prompt 文本
+        use_cache: False 时跳过缓存读取 (强制重新生成)，但结果仍会写入缓存
+        validate: 可选，调用方对输出的校验 (例如能否解析为测试计划)；未通过校验的输出不写入缓存，
+            未通过校验的缓存条目视为未命中
+    """
+    cache = get_llm_cache()
+    key = _cache_key(config, prompt) if cache else None
+    if cache and use_cache:
+        cached = cache.get(key)
+        if cached is not None and _accepted(cached, validate):
+            return cached, make_usage(prompt, cached, cached=True)
+
+    backends, weights = _backend_pool(config)
+    _, response = call_with_failover(
+        [get_guard(backend) for backend in backends], _estimated_call_tokens(prompt),
+        lambda index: _invoke(backends[index], prompt), weights
+    )
+    content = response.content
+    if cache and _accepted(content, validate):
+        cache.set(key, content)
+    return content, make_usage(prompt, content, response)
+
+async def ainvoke_llm(config: LLMConfig, prompt: str, use_cache: bool = True,
+                      validate: Optional[Callable[[str], bool]] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    `invoke_llm` 的异步版本，缓存的磁盘读写在线程池中执行。
+    """
+    cache = await asyncio.to_thread(get_llm_cache)
+    key = _cache_key(config, prompt) if cache else None
+    if cache and use_cache:
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None and _accepted(cached, validate):
+            return cached, make_usage(prompt, cached, cached=True)
+
+    backends, weights = _backend_pool(config)
+    _, response = await acall_with_failover(
+        [get_guard(backend) for backend in backends], _estimated_call_tokens(prompt),
+        lambda index: _ainvoke(backends[index], prompt), weights
+    )
+    content = response.content
+    if cache and _accepted(content, validate):
+        await asyncio.to_thread(cache.set, key, content)
+    return content, make_usage(prompt, content, response)
+
+async def astream_llm(config: LLMConfig, prompt: str, use_cache: bool = True, usage: Optional[Dict[str, Any]] = None,
+                     validate: Optional[Callable[[str], bool]] = None) -> AsyncIterator[str]:
+    """
+    流式调用 LLM，逐块产出文本内容。
+    命中缓存时一次性产出完整内容；流结束后完整内容通过 validate 校验时写入缓存。
+
+    Args:
+        usage: 可选，流结束后写入本次调用的 Token 用量
+        validate: 可选，同 `invoke_llm`
+    """
+    cache = await asyncio.to_thread(get_llm_cache)
+    key = _cache_key(config, prompt) if cache else None
+    if cache and use_cache:
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None and _accepted(cached, validate):
+            if usage is not None:
+                usage.update(make_usage(prompt, cached, cached=True))
+            yield cached
+            return
+
+    backends, weights = _backend_pool(config)
+    failover = Failover([get_guard(backend) for backend in backends], _estimated_call_tokens(prompt), weights)
+    while True:
+        index, wait = failover.next()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        parts = []
+        final_chunk = None
+        start = time.monotonic()
+        try:
+            with lease_llm(backends[index]) as llm:
+                async for chunk in llm.astream([HumanMessage(content=prompt)]):
+                    # stream_usage=True 时，用量信息附带在流中的某个分块上
+                    if getattr(chunk, "usage_metadata", None):
+                        final_chunk = chunk
+                    if chunk.content:
+                        parts.append(chunk.content)
+                        yield chunk.content
+        except BaseException as e:
+            # 已经产出内容后无法透明重试或转移 (下游已消费部分输出)
+            if not failover.failed(index, e, time.monotonic() - start) or parts:
+                raise
+            continue
+        failover.succeeded(index, time.monotonic() - start)
+        break
+    content = "".join(parts)
+    if usage is not None:
+        usage.update(make_usage(prompt, content, final_chunk))
+    if cache and _accepted(content, validate):
+        await asyncio.to_thread(cache.set, key, content)
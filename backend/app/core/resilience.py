@@ -0,0 +1,398 @@
+import asyncio
+import email.utils
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+import httpx
+import openai
+
+T = TypeVar("T")
+
+# 可重试的 HTTP 状态码: 超时、冲突、限流与服务端错误
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# Retry-After 最多等待的秒数，避免 Provider 返回过大的值导致任务长时间挂起
+MAX_RETRY_AFTER_SECONDS = 120.0
+# 后端延迟与错误率的指数滑动平均系数
+STATS_EWMA_ALPHA = 0.2
+# 错误率很高的后端仍保留的最小路由分数比例，使其恢复后能重新获得流量
+MIN_HEALTH_FACTOR = 0.05
+
+class LLMUnavailableError(RuntimeError):
+    """Provider 熔断期间直接拒绝调用 (快速失败，不发起请求)"""
+
+class TokenBucket:
+    """
+    令牌桶限流器 (线程安全)。
+
+    `reserve` 预占令牌并返回需要等待的秒数，令牌不足时余额可以为负，
+    后来的调用方依次排在后面，并发请求因此被均匀错开，而不是同时醒来重试。
+    """
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def configure(self, per_minute: float):
+        with self._lock:
+            if per_minute != self.per_minute:
+                self.per_minute = per_minute
+                self.capacity = per_minute
+                self.tokens = min(self.tokens, per_minute)
+
+    def reserve(self, amount: float = 1) -> float:
+        with self._lock:
+            if self.per_minute <= 0:
+                return 0.0
+            now = time.monotonic()
+            rate = self.per_minute / 60.0
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * rate)
+            self.updated = now
+            # 单次请求超过桶容量时按容量计，否则永远无法满足
+            self.tokens -= min(amount, self.capacity)
+            return 0.0 if self.tokens >= 0 else -self.tokens / rate
+
+class CircuitBreaker:
+    """
+    熔断器: closed → (连续失败达到阈值) → open → (冷却 reset_seconds) → half_open。
+
+    open 期间调用直接被拒绝；half_open 只放行一个探测请求，成功则恢复 closed，失败则重新 open。
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def configure(self, failure_threshold: int, reset_seconds: float):
+        with self._lock:
+            self.failure_threshold = failure_threshold
+            self.reset_seconds = reset_seconds
+
+    def allow(self) -> Optional[float]:
+        """
+        允许调用时返回 None，否则返回距离下一次探测的秒数。
+        """
+        with self._lock:
+            if self.failure_threshold <= 0 or self.state == "closed":
+                return None
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if self.state == "open" and remaining > 0:
+                return remaining
+            if self._probing:
+                return max(remaining, 1.0)
+            self.state = "half_open"
+            self._probing = True
+            return None
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.failure_threshold > 0 and (self.state == "half_open" or self.failures >= self.failure_threshold):
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """探测请求以不计入健康状态的错误结束时，释放探测名额"""
+        with self._lock:
+            self._probing = False
+
+class ProviderGuard:
+    """
+    单个 Provider (base_url + api_key) 的调用保护: 请求数 / Token 数限流 + 熔断，
+    同时记录延迟与错误率的滑动平均及进行中的请求数，供后端池路由使用。
+    """
+
+    def __init__(self, name: str, settings):
+        self.name = name
+        self.requests = TokenBucket(settings.llm_requests_per_minute)
+        self.tokens = TokenBucket(settings.llm_tokens_per_minute)
+        self.breaker = CircuitBreaker(settings.llm_circuit_failure_threshold, settings.llm_circuit_reset_seconds)
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.inflight = 0
+        # Provider 通过 Retry-After 要求暂停到的时间点 (monotonic)，对所有调用方生效
+        self.retry_at = 0.0
+        self._stats_lock = threading.Lock()
+        self.configure(settings)
+
+    def configure(self, settings):
+        self.max_retries = settings.llm_max_retries
+        self.base_delay = settings.llm_retry_base_delay
+        self.max_delay = settings.llm_retry_max_delay
+        self.requests.configure(settings.llm_requests_per_minute)
+        self.tokens.configure(settings.llm_tokens_per_minute)
+        self.breaker.configure(settings.llm_circuit_failure_threshold, settings.llm_circuit_reset_seconds)
+
+    def before_call(self, estimated_tokens: int) -> float:
+        """
+        熔断检查并预占限流配额，返回发起请求前需要等待的秒数。
+
+        Raises:
+            LLMUnavailableError: 熔断器处于 open 状态
+        """
+        wait = self.breaker.allow()
+        if wait is not None:
+            raise LLMUnavailableError(
+                f"LLM provider {self.name} is temporarily unavailable (circuit open), retry in {wait:.1f}s"
+            )
+        return max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+
+    def after_failure(self, error: BaseException, attempt: int) -> Optional[float]:
+        """
+        记录一次失败的调用，返回重试前的等待秒数；不可重试或重试次数用尽时返回 None。
+        """
+        if not isinstance(error, Exception) or not is_retryable(error):
+            # 请求本身的错误 (参数、鉴权等) 不代表 Provider 不健康
+            self.breaker.release()
+            return None
+        self.breaker.record_failure()
+        if attempt >= self.max_retries:
+            return None
+        delay = self.backoff(attempt, error)
+        print(f"LLM call to {self.name} failed ({status_code_of(error) or type(error).__name__}), retrying in {delay:.1f}s")
+        return delay
+
+    def after_success(self):
+        self.breaker.record_success()
+
+    def begin(self):
+        with self._stats_lock:
+            self.inflight += 1
+
+    def end(self, elapsed: float, ok: Optional[bool]):
+        """
+        结束一次请求。ok 为 None 表示请求本身的错误，不计入后端的延迟与错误率。
+        """
+        with self._stats_lock:
+            self.inflight = max(self.inflight - 1, 0)
+            if ok is None:
+                return
+            self.error_rate += STATS_EWMA_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+            if ok:
+                self.latency = elapsed if self.latency is None else self.latency + STATS_EWMA_ALPHA * (elapsed - self.latency)
+
+    def score(self, weight: float, default_latency: float) -> float:
+        """路由分数: 权重 × 健康度² / (延迟 × (1 + 进行中的请求数))"""
+        health = max(1.0 - self.error_rate, MIN_HEALTH_FACTOR)
+        latency = self.latency or default_latency
+        return weight * health * health / (max(latency, 1e-3) * (1 + self.inflight))
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """
+        第 attempt 次重试前的等待时间: 带完全抖动的指数退避，且不短于 Retry-After。
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            retry_after = min(retry_after, MAX_RETRY_AFTER_SECONDS)
+            self.retry_at = max(self.retry_at, time.monotonic() + retry_after)
+            delay = max(delay, retry_after)
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "latency_ms": round(self.latency * 1000) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "inflight": self.inflight
+        }
+
+class ProviderGuardRegistry:
+    """按 (base_url, api_key) 维护 ProviderGuard，配置变更时原地更新"""
+
+    def __init__(self):
+        self._guards: Dict[Tuple[str, str], ProviderGuard] = {}
+        self._lock = threading.Lock()
+
+    def get(self, base_url: str, api_key: str, settings) -> ProviderGuard:
+        key = (base_url, api_key)
+        with self._lock:
+            guard = self._guards.get(key)
+            if guard is None:
+                # 日志与错误信息中不暴露完整的 API Key
+                guard = ProviderGuard(f"{base_url} (key ...{api_key[-4:]})" if api_key else base_url, settings)
+                self._guards[key] = guard
+            else:
+                guard.configure(settings)
+            return guard
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {guard.name: guard.stats() for guard in self._guards.values()}
+
+    def reset(self):
+        with self._lock:
+            self._guards.clear()
+
+provider_guards = ProviderGuardRegistry()
+
+def status_code_of(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None and isinstance(getattr(error, "response", None), httpx.Response):
+        status = error.response.status_code
+    return status
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Provider 侧的暂时性错误: 连接 / 超时错误，以及 408 / 409 / 429 / 5xx 响应。
+    """
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError, httpx.TransportError)):
+        return True
+    return status_code_of(error) in RETRYABLE_STATUS
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    解析错误响应中的 `retry-after-ms` / `Retry-After` (秒数或 HTTP 日期)。
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(float(value) / 1000.0, 0.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+class Failover:
+    """
+    一次逻辑调用在后端池中的路由、重试与故障转移状态。
+
+    - 按 `ProviderGuard.score` 加权随机选择后端，延迟低、错误少、负载轻的后端获得更多流量
+    - 后端返回可重试错误后进入退避，期间优先转移到其他后端，不等待；
+      Retry-After 记录在 ProviderGuard 上，其他并发调用同样会避开该后端
+    - 熔断中或重试次数用尽的后端在本次调用中不再使用；全部不可用时抛出最后一个错误
+    """
+
+    def __init__(self, guards: Sequence[ProviderGuard], estimated_tokens: int, weights: Optional[Sequence[float]] = None):
+        self.guards = list(guards)
+        self.weights = list(weights) if weights else [1.0] * len(self.guards)
+        self.estimated_tokens = estimated_tokens
+        self.attempts = [0] * len(self.guards)
+        self.ready_at = [0.0] * len(self.guards)
+        self.exhausted: set = set()
+        self.last_error: Optional[BaseException] = None
+
+    def next(self) -> Tuple[int, float]:
+        """
+        选择下一个后端，返回 (后端下标, 发起请求前需要等待的秒数)。
+        所有可用后端都在退避中时选择最早结束退避的后端。
+        """
+        while True:
+            candidates = [i for i in range(len(self.guards)) if i not in self.exhausted]
+            if not candidates:
+                raise self.last_error
+            now = time.monotonic()
+            ready_at = {i: max(self.ready_at[i], self.guards[i].retry_at) for i in candidates}
+            ready = [i for i in candidates if ready_at[i] <= now]
+            if ready:
+                index = self._choose(ready)
+            else:
+                index = min(candidates, key=ready_at.get)
+            try:
+                wait = self.guards[index].before_call(self.estimated_tokens)
+            except LLMUnavailableError as e:
+                self.exhausted.add(index)
+                self.last_error = e
+                continue
+            self.guards[index].begin()
+            return index, max(wait, ready_at[index] - now)
+
+    def failed(self, index: int, error: BaseException, elapsed: float) -> bool:
+        """
+        记录失败，返回是否还能继续 (重试或转移到其他后端)。
+        """
+        guard = self.guards[index]
+        retryable = isinstance(error, Exception) and is_retryable(error)
+        guard.end(elapsed, False if retryable else None)
+        delay = guard.after_failure(error, self.attempts[index])
+        if not retryable:
+            return False
+        self.attempts[index] += 1
+        self.last_error = error
+        if delay is None:
+            self.exhausted.add(index)
+        else:
+            self.ready_at[index] = time.monotonic() + delay
+        return len(self.exhausted) < len(self.guards)
+
+    def succeeded(self, index: int, elapsed: float):
+        self.guards[index].end(elapsed, True)
+        self.guards[index].after_success()
+
+    def _choose(self, indices: List[int]) -> int:
+        if len(indices) == 1:
+            return indices[0]
+        latencies = [guard.latency for guard in self.guards if guard.latency is not None]
+        default_latency = sum(latencies) / len(latencies) if latencies else 1.0
+        scores = [self.guards[i].score(self.weights[i], default_latency) for i in indices]
+        return random.choices(indices, weights=scores)[0]
+
+def call_with_failover(guards: Sequence[ProviderGuard], estimated_tokens: int, call: Callable[[int], T],
+                       weights: Optional[Sequence[float]] = None) -> Tuple[int, T]:
+    """
+    在后端池中执行同步调用 (限流、重试、熔断与故障转移)，返回 (后端下标, 结果)。
+    """
+    failover = Failover(guards, estimated_tokens, weights)
+    while True:
+        index, wait = failover.next()
+        if wait > 0:
+            time.sleep(wait)
+        start = time.monotonic()
+        try:
+            result = call(index)
+        except BaseException as e:
+            if not failover.failed(index, e, time.monotonic() - start):
+                raise
+            continue
+        failover.succeeded(index, time.monotonic() - start)
+        return index, result
+
+async def acall_with_failover(guards: Sequence[ProviderGuard], estimated_tokens: int, call: Callable[[int], Awaitable[T]],
+                              weights: Optional[Sequence[float]] = None) -> Tuple[int, T]:
+    """
+    `call_with_failover` 的异步版本，等待期间不阻塞事件循环。
+    """
+    failover = Failover(guards, estimated_tokens, weights)
+    while True:
+        index, wait = failover.next()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        start = time.monotonic()
+        try:
+            result = await call(index)
+        except BaseException as e:
+            if not failover.failed(index, e, time.monotonic() - start):
+                raise
+            continue
+        failover.succeeded(index, time.monotonic() - start)
+        return index, result
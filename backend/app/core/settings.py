@@ -1,8 +1,11 @@
 import toml
 import json
 import os
-from typing import Dict, Any, Optional
+import tempfile
+import threading
+from typing import Dict, Any, List, Literal, Optional, Tuple
 from pydantic import BaseModel, Field
+from app.models.schemas import LLMBackend
 
 SETTINGS_FILE = "config.toml"
 LEGACY_SETTINGS_FILE = "settings.json"
@@ -15,12 +18,88 @@ class AppSettings(BaseModel):
     language: str = Field("curl", description="Default Language")
     debug_mode: bool = Field(False, description="Enable Debug Mode to log node outputs")
     debug_log_path: str = Field("debug.log", description="Path to debug log file")
+    debug_log_max_bytes: int = Field(10 * 1024 * 1024, ge=0, description="Rotate debug log when it exceeds this size (0 disables rotation)")
+    debug_log_backup_count: int = Field(3, ge=0, description="Number of rotated debug log files to keep")
+    debug_log_queue_size: int = Field(10000, ge=1, description="Max pending debug records before new ones are dropped")
+    debug_log_max_field_chars: int = Field(2000, ge=0, description="Truncate string fields in debug records beyond this length (0 disables)")
+    debug_log_max_items: int = Field(100, ge=1, description="Max list items / dict keys kept per field in debug records")
+    ref_mode: Literal["shared", "inline"] = Field("shared", description="How $ref schemas are emitted in prompts: shared table or inlined")
+    ref_inline_depth: int = Field(3, ge=0, description="Max $ref depth expanded when ref_mode is inline")
+    upload_dir: str = Field("uploads", description="Directory where uploaded specs are stored (named by content hash)")
+    upload_max_bytes: int = Field(50 * 1024 * 1024, ge=1, description="Max size of an uploaded spec after decompression")
+    upload_spool_max_memory: int = Field(1024 * 1024, ge=0, description="Uploads larger than this are spooled to disk while receiving")
+    upload_ttl_seconds: int = Field(24 * 3600, ge=1, description="How long unused uploaded specs are kept")
+    spec_cache_max_entries: int = Field(32, ge=0, description="Max parsed specs (and their summaries) cached in memory by content hash (0 disables)")
+    plan_shard_token_budget: int = Field(6000, ge=500, description="Estimated token budget of each spec shard in sharded planning")
+    json_max_repeat: int = Field(10000, ge=0, description="Max count honored when expanding \"A\" * N / \"A\".repeat(N) in LLM JSON output")
+    json_max_expanded_chars: int = Field(1000000, ge=0, description="Max total characters produced by string repetition expansion per parse")
+    estimated_completion_tokens: int = Field(600, ge=1, description="Estimated completion tokens of one generated test case, used by token budgets and run estimates")
+    max_concurrency: int = Field(8, ge=1, description="Max number of test cases generated in parallel")
+    max_workers: int = Field(4, ge=1, description="Max number of background tasks running at the same time")
+    task_ttl_seconds: int = Field(3600, ge=1, description="How long finished background tasks are kept in memory")
+    llm_pool_size: int = Field(20, ge=1, description="Max HTTP connections per LLM provider")
+    llm_pool_idle_seconds: int = Field(300, ge=1, description="Idle time after which pooled LLM clients are evicted")
+    llm_connect_timeout: float = Field(10.0, gt=0, description="Seconds to wait for a connection to an LLM provider")
+    llm_read_timeout: float = Field(120.0, gt=0, description="Seconds to wait for response data from an LLM provider (also between streamed chunks) before the call fails and is retried or failed over")
+    llm_backends: List[LLMBackend] = Field(default_factory=list, description="Additional LLM backends pooled with the request's LLM config when the request does not specify backends")
+    llm_max_retries: int = Field(4, ge=0, description="Max retries of an LLM call on 408/409/429/5xx or connection errors")
+    llm_retry_base_delay: float = Field(1.0, ge=0, description="Base delay in seconds of the jittered exponential backoff (Retry-After takes precedence when longer)")
+    llm_retry_max_delay: float = Field(30.0, ge=0, description="Upper bound in seconds of a single backoff delay")
+    llm_requests_per_minute: int = Field(0, ge=0, description="Per-provider request rate limit (0 disables)")
+    llm_tokens_per_minute: int = Field(0, ge=0, description="Per-provider token rate limit, reserved from prompt estimates (0 disables)")
+    llm_circuit_failure_threshold: int = Field(5, ge=0, description="Consecutive retryable failures that open a provider's circuit breaker (0 disables)")
+    llm_circuit_reset_seconds: float = Field(30.0, ge=0, description="Seconds an open circuit rejects calls before a probe request is allowed")
+    cache_enabled: bool = Field(True, description="Cache LLM responses keyed by prompt and model parameters")
+    cache_path: str = Field("llm_cache.db", description="Path to the SQLite LLM response cache")
+    cache_memory_max_entries: int = Field(1024, ge=0, description="Max LLM responses kept in the in-memory LRU")
+    cache_disk_max_entries: int = Field(20000, ge=0, description="Max LLM responses kept in the SQLite cache")
+    cache_ttl_seconds: int = Field(7 * 24 * 3600, ge=1, description="LLM cache entry time-to-live")
+    result_store_enabled: bool = Field(True, description="Persist finished task results to a local SQLite store")
+    result_store_path: str = Field("task_results.db", description="Path to the SQLite task result store")
+    result_retention_seconds: int = Field(7 * 24 * 3600, ge=1, description="How long persisted task results are kept")
 
 class SettingsManager:
-    """配置及持久化管理器"""
+    """
+    配置及持久化管理器
+
+    `load_settings` 在进程内缓存解析结果，仅当 config.toml 的 (inode, mtime, size)
+    发生变化或调用 `save_settings` 时才重新读取，热路径上只有一次 stat 调用。
+    返回的 AppSettings 为共享实例，调用方不应修改。
+    """
+
+    _cached: Optional[AppSettings] = None
+    _cached_signature: Optional[Tuple[int, int, int]] = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _file_signature() -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(SETTINGS_FILE)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
 
     @staticmethod
     def load_settings() -> AppSettings:
+        signature = SettingsManager._file_signature()
+        cached = SettingsManager._cached
+        if cached is not None and signature is not None and signature == SettingsManager._cached_signature:
+            return cached
+
+        with SettingsManager._lock:
+            # 双重检查: 其他线程可能已经完成了重新加载
+            signature = SettingsManager._file_signature()
+            if SettingsManager._cached is not None and signature is not None and signature == SettingsManager._cached_signature:
+                return SettingsManager._cached
+
+            settings = SettingsManager._read_settings()
+            # 文件不存在时不缓存，以便随时感知新建的配置文件
+            SettingsManager._cached = settings if signature is not None else None
+            SettingsManager._cached_signature = signature
+            return settings
+
+    @staticmethod
+    def _read_settings() -> AppSettings:
         # Check for legacy JSON if TOML doesn't exist
         if not os.path.exists(SETTINGS_FILE):
              if os.path.exists(LEGACY_SETTINGS_FILE):
@@ -29,7 +108,7 @@ class SettingsManager:
                      with open(LEGACY_SETTINGS_FILE, "r", encoding="utf-8") as f:
                          data = json.load(f)
                      settings = AppSettings(**data)
-                     SettingsManager.save_settings(settings)
+                     SettingsManager._write_settings(settings)
                      return settings
                  except Exception as e:
                      print(f"Error migrating settings: {e}")
@@ -45,9 +124,30 @@ class SettingsManager:
 
     @staticmethod
     def save_settings(settings: AppSettings):
+        with SettingsManager._lock:
+            try:
+                SettingsManager._write_settings(settings)
+                SettingsManager._cached = settings
+                SettingsManager._cached_signature = SettingsManager._file_signature()
+            except Exception as e:
+                print(f"Error saving settings: {e}")
+
+    @staticmethod
+    def _write_settings(settings: AppSettings):
+        """
+        原子写入: 先写入同目录下的临时文件，再通过 os.replace 替换，
+        读者不会看到写了一半的配置文件。
+        """
+        directory = os.path.dirname(os.path.abspath(SETTINGS_FILE))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".config.", suffix=".toml.tmp")
         try:
-            with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
                 # model_dump() returns dict, suitable for toml.dump
                 toml.dump(settings.model_dump(), f)
-        except Exception as e:
-            print(f"Error saving settings: {e}")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, SETTINGS_FILE)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
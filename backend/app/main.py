@@ -32,6 +32,7 @@ async def log_requests(request: Request, call_next):
     """记录所有请求的详细信息 (Debug用)"""
     # 1. Check Debug Mode from Settings
     try:
+        # 配置在进程内缓存，仅在 config.toml 变化时重新解析
         settings = SettingsManager.load_settings()
         is_debug = settings.debug_mode
     except Exception:
@@ -39,7 +40,9 @@ async def log_requests(request: Request, call_next):
         
     logger.info(f"Started: {request.method} {request.url}")
     
-    if is_debug:
+    # 只缓冲并记录 JSON 请求体；上传接口的 Spec 原文 (可能为数 MB 的 YAML / gzip) 按流处理，不在此读取
+    is_json = request.headers.get("content-type", "").startswith("application/json")
+    if is_debug and is_json:
         try:
             # 读取 Body (注意: 会消耗 Stream, 需要重新构造)
             body = await request.body()
@@ -1,5 +1,12 @@
 from typing import List, Dict, Optional, Literal, Any
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
+
+class LLMBackend(BaseModel):
+    """LLM 后端池中的一个后端 (Provider + API Key)"""
+    base_url: str = Field(..., description="API Base URL")
+    api_key: str = Field(..., description="API Key")
+    model_name: Optional[str] = Field(None, description="模型名称，为空时与主配置相同")
+    weight: float = Field(1.0, gt=0, description="路由权重，与观测到的延迟和错误率共同决定分配比例")
 
 class LLMConfig(BaseModel):
     """LLM 配置模型 (Generic OpenAI)"""
@@ -7,14 +14,33 @@ class LLMConfig(BaseModel):
     api_key: str = Field(..., description="API Key")
     model_name: str = Field(..., description="模型名称")
     tier: Literal["high", "low"] = Field(..., description="模型层级: high (复杂) 或 low (简单)")
+    backends: Optional[List[LLMBackend]] = Field(None, description="额外的 LLM 后端，与主配置组成后端池按延迟与错误率加权路由并自动故障转移；为空时使用配置文件中的 llm_backends")
 
 class GenerateRequest(BaseModel):
     """生成测试用例的请求体"""
-    openapi_content: str = Field(..., description="OpenAPI 规范内容的字符串 (JSON 或 YAML)")
+    openapi_content: Optional[str] = Field(None, description="OpenAPI 规范内容的字符串 (JSON 或 YAML)，与 spec_id 二选一")
+    spec_id: Optional[str] = Field(None, description="通过 `POST /specs` 上传的 Spec ID，与 openapi_content 二选一")
     target_language: Literal["curl", "java", "go"] = Field(..., description="目标编程语言")
-    llm_config: LLMConfig = Field(..., description="LLM 配置")
+    llm_config: LLMConfig = Field(..., description="LLM 配置；未单独配置的阶段使用该配置，也是阶段模型输出失败时的升级目标")
+    planner_llm_config: Optional[LLMConfig] = Field(None, description="Planner 阶段使用的 LLM 配置，为空时使用 llm_config")
+    generator_llm_config: Optional[LLMConfig] = Field(None, description="代码生成阶段使用的 LLM 配置 (例如低层级的快速模型)，为空时使用 llm_config")
+    escalate_on_failure: bool = Field(True, description="阶段模型的输出无法解析或未通过校验时，该用例 (或规划分片) 单独升级到 llm_config 重新生成")
     include_boundary: bool = Field(False, description="是否包含边界测试")
     include_negative: bool = Field(True, description="是否包含逆向测试 (400 Bad Request)")
+    planning_mode: Literal["single", "sharded", "auto", "rules"] = Field("single", description="规划模式: single (整体规划), sharded (按 tag / 路径前缀分片并行规划), auto (超出预算时分片), rules (按 Schema 规则确定性生成，不调用 LLM)")
+    enrich_plan: bool = Field(False, description="rules 模式下再调用 LLM 规划补充用例，与规则用例重复的 (endpoint, method, type, expected_status) 会被丢弃")
+    pipelined: bool = Field(False, description="流式解析测试计划，每个用例解析完成后立即开始生成代码 (规划与生成重叠)")
+    use_cache: bool = Field(True, description="是否读取 LLM 响应缓存 (False 时强制重新生成，结果仍会写入缓存)")
+    template_codegen: bool = Field(True, description="模板生成: 带 request_data 的用例及简单的正向用例直接由模板渲染为代码，不调用 LLM")
+    batch_size: int = Field(1, ge=1, le=20, description="批量生成: 大于 1 时同一接口 (endpoint, method) 的用例每 batch_size 个合并为一次 LLM 调用 (流水线模式下不生效)")
+    previous_result: Optional[Dict[str, Any]] = Field(None, description="增量重新生成: 上一次任务的 result (需包含 operation_hashes)，只为新增或变更的操作重新规划与生成，其余用例原样复用")
+    token_budget: Optional[int] = Field(None, ge=1, description="本次任务的 Token 预算 (Prompt + Completion)，超出预算的用例不会生成代码；为空时不限制")
+
+    @model_validator(mode="after")
+    def check_spec_source(self):
+        if (self.openapi_content is None) == (self.spec_id is None):
+            raise ValueError("Exactly one of openapi_content or spec_id must be provided")
+        return self
 
 class TestScenario(BaseModel):
     """单个测试场景的定义"""
@@ -26,6 +52,7 @@ class TestScenario(BaseModel):
     type: Literal["positive", "negative", "boundary"] = Field(..., description="测试类型")
     expected_status: int = Field(..., description="预期的 HTTP 状态码")
     data_requirements: Optional[str] = Field(None, description="对测试数据的要求描述")
+    request_data: Optional[Dict[str, Any]] = Field(None, description="具体的请求数据 {path_params, query, headers, body} (规则规划器生成，LLM 规划时为空)")
 
 class TestCase(TestScenario):
     """包含生成代码的测试用例"""
@@ -37,3 +64,18 @@ class GenerateResponse(BaseModel):
     status: Literal["processing", "completed", "failed"] = Field(..., description="任务状态")
     result: Optional[Dict[str, Any]] = Field(None, description="结果数据，包含生成的代码和计划")
     error: Optional[str] = Field(None, description="错误信息")
+
+class TaskProgress(BaseModel):
+    """后台任务进度"""
+    stage: str = Field("queued", description="当前阶段: queued / parser / planner / generator / aggregator / done")
+    completed: int = Field(0, description="已生成代码的用例数")
+    total: int = Field(0, description="测试计划中的用例总数 (规划完成前为 0)")
+
+class TaskStatusResponse(BaseModel):
+    """后台任务状态查询的响应体"""
+    task_id: str = Field(..., description="任务 ID")
+    status: Literal["processing", "completed", "failed"] = Field(..., description="任务状态")
+    progress: TaskProgress = Field(default_factory=TaskProgress, description="任务进度")
+    error: Optional[str] = Field(None, description="错误信息")
+    created_at: float = Field(..., description="任务创建时间 (Unix 时间戳)")
+    updated_at: float = Field(..., description="最近一次状态更新时间 (Unix 时间戳)")
@@ -0,0 +1,182 @@
+import re
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# 聚合器输入: 返回 (case_name, case_id, code) 序列的工厂函数，Go 需要遍历两次 (先收集 imports 再输出)
+CaseEntries = Callable[[], Iterable[Tuple[str, str, Optional[str]]]]
+
+# 始终候选的 Go imports (片段可能省略 import)，只有在代码中实际用到时才会输出 (未使用的 import 无法编译)
+GO_DEFAULT_IMPORTS = (
+    ("", "testing"),
+    ("", "net/http"),
+    ("", "net/http/httptest"),
+    ("", "strings"),
+    ("", "encoding/json"),
+    ("", "bytes"),
+    ("", "fmt"),
+    ("", "io"),
+    ("", "strconv"),
+    ("", "time")
+)
+JAVA_DEFAULT_IMPORTS = (
+    "import org.junit.Test;",
+    "import static io.restassured.RestAssured.*;",
+    "import static org.hamcrest.Matchers.*;"
+)
+
+_GO_IMPORT_SPEC = re.compile(r'^(?:([A-Za-z_]\w*|\.)\s+)?"([^"]+)"')
+_GO_SELECTOR = re.compile(r"\b([A-Za-z_]\w*)\.")
+# 统计包使用情况前去除字符串字面量与注释，避免 "http://" 或注释中的 `json.` 被误判为引用
+_GO_NOISE = re.compile(r'"(?:\\.|[^"\\\n])*"|`[^`]*`|//[^\n]*|/\*.*?\*/', re.S)
+_GO_VERSION_SUFFIX = re.compile(r"^v\d+$")
+
+class CodeAggregator:
+    """
+    将逐用例的代码片段组装为最终文件。
+
+    输出以文本块的形式逐段产出 (`iter_chunks`)，由 `render` 一次性拼接，
+    总开销与代码总长度成线性关系，不会出现字符串反复拼接带来的二次复杂度。
+    - Go: 解析每个片段头部的 package / import，去重合并为文件顶部的一个 import 块，
+      只保留代码中实际使用到的包
+    - Java: 片段中的 import 语句提升到文件顶部并去重，方法体放入 `ApiTest` 类
+    - curl: 按计划顺序拼接命令
+    """
+
+    @staticmethod
+    def iter_chunks(language: str, entries: CaseEntries) -> Iterator[str]:
+        if language == "go":
+            return CodeAggregator._iter_go(entries)
+        if language == "java":
+            return CodeAggregator._iter_java(entries)
+        return CodeAggregator._iter_curl(entries)
+
+    @staticmethod
+    def render(language: str, entries: CaseEntries) -> str:
+        return "".join(CodeAggregator.iter_chunks(language, entries))
+
+    # --- Go ---
+
+    @staticmethod
+    def _iter_go(entries: CaseEntries) -> Iterator[str]:
+        imports: Dict[Tuple[str, str], None] = dict.fromkeys(GO_DEFAULT_IMPORTS)
+        used: Set[str] = set()
+        for _, _, code in entries():
+            if code:
+                snippet_imports, body = split_go_header(code)
+                imports.update(dict.fromkeys(snippet_imports))
+                used.update(_GO_SELECTOR.findall(_GO_NOISE.sub(" ", body)))
+
+        yield "package main\n\n"
+        selected = [
+            (alias, path) for alias, path in imports
+            if alias in ("_", ".") or (alias or go_package_name(path)) in used
+        ]
+        if selected:
+            yield "import (\n"
+            std = [spec for spec in selected if "." not in spec[1].split("/")[0]]
+            external = [spec for spec in selected if spec not in std]
+            for group_index, group in enumerate(group for group in (std, external) if group):
+                if group_index:
+                    yield "\n"
+                for alias, path in sorted(group, key=lambda spec: spec[1]):
+                    yield f"\t{alias + ' ' if alias else ''}\"{path}\"\n"
+            yield ")\n\n"
+
+        for name, case_id, code in entries():
+            if code:
+                _, body = split_go_header(code)
+                yield f"// Test Case: {name} ({case_id})\n"
+                yield body + "\n\n"
+
+    # --- Java ---
+
+    @staticmethod
+    def _iter_java(entries: CaseEntries) -> Iterator[str]:
+        imports: Dict[str, None] = dict.fromkeys(JAVA_DEFAULT_IMPORTS)
+        for _, _, code in entries():
+            if code:
+                imports.update(dict.fromkeys(split_java_header(code)[0]))
+
+        for statement in imports:
+            yield statement + "\n"
+        yield "\npublic class ApiTest {\n\n"
+        for name, case_id, code in entries():
+            if code:
+                _, body = split_java_header(code)
+                yield f"    // Test Case: {name} ({case_id})\n"
+                # 缩进处理
+                yield "\n".join("    " + line for line in body.split("\n")) + "\n\n"
+        yield "}\n"
+
+    # --- curl ---
+
+    @staticmethod
+    def _iter_curl(entries: CaseEntries) -> Iterator[str]:
+        for name, case_id, code in entries():
+            if code:
+                yield f"# Test Case: {name} ({case_id})\n"
+                yield code + "\n\n"
+
+def split_go_header(code: str) -> Tuple[List[Tuple[str, str]], str]:
+    """
+    拆分 Go 片段开头的 package / import 声明，返回 ([(alias, path)], 剩余代码)。
+    空行与行注释不结束头部，遇到其他语句即视为头部结束；最后一条声明之后的注释保留在代码中。
+    """
+    lines = code.split("\n")
+    imports: List[Tuple[str, str]] = []
+    index = 0
+    header_end = 0
+    in_block = False
+    while index < len(lines):
+        stripped = lines[index].split("//", 1)[0].strip()
+        if in_block:
+            if stripped.startswith(")"):
+                in_block = False
+            elif stripped:
+                match = _GO_IMPORT_SPEC.match(stripped)
+                if match:
+                    imports.append((match.group(1) or "", match.group(2)))
+            header_end = index + 1
+        elif not stripped:
+            pass
+        elif stripped.startswith("package "):
+            header_end = index + 1
+        elif stripped == "import" or stripped.startswith(("import ", "import(", 'import"')):
+            rest = stripped[len("import"):].strip()
+            if rest.startswith("("):
+                rest = rest[1:].strip()
+                in_block = not rest.endswith(")")
+                rest = rest.rstrip(")").strip()
+            match = _GO_IMPORT_SPEC.match(rest)
+            if match:
+                imports.append((match.group(1) or "", match.group(2)))
+            header_end = index + 1
+        else:
+            break
+        index += 1
+    return imports, "\n".join(lines[header_end:]).strip("\n")
+
+def go_package_name(path: str) -> str:
+    """import 路径对应的默认包名 (忽略 /v2 之类的版本后缀与 gopkg.in 的 .vN 后缀)"""
+    parts = path.split("/")
+    name = parts[-1]
+    if len(parts) > 1 and _GO_VERSION_SUFFIX.match(name):
+        name = parts[-2]
+    return re.sub(r"\.v\d+$", "", name).replace("-", "_")
+
+def split_java_header(code: str) -> Tuple[List[str], str]:
+    """
+    拆分 Java 片段开头的 package / import 语句，返回 ([import 语句], 剩余代码)。
+    """
+    lines = code.split("\n")
+    imports: List[str] = []
+    header_end = 0
+    for index, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped.startswith("import ") and stripped.endswith(";"):
+            imports.append(" ".join(stripped.split()))
+        elif not stripped.startswith("package "):
+            if stripped and not stripped.startswith("//"):
+                break
+            continue
+        header_end = index + 1
+    return imports, "\n".join(lines[header_end:]).strip("\n")
@@ -0,0 +1,270 @@
+import json
+import re
+import shlex
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, quote, urlencode
+from app.models.schemas import TestCase
+from app.services.ref_resolver import RefResolver
+from app.services.rule_planner import RulePlanner
+
+# Spec 未声明 servers / basePath 时使用的服务地址
+DEFAULT_BASE_URL = "http://localhost:8080"
+_PATH_PARAM = re.compile(r"\{([^{}/]+)\}")
+# Planner Prompt 中表示"没有数据要求"的占位写法 (去除首尾空白与句末标点、转小写后比较)；
+# 其他任何 data_requirements 都视为依赖特定数据，由 LLM 生成
+NO_DATA_REQUIREMENTS = {"", "无", "无需特殊数据", "不需要特殊数据", "none", "n/a"}
+
+class CodeTemplateService:
+    """
+    基于模板的确定性代码生成 (不调用 LLM)。
+
+    将 TestCase 与其操作的 Spec 切片直接渲染为 curl 脚本、Go `net/http` 测试函数或
+    Java RestAssured 测试方法，代码形式与 `aggregator_node` 的组装约定一致:
+    - curl: 单条命令 + 状态码判断
+    - Go: 不含 package / import 的 `func TestXxx(t *testing.T)`
+    - Java: `ApiTest` 类中的 `@Test` 方法 (由聚合器统一缩进)
+
+    可完整覆盖的用例:
+    - 带 `request_data` 的用例 (规则规划器生成，请求数据已确定)
+    - 无请求体、参数均可由内联 Schema 推导、data_requirements 为空或为 NO_DATA_REQUIREMENTS 占位写法的正向用例
+
+    其余用例 (需要特定数据、逆向 / 边界用例、请求体由 LLM 自行构造、参数含未展开的 $ref、非 JSON 请求体等)
+    返回 None，由 LLM 生成。
+    """
+
+    @staticmethod
+    def render(case: TestCase, language: str, api_context: Optional[str] = None) -> Optional[str]:
+        """
+        渲染单个用例的代码，无法完整覆盖时返回 None。
+        """
+        renderer = _RENDERERS.get(language)
+        if renderer is None:
+            return None
+        operation_slice = CodeTemplateService._load_slice(api_context)
+        data = case.request_data
+        if data is None:
+            data = CodeTemplateService._derive_request(case, operation_slice)
+            if data is None:
+                return None
+        request = CodeTemplateService._build_request(case, data, operation_slice)
+        if request is None:
+            return None
+        return renderer(case, request)
+
+    @staticmethod
+    def _load_slice(api_context: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not api_context:
+            return None
+        try:
+            operation_slice = json.loads(api_context)
+        except ValueError:
+            return None
+        return operation_slice if isinstance(operation_slice, dict) else None
+
+    @staticmethod
+    def _operation(operation_slice: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        # 操作切片的 paths 中只有当前操作
+        if not operation_slice or not isinstance(operation_slice.get("paths"), dict):
+            return None
+        for methods in operation_slice["paths"].values():
+            if isinstance(methods, dict):
+                for operation in methods.values():
+                    if isinstance(operation, dict):
+                        return operation
+        return None
+
+    @staticmethod
+    def _derive_request(case: TestCase, operation_slice: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        为没有 request_data 的正向用例推导合法请求；用例不依赖特定数据、操作没有必填请求体且参数均可由 Schema
+        推导时才能完整覆盖。
+        """
+        if case.type != "positive" or not _no_data_requirements(case.data_requirements):
+            return None
+        operation = CodeTemplateService._operation(operation_slice)
+        if operation is None:
+            return None
+        parameters = operation.get("parameters") or []
+        if RefResolver.find_refs(parameters) or not all(isinstance(param, dict) for param in parameters):
+            return None
+        if (operation.get("requestBody") or {}).get("content"):
+            return None
+        merged: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for param in parameters:
+            if param.get("in") in ("body", "formData") and param.get("required"):
+                return None
+            if param.get("name") and param.get("in") in ("path", "query", "header"):
+                merged[(param["in"], param["name"])] = param
+        return RulePlanner.valid_request(list(merged.values()), None)
+
+    @staticmethod
+    def _build_request(case: TestCase, data: Dict[str, Any], operation_slice: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        将请求数据整理为 {method, base_url, path, raw_path, query, headers, body}，路径参数无法填充或
+        请求体不是 JSON 时返回 None。
+        """
+        path, _, raw_query = case.endpoint.partition("?")
+        path_params = data.get("path_params") or {}
+        missing = []
+
+        def substitute(match):
+            name = match.group(1)
+            if name not in path_params:
+                missing.append(name)
+                return match.group(0)
+            return _text(path_params[name])
+
+        raw_path = _PATH_PARAM.sub(substitute, path)
+        if missing:
+            return None
+
+        body = None
+        if "body" in data:
+            operation = CodeTemplateService._operation(operation_slice) or {}
+            content = (operation.get("requestBody") or {}).get("content") or {}
+            if content and not any("json" in media_type for media_type in content):
+                return None
+            body = json.dumps(data["body"], ensure_ascii=False)
+
+        query: List[Tuple[str, str]] = parse_qsl(raw_query, keep_blank_values=True)
+        for name, value in (data.get("query") or {}).items():
+            values = value if isinstance(value, list) else [value]
+            query.extend((name, _text(item)) for item in values)
+
+        headers = {name: _text(value) for name, value in (data.get("headers") or {}).items()}
+        if body is not None and not any(name.lower() == "content-type" for name in headers):
+            headers["Content-Type"] = "application/json"
+
+        return {
+            "method": case.method.upper(),
+            "base_url": CodeTemplateService._base_url(operation_slice),
+            "path": _PATH_PARAM.sub(lambda m: quote(_text(path_params[m.group(1)]), safe=""), path),
+            # RestAssured 会自行编码路径
+            "raw_path": raw_path,
+            "query": query,
+            "headers": headers,
+            "body": body
+        }
+
+    @staticmethod
+    def _base_url(operation_slice: Optional[Dict[str, Any]]) -> str:
+        operation_slice = operation_slice or {}
+        servers = operation_slice.get("servers")
+        url = ""
+        if isinstance(servers, list) and servers and isinstance(servers[0], dict):
+            url = servers[0].get("url") or ""
+        elif isinstance(operation_slice.get("basePath"), str):
+            url = operation_slice["basePath"]
+        if "{" in url:
+            # 带变量的 servers 地址无法确定，使用默认地址
+            url = ""
+        if not url.startswith(("http://", "https://")):
+            url = DEFAULT_BASE_URL + ("/" + url.strip("/") if url.strip("/") else "")
+        return url.rstrip("/")
+
+def _no_data_requirements(requirements: Optional[str]) -> bool:
+    return (requirements or "").strip().rstrip("。.").strip().lower() in NO_DATA_REQUIREMENTS
+
+def _text(value: Any) -> str:
+    """将参数值转换为请求中的文本形式 (布尔值与 JSON 保持一致)"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+def _url(request: Dict[str, Any]) -> str:
+    url = request["base_url"] + request["path"]
+    if request["query"]:
+        url += "?" + urlencode(request["query"])
+    return url
+
+def _comment(case: TestCase) -> str:
+    return " ".join((case.description or case.name).split())
+
+def _string_literal(text: str) -> str:
+    # JSON 字符串的转义规则同时适用于 Go 与 Java 的双引号字符串
+    return json.dumps(text)
+
+def _render_curl(case: TestCase, request: Dict[str, Any]) -> str:
+    lines = [
+        f"# {_comment(case)}",
+        f"status=$(curl -s -o /dev/null -w '%{{http_code}}' -X {request['method']} {shlex.quote(_url(request))}"
+    ]
+    for name, value in request["headers"].items():
+        lines[-1] += " \\"
+        lines.append(f"  -H {shlex.quote(f'{name}: {value}')}")
+    if request["body"] is not None:
+        lines[-1] += " \\"
+        lines.append(f"  -d {shlex.quote(request['body'])}")
+    lines[-1] += ")"
+    lines.append(
+        f'if [ "$status" = "{case.expected_status}" ]; then echo "PASS {case.id}"; '
+        f'else echo "FAIL {case.id}: expected {case.expected_status}, got $status"; fi'
+    )
+    return "\n".join(lines)
+
+def _render_go(case: TestCase, request: Dict[str, Any]) -> str:
+    parts = [part for part in re.split(r"[^0-9A-Za-z]+", case.id) if part]
+    if parts and parts[0].lower() == "test":
+        parts = parts[1:]
+    name = "Test" + "".join(part[:1].upper() + part[1:] for part in parts)
+    body = "nil"
+    lines = [f"func {name}(t *testing.T) {{", f"\t// {_comment(case)}"]
+    if request["body"] is not None:
+        lines.append(f"\tbody := strings.NewReader({_string_literal(request['body'])})")
+        body = "body"
+    lines += [
+        f"\treq, err := http.NewRequest({_string_literal(request['method'])}, {_string_literal(_url(request))}, {body})",
+        "\tif err != nil {",
+        "\t\tt.Fatalf(\"构造请求失败: %v\", err)",
+        "\t}"
+    ]
+    for header, value in request["headers"].items():
+        lines.append(f"\treq.Header.Set({_string_literal(header)}, {_string_literal(value)})")
+    lines += [
+        "\tresp, err := http.DefaultClient.Do(req)",
+        "\tif err != nil {",
+        "\t\tt.Fatalf(\"请求失败: %v\", err)",
+        "\t}",
+        "\tdefer resp.Body.Close()",
+        f"\tif resp.StatusCode != {case.expected_status} {{",
+        f"\t\tt.Errorf(\"预期状态码 {case.expected_status}，实际 %d\", resp.StatusCode)",
+        "\t}",
+        "}"
+    ]
+    return "\n".join(lines)
+
+def _render_java(case: TestCase, request: Dict[str, Any]) -> str:
+    name = re.sub(r"[^0-9A-Za-z_]+", "_", case.id)
+    if not name.lower().startswith("test"):
+        name = "test_" + name
+    lines = [
+        "@Test",
+        f"public void {name}() {{",
+        f"    // {_comment(case)}",
+        "    given()",
+        f"        .baseUri({_string_literal(request['base_url'])})"
+    ]
+    for param, value in request["query"]:
+        lines.append(f"        .queryParam({_string_literal(param)}, {_string_literal(value)})")
+    for header, value in request["headers"].items():
+        lines.append(f"        .header({_string_literal(header)}, {_string_literal(value)})")
+    if request["body"] is not None:
+        lines.append(f"        .body({_string_literal(request['body'])})")
+    lines += [
+        "    .when()",
+        f"        .request({_string_literal(request['method'])}, {_string_literal(request['raw_path'])})",
+        "    .then()",
+        f"        .statusCode({case.expected_status});",
+        "}"
+    ]
+    return "\n".join(lines)
+
+_RENDERERS = {
+    "curl": _render_curl,
+    "go": _render_go,
+    "java": _render_java
+}
@@ -0,0 +1,44 @@
+import re
+from typing import Optional
+
+# 检查括号配对前去除字符串字面量与注释 (Go 的反引号字符串、Java 的文本块一并处理)
+_NOISE = re.compile(r'"""(?:.|\n)*?"""|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|`[^`]*`|//[^\n]*|/\*.*?\*/', re.S)
+_PAIRS = {")": "(", "]": "[", "}": "{"}
+
+class CodeValidator:
+    """
+    对 LLM 生成的用例代码做轻量的结构校验 (不编译、不执行)。
+
+    用于分阶段模型路由: 低层级模型的输出未通过校验时，该用例单独升级到更强的模型重新生成。
+    - 所有语言: 代码不能为空
+    - go: 必须包含 `func Test...(`，括号配对
+    - java: 必须包含 `@Test` 方法，括号配对
+    - curl: 必须包含 curl 命令
+    """
+
+    @staticmethod
+    def check(code: Optional[str], language: str) -> Optional[str]:
+        """
+        返回校验失败的原因，通过校验时返回 None。
+        """
+        if not code or not code.strip():
+            return "empty output"
+        if language == "curl":
+            return None if re.search(r"\bcurl\b", code) else "missing curl command"
+        if language == "go" and not re.search(r"\bfunc\s+Test\w*\s*\(", code):
+            return "missing Go test function"
+        if language == "java" and "@Test" not in code:
+            return "missing @Test method"
+        if language in ("go", "java"):
+            return _check_brackets(code)
+        return None
+
+def _check_brackets(code: str) -> Optional[str]:
+    stack = []
+    for char in _NOISE.sub(" ", code):
+        if char in "([{":
+            stack.append(char)
+        elif char in _PAIRS:
+            if not stack or stack.pop() != _PAIRS[char]:
+                return f"unbalanced '{char}'"
+    return f"unclosed '{stack[-1]}'" if stack else None
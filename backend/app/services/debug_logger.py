@@ -1,50 +1,155 @@
+import atexit
 import json
 import os
+import queue
+import threading
 import datetime
-from typing import Any, Dict
-from app.core.settings import SettingsManager
+from typing import Any, Dict, List, Optional
+from app.core.settings import SettingsManager, AppSettings
+
+# 单次批量写入的最大记录数
+BATCH_SIZE = 256
+# 需要按字段截断的负载字段
+PAYLOAD_FIELDS = ("output_update", "body")
+# 节点输出中只记录摘要 (条目数) 的大体积字段: 完整的解析结果与按操作划分的索引逐项截断的代价与 Spec 大小成正比
+SUMMARIZED_STATE_FIELDS = ("parse_result", "operation_index", "operation_hashes")
+
+class _DebugLogWriter:
+    """
+    后台日志写入线程。
+
+    调用方放入有界队列的是已截断的快照 (见 `DebugLogger._submit`)；
+    写线程批量取出记录，序列化为紧凑 JSONL 并追加写入文件，
+    文件超过 max_bytes 时按 `path.1 ... path.N` 轮转。
+    队列满时直接丢弃记录并计数，绝不阻塞工作流。
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.written = 0
+        self._file = None
+        self._file_path: Optional[str] = None
+        self._thread = threading.Thread(target=self._run, name="debug-log-writer", daemon=True)
+        self._thread.start()
+
+    def resize(self, queue_size: int):
+        """
+        调整队列容量 (配置变化时生效)；缩小后超出部分的新记录会被丢弃，直到队列排空。
+        """
+        with self.queue.mutex:
+            self.queue.maxsize = queue_size
+            self.queue.not_full.notify_all()
+
+    def submit(self, record: Dict[str, Any]):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: Optional[float] = None):
+        """
+        等待队列中已有的记录全部写入文件。
+        """
+        done = threading.Event()
+        try:
+            self.queue.put({"__flush__": done}, timeout=timeout)
+        except queue.Full:
+            return
+        done.wait(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                print(f"Failed to write debug log: {e}")
+            for record in batch:
+                if "__flush__" in record:
+                    record["__flush__"].set()
+
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        settings = SettingsManager.load_settings()
+        lines = [
+            json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+            for record in batch if "__flush__" not in record
+        ]
+        if not lines:
+            return
+
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        f = self._open(settings.debug_log_path)
+        if settings.debug_log_max_bytes > 0 and f.tell() > 0 and f.tell() + len(data) > settings.debug_log_max_bytes:
+            f = self._rotate(settings)
+        f.write(data)
+        f.flush()
+        self.written += len(lines)
+
+    def _open(self, path: str):
+        if self._file is None or self._file_path != path:
+            if self._file is not None:
+                self._file.close()
+            self._file = open(path, "ab")
+            self._file_path = path
+        return self._file
+
+    def _rotate(self, settings: AppSettings):
+        path = settings.debug_log_path
+        self._file.close()
+        self._file = None
+        if settings.debug_log_backup_count > 0:
+            for i in range(settings.debug_log_backup_count - 1, 0, -1):
+                src = f"{path}.{i}"
+                if os.path.exists(src):
+                    os.replace(src, f"{path}.{i + 1}")
+            os.replace(path, f"{path}.1")
+        else:
+            os.remove(path)
+        return self._open(path)
 
 class DebugLogger:
     """
     负责在 Debug 模式开启时，将 LangGraph 节点的输入/输出写入日志文件。
+
+    日志以 JSONL 格式 (每行一个 JSON 对象) 由后台线程批量写入。
+    调用方在入队前对负载字段做有界的截断快照 (字符串、条目数与嵌套层级均有上限)，
+    解析结果等大体积字段 (SUMMARIZED_STATE_FIELDS) 只记录条目数；
+    记录内容与节点执行时一致，写线程也不会读取图中仍在使用的对象；
+    序列化与文件 I/O 在写线程中完成，因此 Debug 模式可在生产环境中常开。
     """
-    
+
+    _writer: Optional[_DebugLogWriter] = None
+    _lock = threading.Lock()
+
     @staticmethod
     def log_node_execution(node_name: str, input_state: Dict[str, Any], output_update: Dict[str, Any]):
         """
         记录节点执行信息。
-        
+
         Args:
             node_name: 节点名称
             input_state: 节点接收到的输入状态 (执行前)
             output_update: 节点返回的状态更新 (执行后)
         """
         settings = SettingsManager.load_settings()
-        
+
         if not settings.debug_mode:
             return
-            
-        log_path = settings.debug_log_path
-        
+
         # 构造日志条目
-        entry = {
+        # 记录 output_update，因为它反映了节点做了什么
+        DebugLogger._submit(settings, {
             "timestamp": datetime.datetime.now().isoformat(),
+            "type": "NODE_EXECUTION",
             "node": node_name,
-            # 为了避免日志过大，可以考虑只记录某些字段，或者全部记录
-            # 这里记录 output_update，因为它反映了节点做了什么
-            "output_update": DebugLogger._sanitize(output_update)
-            # 如果需要，也可以记录 input_state 的摘要
-        }
-        
-        log_entry_str = json.dumps(entry, ensure_ascii=False, indent=2)
-        
-        try:
-            with open(log_path, "a", encoding="utf-8") as f:
-                f.write(f"--- Node Execution: {node_name} ---\n")
-                f.write(log_entry_str)
-                f.write("\n\n")
-        except Exception as e:
-            print(f"Failed to write debug log: {e}")
+            "output_update": output_update
+        })
 
     @staticmethod
     def log_request(method: str, url: str, body: Any):
@@ -54,40 +159,103 @@ class DebugLogger:
         settings = SettingsManager.load_settings()
         if not settings.debug_mode:
             return
-            
-        log_path = settings.debug_log_path
-        
-        entry = {
+
+        DebugLogger._submit(settings, {
             "timestamp": datetime.datetime.now().isoformat(),
             "type": "API_REQUEST",
             "method": method,
             "url": url,
-            "body": DebugLogger._sanitize(body)
-        }
-        
-        try:
-            with open(log_path, "a", encoding="utf-8") as f:
-                f.write(f"--- API Request: {method} {url} ---\n")
-                f.write(json.dumps(entry, ensure_ascii=False, indent=2))
-                f.write("\n\n")
-        except Exception as e:
-            print(f"Failed to write debug log: {e}")
+            "body": body
+        })
 
     @staticmethod
-    def _sanitize(data: Any) -> Any:
+    def flush(timeout: Optional[float] = 5.0):
         """
-        简单的序列化辅助函数，处理非 JSON 可序列化对象。
+        阻塞直到已入队的日志全部写入 (用于测试与进程退出)。
         """
+        if DebugLogger._writer is not None:
+            DebugLogger._writer.flush(timeout)
+
+    @staticmethod
+    def stats() -> Dict[str, int]:
+        writer = DebugLogger._writer
+        if writer is None:
+            return {"queued": 0, "written": 0, "dropped": 0}
+        return {"queued": writer.queue.qsize(), "written": writer.written, "dropped": writer.dropped}
+
+    @staticmethod
+    def _submit(settings: AppSettings, record: Dict[str, Any]):
+        update = record.get("output_update")
+        if isinstance(update, dict) and any(key in update for key in SUMMARIZED_STATE_FIELDS):
+            record["output_update"] = {
+                key: DebugLogger._summarize(value) if key in SUMMARIZED_STATE_FIELDS else value
+                for key, value in update.items()
+            }
+        # 截断限制只作用于负载字段，元数据 (时间戳、节点名等) 原样保留
+        for key in PAYLOAD_FIELDS:
+            if key in record:
+                record[key] = DebugLogger._sanitize(
+                    record[key],
+                    max_chars=settings.debug_log_max_field_chars,
+                    max_items=settings.debug_log_max_items
+                )
+        if DebugLogger._writer is None:
+            with DebugLogger._lock:
+                if DebugLogger._writer is None:
+                    DebugLogger._writer = _DebugLogWriter(settings.debug_log_queue_size)
+                    atexit.register(DebugLogger.flush, 2.0)
+        writer = DebugLogger._writer
+        if writer.queue.maxsize != settings.debug_log_queue_size:
+            writer.resize(settings.debug_log_queue_size)
+        writer.submit(record)
+
+    @staticmethod
+    def _summarize(value: Any) -> Any:
+        """
+        大体积状态字段的摘要: 字典只记录条目数 (含 paths 时另记路径数)，不遍历内容。
+        """
+        if isinstance(value, dict):
+            summary = {"entries": len(value)}
+            if isinstance(value.get("paths"), dict):
+                summary["paths"] = len(value["paths"])
+            return summary
+        if isinstance(value, (list, tuple)):
+            return {"entries": len(value)}
+        return value if value is None else f"<{type(value).__name__}>"
+
+    @staticmethod
+    def _sanitize(data: Any, max_chars: int = 2000, max_items: int = 100, depth: int = 0) -> Any:
+        """
+        序列化辅助函数，处理非 JSON 可序列化对象，并按字段截断:
+        - 字符串超过 max_chars 时截断
+        - 列表 / 字典超过 max_items 时只保留前 max_items 项
+        - 嵌套层级超过 10 层时以字符串表示
+        """
+        if depth > 10:
+            return DebugLogger._truncate(str(data), max_chars)
+        if isinstance(data, str):
+            return DebugLogger._truncate(data, max_chars)
+        if data is None or isinstance(data, (bool, int, float)):
+            return data
         if isinstance(data, dict):
-            return {k: DebugLogger._sanitize(v) for k, v in data.items()}
-        elif isinstance(data, list):
-            return [DebugLogger._sanitize(v) for v in data]
-        elif hasattr(data, "dict"): # Pydantic models
-            return data.dict()
-        else:
-            try:
-                # 尝试默认转换
-                json.dumps(data)
-                return data
-            except:
-                return str(data)
+            result = {}
+            for i, (k, v) in enumerate(data.items()):
+                if i >= max_items:
+                    result["__truncated__"] = f"{len(data) - max_items} more keys"
+                    break
+                result[str(k)] = DebugLogger._sanitize(v, max_chars, max_items, depth + 1)
+            return result
+        if isinstance(data, (list, tuple)):
+            items = [DebugLogger._sanitize(v, max_chars, max_items, depth + 1) for v in data[:max_items]]
+            if len(data) > max_items:
+                items.append(f"... {len(data) - max_items} more items")
+            return items
+        if hasattr(data, "model_dump"): # Pydantic models
+            return DebugLogger._sanitize(data.model_dump(), max_chars, max_items, depth + 1)
+        return DebugLogger._truncate(str(data), max_chars)
+
+    @staticmethod
+    def _truncate(value: str, max_chars: int) -> str:
+        if max_chars <= 0 or len(value) <= max_chars:
+            return value
+        return f"{value[:max_chars]}...(truncated {len(value) - max_chars} chars)"
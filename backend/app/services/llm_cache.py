@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from app.core.settings import SettingsManager
+
+# 每写入多少条记录顺带清理一次过期条目
+PURGE_EVERY_WRITES = 1000
+
+class LLMCache:
+    """
+    内容寻址的 LLM 响应缓存。
+
+    两级结构:
+    1. 内存 LRU (OrderedDict)，命中时无 I/O。
+    2. 本地 SQLite 存储，进程重启后依然有效；命中后回填内存层。
+
+    Key 为 Prompt 与模型参数 (model, base_url, temperature) 的 SHA-256，
+    因此任意一项变化都会产生新的 Key，不存在失效问题。
+
+    磁盘条目数在内存中维护 (打开数据库时统计一次)，写入路径上不再执行 COUNT(*)；
+    过期记录在打开数据库及每 PURGE_EVERY_WRITES 次写入后清理。
+    """
+
+    def __init__(self, path: str, memory_max_entries: int = 1024, disk_max_entries: int = 20000, ttl_seconds: int = 7 * 24 * 3600):
+        self.path = path
+        self.memory_max_entries = memory_max_entries
+        self.disk_max_entries = disk_max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_entries = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(prompt: str, model_name: str, base_url: str, temperature: float) -> str:
+        """
+        计算缓存 Key。
+        """
+        payload = json.dumps(
+            {"prompt": prompt, "model": model_name, "base_url": base_url, "temperature": temperature},
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        查询缓存，未命中或已过期返回 None。
+        """
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                value, created_at = item
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            row = self._db().execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                value, created_at = row
+                if now - created_at <= self.ttl_seconds:
+                    self._db().execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                    self._db().commit()
+                    self._remember(key, value, created_at)
+                    self.stats["disk_hits"] += 1
+                    return value
+                cursor = self._db().execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._db().commit()
+                self._disk_entries -= cursor.rowcount
+
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str):
+        """
+        写入缓存 (内存 + 磁盘)，并按条目上限淘汰最久未访问的记录。
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            db = self._db()
+            inserted = db.execute(
+                "INSERT OR IGNORE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            ).rowcount
+            if inserted:
+                self._disk_entries += 1
+            else:
+                db.execute(
+                    "UPDATE llm_cache SET value = ?, created_at = ?, accessed_at = ? WHERE key = ?",
+                    (value, now, now, key)
+                )
+            self.stats["writes"] += 1
+            if self._disk_entries > self.disk_max_entries:
+                overflow = self._disk_entries - self.disk_max_entries
+                evicted = db.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?)",
+                    (overflow,)
+                ).rowcount
+                self._disk_entries -= evicted
+                self.stats["evictions"] += evicted
+            db.commit()
+            purge = self.stats["writes"] % PURGE_EVERY_WRITES == 0
+        if purge:
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        """
+        删除所有过期记录，返回删除的磁盘条目数。
+        """
+        deadline = time.time() - self.ttl_seconds
+        with self._lock:
+            for key in [k for k, (_, created_at) in self._memory.items() if created_at < deadline]:
+                del self._memory[key]
+            cursor = self._db().execute("DELETE FROM llm_cache WHERE created_at < ?", (deadline,))
+            self._db().commit()
+            self._disk_entries -= cursor.rowcount
+            return cursor.rowcount
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+            self._db()
+            stats["disk_entries"] = self._disk_entries
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _remember(self, key: str, value: str, created_at: float):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_max_entries:
+            self._memory.popitem(last=False)
+
+    def _db(self) -> sqlite3.Connection:
+        # 调用方需持有 self._lock
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+            self._disk_entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return self._conn
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """
+    按当前配置返回全局缓存实例；缓存被禁用时返回 None。
+    缓存路径变化时会重新创建实例 (创建时清理一次过期记录)，容量与 TTL 的变化直接生效。
+    """
+    global _cache
+    settings = SettingsManager.load_settings()
+    if not settings.cache_enabled:
+        return None
+    with _cache_lock:
+        if _cache is None or _cache.path != settings.cache_path:
+            if _cache is not None:
+                _cache.close()
+            _cache = LLMCache(settings.cache_path, ttl_seconds=settings.cache_ttl_seconds)
+            _cache.purge_expired()
+        _cache.memory_max_entries = settings.cache_memory_max_entries
+        _cache.disk_max_entries = settings.cache_disk_max_entries
+        _cache.ttl_seconds = settings.cache_ttl_seconds
+        return _cache
@@ -1,32 +1,132 @@
+import hashlib
 import json
+import re
 import yaml
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Set, Tuple
 from fastapi import HTTPException
+from app.services.ref_resolver import RefResolver
+from app.services.spec_cache import spec_cache
+from app.utils.token_utils import estimate_tokens
+
+HTTP_METHODS = ["get", "post", "put", "delete", "patch", "options", "head"]
+
+# libyaml 可用时使用 C 实现的 SafeLoader，比纯 Python 版本快一个数量级
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 class ParserService:
     """OpenAPI 规范解析服务"""
 
+    @staticmethod
+    def sniff_format(content: str) -> str:
+        """
+        根据第一个非空白字符判断内容格式: `{` / `[` 开头为 json，否则为 yaml。
+        """
+        for ch in content[:4096]:
+            if ch.isspace() or ch == "\ufeff":
+                continue
+            return "json" if ch in "{[" else "yaml"
+        return "yaml"
+
     @staticmethod
     def parse_spec_content(content: str) -> Dict[str, Any]:
         """
         解析 OpenAPI 内容字符串 (JSON 或 YAML) 为字典。
+
+        先嗅探格式，YAML 内容不再先经历一次注定失败的 JSON 解析；
+        JSON 解析失败时 (例如带注释或尾随逗号的 "类 JSON") 仍回退到 YAML。
         """
         try:
-            # 尝试作为 JSON 解析
-            return json.loads(content)
-        except json.JSONDecodeError:
+            if ParserService.sniff_format(content) == "json":
+                try:
+                    return json.loads(content)
+                except json.JSONDecodeError:
+                    pass
+            return yaml.load(content, Loader=YAML_LOADER)
+        except yaml.YAMLError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid OpenAPI format. Must be JSON or YAML. Error: {str(e)}")
+
+    @staticmethod
+    def load_spec(content: str) -> Tuple[str, Dict[str, Any]]:
+        """
+        带缓存的 `parse_spec_content`，返回 (content_hash, parsed)。
+        返回的字典可能被多个任务共享，调用方不得修改。
+        """
+        content_hash = spec_cache.content_hash(content)
+        parsed = spec_cache.get(("parsed", content_hash))
+        if parsed is None:
+            parsed = ParserService.parse_spec_content(content)
+            spec_cache.set(("parsed", content_hash), parsed)
+        return content_hash, parsed
+
+    @staticmethod
+    def load_spec_file(path: str, content_hash: str) -> Dict[str, Any]:
+        """
+        从文件解析 Spec (上传接口保存的文件)，content_hash 为文件内容的 SHA-256，用作解析缓存 Key。
+
+        YAML 由解析器直接读取文件流；JSON 一次性读入后解析。
+        """
+        parsed = spec_cache.get(("parsed", content_hash))
+        if parsed is not None:
+            return parsed
+        with open(path, "r", encoding="utf-8-sig") as f:
+            head = f.read(4096)
+            f.seek(0)
             try:
-                # 尝试作为 YAML 解析
-                return yaml.safe_load(content)
+                if ParserService.sniff_format(head) == "json":
+                    try:
+                        parsed = json.load(f)
+                    except json.JSONDecodeError:
+                        f.seek(0)
+                if parsed is None:
+                    parsed = yaml.load(f, Loader=YAML_LOADER)
             except yaml.YAMLError as e:
                 raise HTTPException(status_code=400, detail=f"Invalid OpenAPI format. Must be JSON or YAML. Error: {str(e)}")
+        spec_cache.set(("parsed", content_hash), parsed)
+        return parsed
 
     @staticmethod
-    def simplify_spec(spec: Dict[str, Any]) -> str:
+    def iter_operations(spec: Dict[str, Any]) -> Iterator[Tuple[str, str, Dict[str, Any], List[Any]]]:
         """
-        简化 OpenAPI 规范以供 LLM 使用。
-        仅提取关键信息 (path, method, summary, parameters, responses) 以减少 Token 消耗。
-        返回简化后的 JSON 字符串。
+        遍历 Spec 中的所有操作，产出 (path, METHOD, operation, path_level_parameters)。
+        """
+        paths = spec.get("paths", {}) or {}
+        for path, methods in paths.items():
+            if not isinstance(methods, dict):
+                continue
+            path_params = methods.get("parameters", []) or []
+            for method, details in methods.items():
+                if method.lower() not in HTTP_METHODS or not isinstance(details, dict):
+                    continue
+                yield path, method.upper(), details, path_params
+
+    @staticmethod
+    def _select_operations(spec: Dict[str, Any], operations: Optional[Set[Tuple[str, str]]]) -> List[Tuple[str, str, Dict[str, Any], List[Any]]]:
+        """
+        返回 Spec 中的操作列表；给定 operations 时只保留其中的 (path, METHOD)。
+        """
+        return [
+            op for op in ParserService.iter_operations(spec)
+            if operations is None or (op[0], op[1]) in operations
+        ]
+
+    @staticmethod
+    def _attach_refs(target: Dict[str, Any], node: Any, resolver: RefResolver, ref_mode: str, inline_depth: int) -> Any:
+        """
+        按 ref_mode 处理节点中的 `$ref`:
+        - inline: 返回展开后的节点
+        - shared: 节点保持不变，被引用的定义去重后写入 target["shared_schemas"]
+        """
+        if ref_mode == "inline":
+            return resolver.inline(node, inline_depth)
+        table = resolver.shared_schemas(node)
+        if table:
+            target.setdefault("shared_schemas", {}).update(table)
+        return node
+
+    @staticmethod
+    def _summarize_operations(spec: Dict[str, Any], operations: List[Tuple[str, str, Dict[str, Any], List[Any]]], resolver: RefResolver, ref_mode: str, inline_depth: int) -> Dict[str, Any]:
+        """
+        将一组操作整理为摘要字典 (simplify_spec 与 shard_spec 共用)。
         """
         simplified = {
             "openapi": spec.get("openapi", "3.0.0"),
@@ -34,25 +134,207 @@ class ParserService:
             "paths": {}
         }
 
-        paths = spec.get("paths", {})
-        for path, methods in paths.items():
-            simplified["paths"][path] = {}
-            for method, details in methods.items():
-                if method.lower() not in ["get", "post", "put", "delete", "patch", "options", "head"]:
-                    continue
-                
-                method_data = {
-                    "summary": details.get("summary", ""),
-                    "description": details.get("description", ""),
-                    "operationId": details.get("operationId", ""),
-                    "parameters": details.get("parameters", []),
-                    "requestBody": details.get("requestBody", {}),
-                    "responses": list(details.get("responses", {}).keys()) # 仅保留状态码
-                }
-                simplified["paths"][path][method.upper()] = method_data
+        for path, method, details, path_params in operations:
+            method_data = {
+                "summary": details.get("summary", ""),
+                "description": details.get("description", ""),
+                "operationId": details.get("operationId", ""),
+                "parameters": path_params + (details.get("parameters", []) or []),
+                "requestBody": details.get("requestBody", {}),
+                "responses": list(details.get("responses", {}).keys()) # 仅保留状态码
+            }
+            simplified["paths"].setdefault(path, {})[method] = method_data
+
+        simplified["paths"] = ParserService._attach_refs(simplified, simplified["paths"], resolver, ref_mode, inline_depth)
+        return simplified
+
+    @staticmethod
+    def simplify_spec(spec: Dict[str, Any], ref_mode: str = "shared", inline_depth: int = 3, resolver: Optional[RefResolver] = None, operations: Optional[Set[Tuple[str, str]]] = None) -> str:
+        """
+        简化 OpenAPI 规范以供 LLM 使用。
+        仅提取关键信息 (path, method, summary, parameters, responses) 以减少 Token 消耗。
+        返回简化后的 JSON 字符串。
 
+        `$ref` 引用的组件不会丢失:
+        - ref_mode="shared" (默认): 在 `shared_schemas` 中输出去重后的定义表 {pointer: definition}
+        - ref_mode="inline": 将引用展开到 inline_depth 层
+
+        给定 operations 时只摘要其中的 (path, METHOD) (增量重新生成时使用)。
+        """
+        resolver = resolver or RefResolver(spec)
+        selected = ParserService._select_operations(spec, operations)
+        simplified = ParserService._summarize_operations(spec, selected, resolver, ref_mode, inline_depth)
         return json.dumps(simplified, ensure_ascii=False, indent=2)
 
+    @staticmethod
+    def shard_spec(spec: Dict[str, Any], token_budget: int, ref_mode: str = "shared", inline_depth: int = 3, resolver: Optional[RefResolver] = None, operations: Optional[Set[Tuple[str, str]]] = None) -> List[str]:
+        """
+        将 Spec 切分为多个不超过 token_budget 的摘要分片，供并行规划使用。
+
+        1. 按第一个 tag 分组，没有 tag 的操作按路径的第一段 (如 `/pets`) 分组。
+        2. 按分组顺序装箱: 分组能放进当前分片则合并，否则开启新分片；
+           单个分组超出预算时按操作拆分。单个操作超出预算时独占一个分片。
+        """
+        resolver = resolver or RefResolver(spec)
+        groups: Dict[str, List[Tuple[str, str, Dict[str, Any], List[Any]]]] = {}
+        for operation in ParserService._select_operations(spec, operations):
+            path, _, details, _ = operation
+            tags = details.get("tags") or []
+            key = f"tag:{tags[0]}" if tags else "path:/" + path.strip("/").split("/", 1)[0]
+            groups.setdefault(key, []).append(operation)
+
+        # 单个操作 (含其引用的定义) 的 Token 估算只计算一次；
+        # 分片成本按累加计算，共享定义被重复计入，结果偏保守
+        costs = {
+            (op[0], op[1]): estimate_tokens(json.dumps(
+                ParserService._summarize_operations(spec, [op], resolver, ref_mode, inline_depth),
+                ensure_ascii=False, indent=2
+            ))
+            for operations in groups.values() for op in operations
+        }
+
+        shards: List[List[Tuple[str, str, Dict[str, Any], List[Any]]]] = []
+        current: List[Tuple[str, str, Dict[str, Any], List[Any]]] = []
+        current_cost = 0
+        for operations in groups.values():
+            group_cost = sum(costs[(op[0], op[1])] for op in operations)
+            if current and current_cost + group_cost <= token_budget:
+                current.extend(operations)
+                current_cost += group_cost
+                continue
+            if current:
+                shards.append(current)
+            if group_cost <= token_budget:
+                current, current_cost = list(operations), group_cost
+                continue
+            # 分组本身超出预算: 逐个操作装箱
+            current, current_cost = [], 0
+            for op in operations:
+                op_cost = costs[(op[0], op[1])]
+                if current and current_cost + op_cost > token_budget:
+                    shards.append(current)
+                    current, current_cost = [], 0
+                current.append(op)
+                current_cost += op_cost
+        if current:
+            shards.append(current)
+
+        return [
+            json.dumps(ParserService._summarize_operations(spec, operations, resolver, ref_mode, inline_depth), ensure_ascii=False, indent=2)
+            for operations in shards
+        ]
+
+    @staticmethod
+    def build_operation_index(spec: Dict[str, Any], ref_mode: str = "shared", inline_depth: int = 3, resolver: Optional[RefResolver] = None) -> Dict[Tuple[str, str], str]:
+        """
+        为每个操作构建最小的 Spec 切片，供代码生成 Prompt 使用。
+
+        Key 为 (path, METHOD)，Value 为 JSON 字符串，仅包含:
+        - 该操作本身 (合并路径级 parameters)
+        - 该操作通过 `$ref` 直接或间接引用的定义 (按 ref_mode 展开或放入 shared_schemas)
+        - servers / basePath (用于确定请求地址)
+
+        所有操作共享同一个 RefResolver，被多次引用的定义只解析一次。
+        """
+        resolver = resolver or RefResolver(spec)
+        index = {}
+        for path, method, details, path_params in ParserService.iter_operations(spec):
+            operation = {
+                "summary": details.get("summary", ""),
+                "description": details.get("description", ""),
+                "operationId": details.get("operationId", ""),
+                "parameters": path_params + (details.get("parameters", []) or []),
+                "requestBody": details.get("requestBody", {}),
+                "responses": details.get("responses", {})
+            }
+            slice_: Dict[str, Any] = {}
+            for key in ("servers", "basePath", "consumes", "produces"):
+                if key in spec:
+                    slice_[key] = spec[key]
+            operation = ParserService._attach_refs(slice_, operation, resolver, ref_mode, inline_depth)
+            slice_["paths"] = {path: {method: operation}}
+            index[(path, method)] = json.dumps(slice_, ensure_ascii=False, indent=2)
+        return index
+
+    @staticmethod
+    def match_operation(keys: Iterable[Tuple[str, str]], endpoint: str, method: str) -> Optional[Tuple[str, str]]:
+        """
+        在 (path, METHOD) 集合中查找测试用例 endpoint / method 对应的操作。
+
+        LLM 给出的 endpoint 可能是模板路径 (`/pets/{petId}`)、具体路径 (`/pets/1`)
+        或带有查询串，依次尝试精确匹配与模板匹配，找不到时返回 None。
+        """
+        keys = keys if isinstance(keys, (dict, set, frozenset)) else set(keys)
+        if not keys or not endpoint:
+            return None
+        method = (method or "").upper()
+        path = endpoint.split("?", 1)[0]
+        for candidate in (path, path.rstrip("/") or "/"):
+            if (candidate, method) in keys:
+                return (candidate, method)
+
+        target = path.rstrip("/") or "/"
+        for template, op_method in keys:
+            if op_method != method:
+                continue
+            pattern = "^" + re.sub(r"\\\{[^/]+?\\\}", "[^/]+", re.escape(template.rstrip("/") or "/")) + "$"
+            if re.match(pattern, target):
+                return (template, op_method)
+        return None
+
+    @staticmethod
+    def lookup_operation(index: Dict[Tuple[str, str], str], endpoint: str, method: str) -> Optional[str]:
+        """
+        根据测试用例的 endpoint / method 查找操作切片，找不到时返回 None。
+        """
+        key = ParserService.match_operation(index, endpoint, method)
+        return index[key] if key else None
+
+    @staticmethod
+    def operation_key(path: str, method: str) -> str:
+        """
+        操作的字符串标识 (`METHOD path`)，用于可 JSON 序列化的结果中。
+        """
+        return f"{method.upper()} {path}"
+
+    @staticmethod
+    def parse_operation_key(key: str) -> Tuple[str, str]:
+        method, path = key.split(" ", 1)
+        return path, method
+
+    @staticmethod
+    def operation_hashes(spec: Dict[str, Any], resolver: Optional[RefResolver] = None) -> Dict[str, str]:
+        """
+        计算每个操作的规范化哈希 {`METHOD path`: sha256}。
+
+        哈希覆盖参数 (含路径级参数)、请求体、响应及它们通过 `$ref` 传递引用的全部定义，
+        summary / description 等描述性字段不参与计算，因此只有影响测试的改动才会改变哈希。
+        """
+        resolver = resolver or RefResolver(spec)
+        hashes = {}
+        for path, method, details, path_params in ParserService.iter_operations(spec):
+            canonical: Dict[str, Any] = {
+                "parameters": path_params + (details.get("parameters", []) or []),
+                "requestBody": details.get("requestBody", {}),
+                "responses": details.get("responses", {})
+            }
+            canonical["refs"] = resolver.shared_schemas(canonical)
+            payload = json.dumps(canonical, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+            hashes[ParserService.operation_key(path, method)] = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        return hashes
+
+    @staticmethod
+    def diff_operations(old_hashes: Dict[str, str], new_hashes: Dict[str, str]) -> Dict[str, List[str]]:
+        """
+        比较两个版本的操作哈希，返回 added / changed / removed / unchanged 四组操作标识。
+        """
+        return {
+            "added": [key for key in new_hashes if key not in old_hashes],
+            "changed": [key for key in new_hashes if key in old_hashes and old_hashes[key] != new_hashes[key]],
+            "removed": [key for key in old_hashes if key not in new_hashes],
+            "unchanged": [key for key in new_hashes if old_hashes.get(key) == new_hashes[key]]
+        }
+
     @staticmethod
     def validate_spec(spec: Dict[str, Any]) -> bool:
         """
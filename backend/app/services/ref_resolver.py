@@ -0,0 +1,158 @@
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+# 可被 `$ref` 引用的顶层容器 (OpenAPI 3 的 components 及 Swagger 2 的 definitions 等)
+COMPONENT_ROOTS = ("components", "definitions", "parameters", "responses")
+
+class RefResolver:
+    """
+    OpenAPI `$ref` 解析引擎。
+
+    - 构造时一次性索引 components / definitions 下的所有定义。
+    - JSON Pointer 解析与每个定义的直接引用集合均做记忆化，同一个 Spec 内重复引用只解析一次。
+    - 支持两种输出方式:
+      1. `inline`: 将引用展开到指定深度，遇到循环引用时保留 `$ref` 并标记 `x-circular`。
+      2. `shared_schemas`: 不修改原节点，返回去重后的共享定义表 {pointer: definition}。
+    """
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.spec = spec
+        self.index: Dict[str, Any] = {}
+        self._pointer_cache: Dict[str, Any] = {}
+        self._direct_refs_cache: Dict[str, Tuple[str, ...]] = {}
+        self._closure_cache: Dict[str, FrozenSet[str]] = {}
+        self._inline_cache: Dict[Tuple[str, int, FrozenSet[str]], Any] = {}
+        self._build_index()
+
+    def _build_index(self):
+        for root in COMPONENT_ROOTS:
+            container = self.spec.get(root)
+            if not isinstance(container, dict):
+                continue
+            if root == "components":
+                for section, definitions in container.items():
+                    if isinstance(definitions, dict):
+                        for name, definition in definitions.items():
+                            self.index[f"#/components/{section}/{self._escape(name)}"] = definition
+            else:
+                for name, definition in container.items():
+                    self.index[f"#/{root}/{self._escape(name)}"] = definition
+
+    @staticmethod
+    def _escape(name: str) -> str:
+        return str(name).replace("~", "~0").replace("/", "~1")
+
+    def resolve(self, pointer: str) -> Optional[Any]:
+        """
+        解析本地 JSON Pointer (`#/...`)，无法解析时返回 None。
+        """
+        if pointer in self.index:
+            return self.index[pointer]
+        if pointer in self._pointer_cache:
+            return self._pointer_cache[pointer]
+
+        node: Any = None
+        if pointer.startswith("#/"):
+            node = self.spec
+            for part in pointer[2:].split("/"):
+                part = part.replace("~1", "/").replace("~0", "~")
+                if isinstance(node, dict) and part in node:
+                    node = node[part]
+                elif isinstance(node, list) and part.isdigit() and int(part) < len(node):
+                    node = node[int(part)]
+                else:
+                    node = None
+                    break
+        self._pointer_cache[pointer] = node
+        return node
+
+    @staticmethod
+    def find_refs(node: Any) -> List[str]:
+        """
+        返回节点中直接出现的本地 `$ref` (不展开被引用的定义)，按出现顺序去重。
+        """
+        found: List[str] = []
+        seen: Set[str] = set()
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if isinstance(current, dict):
+                ref = current.get("$ref")
+                if isinstance(ref, str) and ref.startswith("#/") and ref not in seen:
+                    seen.add(ref)
+                    found.append(ref)
+                stack.extend(reversed([v for k, v in current.items() if k != "$ref"]))
+            elif isinstance(current, list):
+                stack.extend(reversed(current))
+        return found
+
+    def _direct_refs(self, pointer: str) -> Tuple[str, ...]:
+        cached = self._direct_refs_cache.get(pointer)
+        if cached is None:
+            cached = tuple(self.find_refs(self.resolve(pointer)))
+            self._direct_refs_cache[pointer] = cached
+        return cached
+
+    def collect_refs(self, node: Any) -> List[str]:
+        """
+        返回节点直接或间接引用的所有指针 (传递闭包)，循环引用只访问一次。
+        """
+        ordered: List[str] = []
+        seen: Set[str] = set()
+        queue = self.find_refs(node)
+        while queue:
+            pointer = queue.pop(0)
+            if pointer in seen:
+                continue
+            seen.add(pointer)
+            ordered.append(pointer)
+            queue.extend(ref for ref in self._direct_refs(pointer) if ref not in seen)
+        return ordered
+
+    def _closure(self, pointer: str) -> FrozenSet[str]:
+        cached = self._closure_cache.get(pointer)
+        if cached is None:
+            cached = frozenset(self.collect_refs({"$ref": pointer}))
+            self._closure_cache[pointer] = cached
+        return cached
+
+    def shared_schemas(self, node: Any) -> Dict[str, Any]:
+        """
+        返回节点引用的去重共享定义表 {pointer: definition}，无法解析的指针被跳过。
+        """
+        table = {}
+        for pointer in self.collect_refs(node):
+            definition = self.resolve(pointer)
+            if definition is not None:
+                table[pointer] = definition
+        return table
+
+    def inline(self, node: Any, max_depth: int = 3) -> Any:
+        """
+        将节点中的 `$ref` 展开为具体定义。
+
+        - 超过 max_depth 层的引用保持 `$ref` 原样。
+        - 当前展开链上已出现的引用视为循环，保留 `$ref` 并标记 `"x-circular": true`。
+        - 展开结果按 (pointer, 剩余深度, 展开链中该定义可达的引用) 记忆化: 循环标记取决于展开链，
+          只有展开链的相关部分相同时才复用，重复引用不会导致指数级膨胀，结果也与展开顺序无关。
+        """
+        return self._inline(node, max_depth, ())
+
+    def _inline(self, node: Any, depth: int, stack: Tuple[str, ...]) -> Any:
+        if isinstance(node, list):
+            return [self._inline(item, depth, stack) for item in node]
+        if not isinstance(node, dict):
+            return node
+
+        ref = node.get("$ref")
+        if isinstance(ref, str) and ref.startswith("#/"):
+            if ref in stack:
+                return {"$ref": ref, "x-circular": True}
+            target = self.resolve(ref)
+            if target is None or depth <= 0:
+                return {"$ref": ref}
+            key = (ref, depth, self._closure(ref).intersection(stack))
+            if key not in self._inline_cache:
+                self._inline_cache[key] = self._inline(target, depth - 1, stack + (ref,))
+            return self._inline_cache[key]
+
+        return {k: self._inline(v, depth, stack) for k, v in node.items()}
@@ -0,0 +1,210 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+from app.core.settings import SettingsManager
+
+# 任务级可选字段 (GET /tasks/{task_id}/artifacts 的 fields 参数)
+TASK_FIELDS = (
+    "status", "error", "final_output", "token_usage", "budget_skipped",
+    "operation_hashes", "spec_diff", "timings", "case_count", "created_at", "finished_at"
+)
+# 用例级可选字段 (TestCase 的字段外加 code)
+CASE_FIELDS = (
+    "id", "name", "description", "endpoint", "method", "type",
+    "expected_status", "data_requirements", "request_data", "code"
+)
+# 以 JSON 文本存储的任务级字段
+_JSON_TASK_FIELDS = ("token_usage", "budget_skipped", "operation_hashes", "spec_diff", "timings")
+
+class ResultStore:
+    """
+    基于 SQLite 的任务结果持久化存储。
+
+    - tasks 表: 每个任务一行，保存状态、最终文件、用量、耗时等任务级数据。
+    - cases 表: 每个用例一行，保存用例定义 (JSON) 与生成的代码，按计划顺序编号，
+      分页查询只读取请求的行，不需要把整个代码映射加载到内存。
+    """
+
+    def __init__(self, path: str, retention_seconds: int = 7 * 24 * 3600):
+        self.path = path
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def save(self, task_id: str, status: str, result: Optional[Dict[str, Any]] = None,
+             final_output: str = "", error: Optional[str] = None,
+             timings: Optional[Dict[str, Any]] = None, created_at: Optional[float] = None):
+        """
+        写入 (或覆盖) 一个任务的全部结果。result 为 `build_result` 的输出。
+        写入后顺带清理超过保留时间的任务。
+        """
+        result = result or {}
+        now = time.time()
+        test_plan = result.get("test_plan") or []
+        code_map = result.get("generated_code") or {}
+        with self._lock:
+            db = self._db()
+            db.execute("DELETE FROM cases WHERE task_id = ?", (task_id,))
+            db.execute(
+                "INSERT OR REPLACE INTO tasks (task_id, status, error, final_output, token_usage, budget_skipped, "
+                "operation_hashes, spec_diff, timings, case_count, created_at, finished_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    task_id, status, error, final_output,
+                    *(json.dumps(result.get(field), ensure_ascii=False) for field in _JSON_TASK_FIELDS[:-1]),
+                    json.dumps(timings or {}, ensure_ascii=False),
+                    len(test_plan), created_at or now, now
+                )
+            )
+            db.executemany(
+                "INSERT INTO cases (task_id, position, case_id, case_json, code) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (task_id, position, case["id"], json.dumps(case, ensure_ascii=False), code_map.get(case["id"]))
+                    for position, case in enumerate(test_plan)
+                ]
+            )
+            db.commit()
+        self.purge_expired()
+
+    def get_task(self, task_id: str, fields: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        读取任务级数据，fields 为空时返回全部字段。未知字段会被忽略。
+        """
+        selected = [field for field in (fields or TASK_FIELDS) if field in TASK_FIELDS]
+        columns = ", ".join(selected) or "task_id"
+        with self._lock:
+            row = self._db().execute(f"SELECT {columns} FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        if row is None:
+            return None
+        data = {"task_id": task_id}
+        for field, value in zip(selected, row):
+            data[field] = json.loads(value) if field in _JSON_TASK_FIELDS and value is not None else value
+        return data
+
+    def list_cases(self, task_id: str, offset: int = 0, limit: int = 50, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """
+        按计划顺序分页读取用例；fields 中不含 code 时不读取代码列。
+        """
+        selected = [field for field in (fields or CASE_FIELDS) if field in CASE_FIELDS]
+        with_code = "code" in selected
+        with self._lock:
+            rows = self._db().execute(
+                f"SELECT case_json{', code' if with_code else ''} FROM cases WHERE task_id = ? "
+                "ORDER BY position LIMIT ? OFFSET ?",
+                (task_id, limit, offset)
+            ).fetchall()
+        items = []
+        for row in rows:
+            case = json.loads(row[0])
+            if with_code:
+                case["code"] = row[1]
+            items.append({field: case.get(field) for field in selected})
+        return items
+
+    def get_case(self, task_id: str, case_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT case_json, code FROM cases WHERE task_id = ? AND case_id = ?", (task_id, case_id)
+            ).fetchone()
+        if row is None:
+            return None
+        return {**json.loads(row[0]), "code": row[1]}
+
+    def iter_final_output(self, task_id: str, chunk_chars: int = 64 * 1024) -> Iterator[str]:
+        """
+        按块读取任务的最终文件 (SQLite substr)，不需要把整个文件一次性加载到内存。
+        """
+        with self._lock:
+            row = self._db().execute("SELECT length(final_output) FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        total = (row[0] or 0) if row else 0
+        for start in range(1, total + 1, chunk_chars):
+            with self._lock:
+                chunk = self._db().execute(
+                    "SELECT substr(final_output, ?, ?) FROM tasks WHERE task_id = ?", (start, chunk_chars, task_id)
+                ).fetchone()
+            if not chunk or not chunk[0]:
+                return
+            yield chunk[0]
+
+    def get_result(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        重建与 `build_result` 相同结构的完整结果 (兼容 GET /tasks/{task_id}/result)。
+        """
+        task = self.get_task(task_id)
+        if task is None:
+            return None
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT case_json, case_id, code FROM cases WHERE task_id = ? ORDER BY position", (task_id,)
+            ).fetchall()
+        return {
+            "test_plan": [json.loads(case_json) for case_json, _, _ in rows],
+            "generated_code": {case_id: code for _, case_id, code in rows if code is not None},
+            "token_usage": task["token_usage"],
+            "budget_skipped": task["budget_skipped"] or [],
+            "operation_hashes": task["operation_hashes"] or {},
+            "spec_diff": task["spec_diff"] or {}
+        }
+
+    def purge_expired(self) -> int:
+        """
+        删除超过保留时间的任务，返回删除的任务数。
+        """
+        deadline = time.time() - self.retention_seconds
+        with self._lock:
+            db = self._db()
+            db.execute("DELETE FROM cases WHERE task_id IN (SELECT task_id FROM tasks WHERE finished_at < ?)", (deadline,))
+            cursor = db.execute("DELETE FROM tasks WHERE finished_at < ?", (deadline,))
+            db.commit()
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _db(self) -> sqlite3.Connection:
+        # 调用方需持有 self._lock
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                "task_id TEXT PRIMARY KEY, status TEXT NOT NULL, error TEXT, final_output TEXT, "
+                "token_usage TEXT, budget_skipped TEXT, operation_hashes TEXT, spec_diff TEXT, timings TEXT, "
+                "case_count INTEGER NOT NULL, created_at REAL NOT NULL, finished_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cases ("
+                "task_id TEXT NOT NULL, position INTEGER NOT NULL, case_id TEXT NOT NULL, "
+                "case_json TEXT NOT NULL, code TEXT, PRIMARY KEY (task_id, position))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cases_case_id ON cases (task_id, case_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_finished ON tasks (finished_at)")
+        return self._conn
+
+_store: Optional[ResultStore] = None
+_store_lock = threading.Lock()
+
+def get_result_store() -> Optional[ResultStore]:
+    """
+    按当前配置返回全局结果存储实例；持久化被禁用时返回 None。
+    """
+    global _store
+    settings = SettingsManager.load_settings()
+    if not settings.result_store_enabled:
+        return None
+    with _store_lock:
+        if _store is None or _store.path != settings.result_store_path:
+            if _store is not None:
+                _store.close()
+            _store = ResultStore(settings.result_store_path)
+        _store.retention_seconds = settings.result_retention_seconds
+        return _store
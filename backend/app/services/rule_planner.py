@@ -0,0 +1,414 @@
+import copy
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+from app.models.schemas import TestCase
+from app.services.parser_service import ParserService
+from app.services.ref_resolver import RefResolver
+
+# 展开 `$ref` 的最大深度 (规则规划只需要参数与请求体的结构)
+RULE_INLINE_DEPTH = 8
+# 每条规则 (缺失必填、类型错误、枚举越界、边界值) 在单个操作上最多覆盖的字段数
+MAX_FIELDS_PER_RULE = 5
+# 示例值中可选属性最多展开的嵌套层级
+OPTIONAL_PROPERTY_DEPTH = 2
+# 边界用例生成的字符串最大长度；超出时跳过该边界，避免巨大的请求数据进入计划、结果与 Prompt
+MAX_BOUNDARY_STRING_LENGTH = 1024
+
+_FORMAT_SAMPLES = {
+    "date-time": "2024-01-01T00:00:00Z",
+    "date": "2024-01-01",
+    "email": "user@example.com",
+    "uuid": "123e4567-e89b-12d3-a456-426614174000",
+    "uri": "https://example.com",
+    "hostname": "example.com",
+    "ipv4": "127.0.0.1"
+}
+_WRONG_TYPE_VALUES = {
+    "string": 12345,
+    "integer": "not-a-number",
+    "number": "not-a-number",
+    "boolean": "not-a-boolean",
+    "array": "not-an-array",
+    "object": "not-an-object"
+}
+# query / header 参数按字符串传输，只有这些类型的错误值能被服务端识别为类型错误
+_PARAM_WRONG_TYPES = ("integer", "number", "boolean")
+
+class RulePlanner:
+    """
+    基于 Schema 规则的确定性测试计划生成器 (不调用 LLM)。
+
+    遍历 ParserService 解析出的每个操作 (`$ref` 已展开)，按以下规则生成 TestCase:
+    - 正向: 使用 Schema 推导出的合法请求，预期第一个文档化的 2xx 状态码
+    - 逆向 (include_negative): 缺失必填字段 / 参数、类型错误、枚举越界，以及文档化的其他 4xx 状态码
+      (404 使用符合 Schema 但不存在的路径参数；无法确定触发请求的状态码不带 request_data，交给 LLM 构造)
+    - 边界 (include_boundary): minLength / maxLength、minimum / maximum (含 exclusiveMinimum / exclusiveMaximum
+      的 OAS 3.0 布尔形式与 3.1 数值形式) 的临界值与越界值；长度超过 MAX_BOUNDARY_STRING_LENGTH 的字符串边界被跳过
+
+    每个用例的 `request_data` 携带具体的请求数据 {path_params, query, headers, body}。
+    """
+
+    @staticmethod
+    def plan(spec: Dict[str, Any], include_boundary: bool = False, include_negative: bool = True,
+             resolver: Optional[RefResolver] = None, operations: Optional[Set[Tuple[str, str]]] = None) -> List[TestCase]:
+        """
+        为 Spec 中的操作生成测试计划；给定 operations 时只处理其中的 (path, METHOD)。
+        """
+        resolver = resolver or RefResolver(spec)
+        cases: List[TestCase] = []
+        for operation in ParserService._select_operations(spec, operations):
+            cases.extend(RulePlanner.plan_operation(operation, resolver, include_boundary, include_negative))
+        return cases
+
+    @staticmethod
+    def plan_operation(operation: Tuple[str, str, Dict[str, Any], List[Any]], resolver: RefResolver,
+                       include_boundary: bool, include_negative: bool) -> List[TestCase]:
+        path, method, details, path_params = operation
+        parameters = RulePlanner._parameters(path_params, details, resolver)
+        body_schema = RulePlanner._body_schema(details, path_params, resolver)
+        responses = details.get("responses") or {}
+        success = RulePlanner._success_status(method, responses)
+        error = RulePlanner._error_status(responses)
+        title = details.get("summary") or f"{method} {path}"
+
+        valid = RulePlanner.valid_request(parameters, body_schema)
+        builder = _CaseBuilder(path, method)
+        builder.add(f"{title} - 正常请求", f"使用符合 Schema 的合法数据调用 {method} {path}，预期返回 {success}", "positive", success, valid)
+
+        fields = RulePlanner._fields(parameters, body_schema)
+        if include_negative:
+            RulePlanner._negative_cases(builder, title, valid, parameters, body_schema, fields, error)
+            RulePlanner._documented_cases(builder, title, valid, parameters, responses, error)
+        if include_boundary:
+            RulePlanner._boundary_cases(builder, title, valid, fields, success, error)
+        return builder.cases
+
+    # --- 规则 ---
+
+    @staticmethod
+    def _negative_cases(builder: "_CaseBuilder", title: str, valid: Dict[str, Any], parameters: List[Dict[str, Any]],
+                        body_schema: Optional[Dict[str, Any]], fields: List[Tuple[str, str, Dict[str, Any]]], error: int):
+        required_params = [p for p in parameters if p.get("required") and p.get("in") in ("query", "header")]
+        for param in required_params[:MAX_FIELDS_PER_RULE]:
+            data = _mutate(valid, param["in"], param["name"], _MISSING)
+            builder.add(f"{title} - 缺少必填参数 {param['name']}", f"不传必填的 {param['in']} 参数 `{param['name']}`，预期返回 {error}", "negative", error, data)
+
+        if body_schema is not None:
+            required = [name for name in body_schema.get("required") or [] if name in (body_schema.get("properties") or {})]
+            for name in required[:MAX_FIELDS_PER_RULE]:
+                data = _mutate(valid, "body", name, _MISSING)
+                builder.add(f"{title} - 缺少必填字段 {name}", f"请求体缺少必填字段 `{name}`，预期返回 {error}", "negative", error, data)
+
+        typed = [
+            (location, name, schema) for location, name, schema in fields
+            if _schema_type(schema) in (_WRONG_TYPE_VALUES if location == "body" else _PARAM_WRONG_TYPES)
+        ]
+        for location, name, schema in typed[:MAX_FIELDS_PER_RULE]:
+            schema_type = _schema_type(schema)
+            data = _mutate(valid, location, name, _WRONG_TYPE_VALUES[schema_type])
+            builder.add(f"{title} - 字段 {name} 类型错误", f"{location} 字段 `{name}` 应为 {schema_type}，传入错误类型，预期返回 {error}", "negative", error, data)
+
+        enums = [field for field in fields if field[2].get("enum")]
+        for location, name, schema in enums[:MAX_FIELDS_PER_RULE]:
+            data = _mutate(valid, location, name, _invalid_enum_value(schema["enum"]))
+            builder.add(f"{title} - 字段 {name} 枚举值越界", f"{location} 字段 `{name}` 传入不在枚举 {schema['enum']} 中的值，预期返回 {error}", "negative", error, data)
+
+    @staticmethod
+    def _documented_cases(builder: "_CaseBuilder", title: str, valid: Dict[str, Any], parameters: List[Dict[str, Any]],
+                          responses: Dict[str, Any], error: int):
+        path_schemas = {p["name"]: p.get("schema") or p for p in parameters if p["in"] == "path"}
+        for code in sorted(str(code) for code in responses):
+            if not (code.isdigit() and 400 <= int(code) < 500) or int(code) == error:
+                continue
+            status = int(code)
+            response = responses.get(code)
+            description = response.get("description", "") if isinstance(response, dict) else ""
+            if status == 404 and path_schemas:
+                missing = {name: _nonexistent_value(schema) for name, schema in path_schemas.items()}
+                if all(value is not _MISSING for value in missing.values()):
+                    data = copy.deepcopy(valid)
+                    data["path_params"] = missing
+                    builder.add(f"{title} - 返回 404", "路径参数指向不存在的资源，预期返回 404", "negative", 404, data)
+                    continue
+            # 规则无法构造与合法请求不同的触发请求 (认证、冲突等)，不带 request_data，由 LLM 按描述构造
+            reason = {401: "不携带认证信息", 403: "使用无权限的身份调用"}.get(status) or description or f"触发文档声明的 {status} 响应"
+            builder.add(f"{title} - 返回 {status}", f"{reason}，预期返回 {status}", "negative", status, None, data_requirements=reason)
+
+    @staticmethod
+    def _boundary_cases(builder: "_CaseBuilder", title: str, valid: Dict[str, Any],
+                        fields: List[Tuple[str, str, Dict[str, Any]]], success: int, error: int):
+        covered = 0
+        for location, name, schema in fields:
+            if covered >= MAX_FIELDS_PER_RULE:
+                break
+            values = []
+            if _schema_type(schema) == "string":
+                if "maxLength" in schema and schema["maxLength"] < MAX_BOUNDARY_STRING_LENGTH:
+                    length = schema["maxLength"]
+                    values.append((f"长度等于 maxLength ({length})", "a" * length, success))
+                    values.append((f"长度超过 maxLength ({length + 1})", "a" * (length + 1), error))
+                if 0 < schema.get("minLength", 0) <= MAX_BOUNDARY_STRING_LENGTH:
+                    length = schema["minLength"]
+                    values.append((f"长度等于 minLength ({length})", "a" * length, success))
+                    values.append((f"长度小于 minLength ({length - 1})", "a" * (length - 1), error))
+            elif _schema_type(schema) in ("integer", "number"):
+                step = 1 if _schema_type(schema) == "integer" else 0.01
+                lower, lower_exclusive, upper, upper_exclusive = _numeric_bounds(schema)
+                if upper is not None:
+                    if upper_exclusive:
+                        values.append((f"略小于 exclusiveMaximum ({upper})", upper - step, success))
+                        values.append((f"等于 exclusiveMaximum ({upper})", upper, error))
+                    else:
+                        values.append((f"等于 maximum ({upper})", upper, success))
+                        values.append((f"超过 maximum", upper + step, error))
+                if lower is not None:
+                    if lower_exclusive:
+                        values.append((f"略大于 exclusiveMinimum ({lower})", lower + step, success))
+                        values.append((f"等于 exclusiveMinimum ({lower})", lower, error))
+                    else:
+                        values.append((f"等于 minimum ({lower})", lower, success))
+                        values.append((f"小于 minimum", lower - step, error))
+            if not values:
+                continue
+            covered += 1
+            for label, value, status in values:
+                data = _mutate(valid, location, name, value)
+                builder.add(f"{title} - {name} {label}", f"{location} 字段 `{name}` {label}，预期返回 {status}", "boundary", status, data)
+
+    # --- Spec 读取 ---
+
+    @staticmethod
+    def _parameters(path_params: List[Any], details: Dict[str, Any], resolver: RefResolver) -> List[Dict[str, Any]]:
+        # 操作级参数覆盖同名 (in, name) 的路径级参数
+        merged: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for param in resolver.inline(list(path_params) + list(details.get("parameters") or []), RULE_INLINE_DEPTH):
+            if isinstance(param, dict) and param.get("name") and param.get("in") in ("path", "query", "header"):
+                merged[(param["in"], param["name"])] = param
+        return list(merged.values())
+
+    @staticmethod
+    def _body_schema(details: Dict[str, Any], path_params: List[Any], resolver: RefResolver) -> Optional[Dict[str, Any]]:
+        request_body = resolver.inline(details.get("requestBody"), RULE_INLINE_DEPTH)
+        if isinstance(request_body, dict):
+            content = request_body.get("content") or {}
+            media = content.get("application/json") or next(iter(content.values()), None)
+            if isinstance(media, dict) and isinstance(media.get("schema"), dict):
+                return _merge_all_of(media["schema"])
+        # Swagger 2: in: body 参数
+        for param in resolver.inline(list(path_params) + list(details.get("parameters") or []), RULE_INLINE_DEPTH):
+            if isinstance(param, dict) and param.get("in") == "body" and isinstance(param.get("schema"), dict):
+                return _merge_all_of(param["schema"])
+        return None
+
+    @staticmethod
+    def _success_status(method: str, responses: Dict[str, Any]) -> int:
+        codes = sorted(int(code) for code in map(str, responses) if code.isdigit() and 200 <= int(code) < 300)
+        if codes:
+            return codes[0]
+        return 201 if method == "POST" else 200
+
+    @staticmethod
+    def _error_status(responses: Dict[str, Any]) -> int:
+        codes = [int(code) for code in map(str, responses) if code.isdigit() and 400 <= int(code) < 500]
+        for preferred in (400, 422):
+            if preferred in codes:
+                return preferred
+        return 400
+
+    @staticmethod
+    def valid_request(parameters: List[Dict[str, Any]], body_schema: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        由参数列表与请求体 Schema 构造合法请求 {path_params, query, headers, body}。
+        """
+        data: Dict[str, Any] = {}
+        sections = {"path": "path_params", "query": "query", "header": "headers"}
+        for param in parameters:
+            # 可选的 query / header 参数不放入正向请求
+            if param["in"] != "path" and not param.get("required"):
+                continue
+            schema = param.get("schema") or {k: v for k, v in param.items() if k in ("type", "format", "enum", "default", "example", "minimum", "maximum", "exclusiveMinimum", "exclusiveMaximum", "minLength", "maxLength")}
+            value = param["example"] if "example" in param else sample_value(schema)
+            data.setdefault(sections[param["in"]], {})[param["name"]] = value
+        if body_schema is not None:
+            data["body"] = sample_value(body_schema)
+        return data
+
+    @staticmethod
+    def _fields(parameters: List[Dict[str, Any]], body_schema: Optional[Dict[str, Any]]) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """
+        可被规则变异的字段: (location, name, schema)，location 为 query / header / body。
+        """
+        fields = []
+        for param in parameters:
+            if param["in"] in ("query", "header") and param.get("required"):
+                fields.append((param["in"], param["name"], param.get("schema") or param))
+        if body_schema is not None:
+            for name, schema in (body_schema.get("properties") or {}).items():
+                if isinstance(schema, dict):
+                    fields.append(("body", name, _merge_all_of(schema)))
+        return fields
+
+class _CaseBuilder:
+    """为单个操作生成编号连续、ID 唯一的 TestCase"""
+
+    def __init__(self, path: str, method: str):
+        self.path = path
+        self.method = method
+        self.prefix = f"rule_{method.lower()}_{re.sub(r'[^0-9a-zA-Z]+', '_', path).strip('_') or 'root'}"
+        self.cases: List[TestCase] = []
+
+    def add(self, name: str, description: str, case_type: str, status: int, request_data: Optional[Dict[str, Any]],
+            data_requirements: str = "使用 request_data 中的请求数据"):
+        self.cases.append(TestCase(
+            id=f"{self.prefix}_{len(self.cases):03d}",
+            name=name,
+            description=description,
+            endpoint=self.path,
+            method=self.method,
+            type=case_type,
+            expected_status=status,
+            data_requirements=data_requirements,
+            request_data=request_data
+        ))
+
+_MISSING = object()
+
+def _mutate(valid: Dict[str, Any], location: str, name: str, value: Any) -> Dict[str, Any]:
+    """返回合法请求的副本，并将 location 中的 name 字段替换为 value (或删除)"""
+    data = copy.deepcopy(valid)
+    section_name = {"query": "query", "header": "headers", "body": "body"}[location]
+    section = data.get(section_name)
+    if not isinstance(section, dict):
+        section = {}
+        data[section_name] = section
+    if value is _MISSING:
+        section.pop(name, None)
+    else:
+        section[name] = value
+    return data
+
+def _nonexistent_value(schema: Dict[str, Any]) -> Any:
+    """符合 Schema 但大概率不存在的路径参数值；枚举参数无法构造时返回 _MISSING"""
+    if schema.get("enum"):
+        return _MISSING
+    schema_type = _schema_type(schema)
+    if schema_type in ("integer", "number"):
+        lower, lower_exclusive, upper, upper_exclusive = _numeric_bounds(schema)
+        value = 999999999
+        if upper is not None:
+            value = min(value, upper - 1 if upper_exclusive else upper)
+        if lower is not None and (value < lower or (lower_exclusive and value == lower)):
+            return _MISSING
+        return int(value) if schema_type == "integer" else float(value)
+    if schema.get("format") == "uuid":
+        return "00000000-0000-0000-0000-000000000000"
+    value = "nonexistent-0000"
+    if len(value) < schema.get("minLength", 0):
+        value = value + "0" * (schema["minLength"] - len(value))
+    if "maxLength" in schema:
+        value = value[:schema["maxLength"]]
+    return value if value else _MISSING
+
+def _schema_type(schema: Dict[str, Any]) -> Optional[str]:
+    schema_type = schema.get("type")
+    if isinstance(schema_type, list):
+        schema_type = next((t for t in schema_type if t != "null"), None)
+    if schema_type is None and "properties" in schema:
+        return "object"
+    return schema_type
+
+def _merge_all_of(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """合并 allOf 子 Schema 的 properties / required (已展开 `$ref`)"""
+    if not isinstance(schema.get("allOf"), list):
+        return schema
+    merged = {k: v for k, v in schema.items() if k != "allOf"}
+    properties = dict(merged.get("properties") or {})
+    required = list(merged.get("required") or [])
+    for part in schema["allOf"]:
+        if isinstance(part, dict):
+            part = _merge_all_of(part)
+            properties.update(part.get("properties") or {})
+            required.extend(name for name in part.get("required") or [] if name not in required)
+            merged.setdefault("type", part.get("type"))
+    merged["properties"] = properties
+    if required:
+        merged["required"] = required
+    return merged
+
+def _invalid_enum_value(enum: List[Any]) -> Any:
+    numbers = [value for value in enum if isinstance(value, (int, float)) and not isinstance(value, bool)]
+    if numbers and len(numbers) == len(enum):
+        return max(numbers) + 1
+    candidate = "INVALID_ENUM_VALUE"
+    while candidate in enum:
+        candidate += "_X"
+    return candidate
+
+def _numeric_bounds(schema: Dict[str, Any]) -> Tuple[Optional[float], bool, Optional[float], bool]:
+    """
+    返回 (下界, 下界是否排他, 上界, 上界是否排他)，不存在的界为 None。
+    同时支持 OAS 3.0 的布尔形式 (`exclusiveMaximum: true` 修饰 maximum) 与 OAS 3.1 / JSON Schema 的
+    数值形式 (`exclusiveMaximum: 10` 本身即排他上界)，两者同时出现时取更严格的一个。
+    """
+    def candidates(inclusive_key: str, exclusive_key: str) -> List[Tuple[float, bool]]:
+        found = []
+        if _is_number(schema.get(inclusive_key)):
+            found.append((schema[inclusive_key], schema.get(exclusive_key) is True))
+        if _is_number(schema.get(exclusive_key)):
+            found.append((schema[exclusive_key], True))
+        return found
+
+    # 数值相同时排他的界更严格
+    lower, lower_exclusive = max(candidates("minimum", "exclusiveMinimum"), default=(None, False))
+    upper, upper_exclusive = min(candidates("maximum", "exclusiveMaximum"), key=lambda item: (item[0], not item[1]), default=(None, False))
+    return lower, lower_exclusive, upper, upper_exclusive
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def sample_value(schema: Any, depth: int = 0) -> Any:
+    """
+    根据 Schema 推导一个合法的示例值: 优先使用 example / default / enum，其次按类型与约束构造。
+    """
+    if not isinstance(schema, dict) or depth > 6:
+        return "string"
+    for key in ("example", "default"):
+        if key in schema:
+            return copy.deepcopy(schema[key])
+    if schema.get("enum"):
+        return schema["enum"][0]
+    for key in ("oneOf", "anyOf"):
+        if isinstance(schema.get(key), list) and schema[key]:
+            return sample_value(schema[key][0], depth + 1)
+    schema = _merge_all_of(schema)
+
+    schema_type = _schema_type(schema)
+    if schema_type == "object":
+        required = set(schema.get("required") or [])
+        return {
+            name: sample_value(prop, depth + 1)
+            for name, prop in (schema.get("properties") or {}).items()
+            if name in required or depth < OPTIONAL_PROPERTY_DEPTH
+        }
+    if schema_type == "array":
+        return [sample_value(schema.get("items"), depth + 1) for _ in range(max(schema.get("minItems", 1), 1))]
+    if schema_type in ("integer", "number"):
+        step = 1 if schema_type == "integer" else 0.01
+        lower, lower_exclusive, upper, upper_exclusive = _numeric_bounds(schema)
+        if lower is not None:
+            value = lower + step if lower_exclusive else lower
+        else:
+            value = 1
+            if upper is not None:
+                value = min(value, upper - step if upper_exclusive else upper)
+        return int(value) if schema_type == "integer" else float(value)
+    if schema_type == "boolean":
+        return True
+    if schema_type == "null":
+        return None
+    value = _FORMAT_SAMPLES.get(schema.get("format"), "string")
+    if len(value) < schema.get("minLength", 0):
+        value = value + "a" * (schema["minLength"] - len(value))
+    if "maxLength" in schema and len(value) > schema["maxLength"]:
+        value = value[:schema["maxLength"]]
+    return value
@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+import time
+import zlib
+from typing import AsyncIterator, Dict, Any
+from fastapi import HTTPException
+from app.core.settings import SettingsManager
+from app.services.parser_service import ParserService
+
+# 每次从解压器取出的最大字节数，避免压缩炸弹一次性展开到内存
+DECOMPRESS_CHUNK = 1024 * 1024
+SPEC_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+class SpecUploadService:
+    """
+    Spec 上传服务。
+
+    上传内容以流的方式写入 SpooledTemporaryFile (小文件留在内存，超过阈值自动落盘)，
+    gzip 内容边接收边解压，解压后的大小受 `upload_max_bytes` 限制；
+    每个分块的解压与写入都在线程池中执行，事件循环只负责接收数据。
+    接收完成后按内容的 SHA-256 保存到 `upload_dir`，该哈希即 spec_id，
+    同时作为 Spec 解析缓存的 Key，Parser 直接从文件读取，不再经过请求体 JSON 字符串。
+    """
+
+    @staticmethod
+    async def receive(chunks: AsyncIterator[bytes], compressed: bool = False) -> Dict[str, Any]:
+        """
+        接收上传流并保存，返回 {"spec_id", "size", "format"}。
+
+        Raises:
+            HTTPException 413: 内容 (解压后) 超过 upload_max_bytes
+            HTTPException 400: gzip 数据损坏或内容为空
+        """
+        settings = SettingsManager.load_settings()
+        max_bytes = settings.upload_max_bytes
+        hasher = hashlib.sha256()
+        size = 0
+        head = b""
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if compressed else None
+
+        with tempfile.SpooledTemporaryFile(max_size=settings.upload_spool_max_memory) as spool:
+            def write(data: bytes):
+                nonlocal size, head
+                if not data:
+                    return
+                size += len(data)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Spec exceeds the upload limit of {max_bytes} bytes.")
+                if len(head) < 4096:
+                    head += data[:4096 - len(head)]
+                hasher.update(data)
+                spool.write(data)
+
+            def consume(chunk: bytes):
+                if decompressor is None:
+                    write(chunk)
+                    return
+                write(decompressor.decompress(chunk, DECOMPRESS_CHUNK))
+                while decompressor.unconsumed_tail:
+                    write(decompressor.decompress(decompressor.unconsumed_tail, DECOMPRESS_CHUNK))
+
+            # 解压与写入 (超过 upload_spool_max_memory 后为磁盘 I/O) 在线程池中逐块执行，不阻塞事件循环
+            try:
+                async for chunk in chunks:
+                    if chunk:
+                        await asyncio.to_thread(consume, chunk)
+                if decompressor is not None:
+                    await asyncio.to_thread(write, decompressor.flush())
+            except zlib.error as e:
+                raise HTTPException(status_code=400, detail=f"Invalid gzip data: {e}")
+
+            if size == 0:
+                raise HTTPException(status_code=400, detail="Uploaded spec is empty.")
+
+            spec_id = hasher.hexdigest()
+            spool.seek(0)
+            await asyncio.to_thread(SpecUploadService._store, spool, spec_id, settings.upload_dir)
+
+        await asyncio.to_thread(SpecUploadService.purge_expired)
+        return {
+            "spec_id": spec_id,
+            "size": size,
+            "format": ParserService.sniff_format(head.decode("utf-8", errors="ignore"))
+        }
+
+    @staticmethod
+    def _store(spool, spec_id: str, upload_dir: str):
+        os.makedirs(upload_dir, exist_ok=True)
+        path = os.path.join(upload_dir, f"{spec_id}.spec")
+        if os.path.exists(path):
+            # 相同内容已存在，刷新修改时间以延长保留期
+            os.utime(path)
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=upload_dir, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    block = spool.read(DECOMPRESS_CHUNK)
+                    if not block:
+                        break
+                    f.write(block)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def path_for(spec_id: str) -> str:
+        """
+        返回已上传 Spec 的文件路径，spec_id 非法或文件不存在时抛出 404。
+        """
+        if not SPEC_ID_PATTERN.match(spec_id or ""):
+            raise HTTPException(status_code=404, detail=f"Spec {spec_id} not found.")
+        path = os.path.join(SettingsManager.load_settings().upload_dir, f"{spec_id}.spec")
+        if not os.path.exists(path):
+            raise HTTPException(status_code=404, detail=f"Spec {spec_id} not found or expired.")
+        return path
+
+    @staticmethod
+    def purge_expired() -> int:
+        """
+        删除超过 upload_ttl_seconds 未被使用的上传文件，返回删除数量。
+        """
+        settings = SettingsManager.load_settings()
+        if not os.path.isdir(settings.upload_dir):
+            return 0
+        deadline = time.time() - settings.upload_ttl_seconds
+        removed = 0
+        for entry in os.scandir(settings.upload_dir):
+            if entry.name.endswith(".spec") and entry.stat().st_mtime < deadline:
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
@@ -0,0 +1,203 @@
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+from app.agent.runner import astream_workflow, build_result
+from app.models.schemas import TaskProgress, TaskStatusResponse
+from app.services.result_store import get_result_store
+
+class TaskRecord:
+    """
+    单个后台任务的运行时记录。
+    """
+
+    def __init__(self, task_id: str):
+        now = time.time()
+        self.task_id = task_id
+        self.status = "processing"
+        self.progress = TaskProgress()
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = now
+        self.updated_at = now
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # 各阶段最近一次完成的时间 (相对创建时间的秒数)
+        self.stage_times: Dict[str, float] = {}
+        # 结果已写入持久化存储，内存中不再保留 result
+        self.persisted = False
+
+    def touch(self):
+        self.updated_at = time.time()
+
+    def mark_stage(self, stage: str):
+        self.stage_times[stage] = round(time.time() - self.created_at, 3)
+
+    def timings(self) -> Dict[str, Any]:
+        return {
+            "queued_seconds": round((self.started_at or self.created_at) - self.created_at, 3),
+            "duration_seconds": round((self.finished_at or time.time()) - self.created_at, 3),
+            "stages": dict(self.stage_times)
+        }
+
+    def finish(self, status: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.progress.stage = "done"
+        self.finished_at = time.time()
+        self.updated_at = self.finished_at
+
+    def to_status(self) -> TaskStatusResponse:
+        return TaskStatusResponse(
+            task_id=self.task_id,
+            status=self.status,
+            progress=self.progress.model_copy(),
+            error=self.error,
+            created_at=self.created_at,
+            updated_at=self.updated_at
+        )
+
+class JobStore:
+    """
+    内存任务存储，已结束的任务在 TTL 到期后被淘汰。
+
+    运行中的任务永远不会被淘汰；淘汰在每次读写时惰性执行，无需额外的清理线程。
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._records: Dict[str, TaskRecord] = {}
+        self._lock = threading.Lock()
+
+    def put(self, record: TaskRecord):
+        with self._lock:
+            self._evict_expired()
+            self._records[record.task_id] = record
+
+    def get(self, task_id: str) -> Optional[TaskRecord]:
+        with self._lock:
+            self._evict_expired()
+            return self._records.get(task_id)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._records)
+
+    def _evict_expired(self):
+        deadline = time.time() - self.ttl_seconds
+        expired = [
+            task_id for task_id, record in self._records.items()
+            if record.finished_at is not None and record.finished_at < deadline
+        ]
+        for task_id in expired:
+            del self._records[task_id]
+
+class TaskManager:
+    """
+    后台任务管理器。
+
+    `submit` 立即返回，工作流在事件循环中作为后台协程执行；
+    同时运行的任务数由 `max_workers` 限制，超出的任务排队等待 (stage 为 queued)。
+    任务结束后结果写入持久化存储 (见 `ResultStore`) 并从内存中释放；存储被禁用时结果保留在内存中。
+    """
+
+    def __init__(self, max_workers: int, ttl_seconds: int):
+        self.max_workers = max_workers
+        self.store = JobStore(ttl_seconds)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # 保存后台 Task 的强引用，防止被垃圾回收
+        self._running: Set[asyncio.Task] = set()
+
+    def configure(self, max_workers: int, ttl_seconds: int):
+        """
+        应用最新配置。worker 数量的变化对之后提交的任务生效。
+        """
+        if max_workers != self.max_workers:
+            self.max_workers = max_workers
+            self._semaphore = None
+        self.store.ttl_seconds = ttl_seconds
+
+    def submit(self, task_id: str, initial_state: Dict[str, Any], config: Dict[str, Any]) -> TaskRecord:
+        """
+        提交任务并立即返回任务记录。必须在事件循环中调用。
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        record = TaskRecord(task_id)
+        self.store.put(record)
+
+        task = asyncio.create_task(self._run(record, initial_state, config, self._semaphore))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+        return record
+
+    def get(self, task_id: str) -> Optional[TaskRecord]:
+        return self.store.get(task_id)
+
+    async def _run(self, record: TaskRecord, initial_state: Dict[str, Any], config: Dict[str, Any], semaphore: asyncio.Semaphore):
+        async with semaphore:
+            print(f"Starting background workflow for task {record.task_id}")
+            record.started_at = time.time()
+            final_state = initial_state
+            try:
+                async for kind, payload in astream_workflow(initial_state, config):
+                    if kind == "final":
+                        final_state = payload
+                    elif kind == "custom":
+                        self._track_custom_event(record, payload)
+                    else:
+                        self._track_progress(record, payload)
+
+                if final_state.get("error"):
+                    record.finish("failed", error=final_state["error"])
+                else:
+                    record.finish("completed", result=build_result(final_state))
+            except Exception as e:
+                print(f"Background workflow failed for task {record.task_id}: {e}")
+                record.finish("failed", error=str(e))
+            await self._persist(record, final_state.get("final_output", ""))
+
+    @staticmethod
+    async def _persist(record: TaskRecord, final_output: str):
+        try:
+            store = await asyncio.to_thread(get_result_store)
+            if store is None:
+                return
+            await asyncio.to_thread(
+                store.save, record.task_id, record.status, record.result, final_output,
+                record.error, record.timings(), record.created_at
+            )
+            record.persisted = True
+            record.result = None
+        except Exception as e:
+            print(f"Failed to persist result of task {record.task_id}: {e}")
+
+    @staticmethod
+    def _track_custom_event(record: TaskRecord, event: Dict[str, Any]):
+        # 流水线模式下用例在 Planner 节点内部生成，通过自定义事件上报进度
+        if event.get("event") == "plan_case":
+            record.progress.stage = "planner"
+            record.progress.total += 1
+        elif event.get("event") == "case":
+            record.progress.completed += 1
+            record.mark_stage("generator")
+        record.touch()
+
+    @staticmethod
+    def _track_progress(record: TaskRecord, update: Dict[str, Any]):
+        for node_name, node_update in update.items():
+            record.progress.stage = node_name
+            record.mark_stage(node_name)
+            node_update = node_update or {}
+            if node_name == "planner" and node_update.get("test_plan") is not None:
+                # 超出 Token 预算的用例不会生成代码，不计入总数
+                skipped = node_update.get("budget_skipped") or []
+                record.progress.total = len(node_update["test_plan"]) - len(skipped)
+                # 增量复用的代码 (及流水线模式下已生成的代码) 由 Planner 更新直接写入
+                record.progress.completed = len(node_update.get("generated_code_map") or {})
+            elif node_name == "generator":
+                record.progress.completed += len(node_update.get("generated_code_map") or {})
+        record.touch()
+
+task_manager = TaskManager(max_workers=4, ttl_seconds=3600)
@@ -1,46 +1,36 @@
+import json
 import re
 import json_repair
 
-def robust_json_parse(json_str: str):
+# Default caps for string repetition expansion ("A" * N / "A".repeat(N))
+DEFAULT_MAX_REPEAT = 10_000
+DEFAULT_MAX_EXPANDED_CHARS = 1_000_000
+
+_QUOTE = re.compile(r"[\"']")
+_STRING_END = {'"': re.compile(r'["\\]'), "'": re.compile(r"['\\]")}
+_MULTIPLY = re.compile(r"\s*\*\s*(\d+)")
+_REPEAT = re.compile(r"\s*\.repeat\(\s*(\d+)\s*\)")
+
+def robust_json_parse(json_str: str, max_repeat: int = DEFAULT_MAX_REPEAT, max_expanded_chars: int = DEFAULT_MAX_EXPANDED_CHARS):
     """
     Parses a JSON string properly, even if it contains:
     1. Python-style string multiplication: "A" * 1000
     2. JS/TS-style string repetition: "A".repeat(1000)
     3. Missing commas or minor syntax errors (handled by json_repair)
+
+    Valid JSON is returned by the strict parser without any pre-processing.
+    Repetition counts are clamped to `max_repeat`, and the total number of
+    characters produced by expansions to `max_expanded_chars`, so a model
+    output such as `"A" * 1000000000` cannot exhaust memory.
     """
-    
-    # Pre-process: Handle String Multiplication/Repetition
-    # Case 1: "char" * N (Python-style)
-    # Regex explanation:
-    # ((?:\"[^\"]*\"|'[^']*'))  -> Group 1: Match a string in double quotes OR single quotes.
-    #                              [^\"]* means any char except double quote.
-    # \s*\*\s*(\d+)             -> Match * followed by a number (Group 2)
-    def replace_mul(match):
-        full_str = match.group(1)
-        # Remove surrounding quotes
-        if full_str.startswith('"'):
-            content = full_str[1:-1]
-        else:
-            content = full_str[1:-1]
-            
-        count = int(match.group(2))
-        # Return new string with double quotes (standard JSON)
-        return f'"{content * count}"'
-
-    json_str = re.sub(r'((?:\"[^\"]*\"|\'[^\']*\'))\s*\*\s*(\d+)', replace_mul, json_str)
-
-    # Case 2: "char".repeat(N) (JS-style)
-    def replace_repeat(match):
-        full_str = match.group(1)
-        if full_str.startswith('"'):
-            content = full_str[1:-1]
-        else:
-            content = full_str[1:-1]
-            
-        count = int(match.group(2))
-        return f'"{content * count}"'
-    
-    json_str = re.sub(r'((?:\"[^\"]*\"|\'[^\']*\'))\.repeat\((\d+)\)', replace_repeat, json_str)
+    # Fast path: clean model output needs no repair
+    try:
+        return json.loads(json_str)
+    except (ValueError, TypeError):
+        pass
+
+    if "*" in json_str or ".repeat(" in json_str:
+        json_str = expand_string_repetition(json_str, max_repeat, max_expanded_chars)
 
     # Use json_repair to handle structural issues (missing commas, unclosed brackets, etc.)
     try:
@@ -49,3 +39,62 @@ def robust_json_parse(json_str: str):
     except Exception as e:
         # Fallback diagnostics
         raise ValueError(f"Failed to parse JSON even with repair: {e}")
+
+def expand_string_repetition(text: str, max_repeat: int = DEFAULT_MAX_REPEAT, max_expanded_chars: int = DEFAULT_MAX_EXPANDED_CHARS) -> str:
+    """
+    Replaces `"s" * N` and `"s".repeat(N)` with the repeated JSON string in a single pass.
+
+    The scan walks string literals (double or single quoted) honoring backslash
+    escapes, so quotes, `*` or `.repeat(` inside strings are never mistaken for
+    operators. Text between literals is copied verbatim.
+    """
+    out = []
+    budget = max_expanded_chars
+    pos = 0
+    length = len(text)
+    while pos < length:
+        match = _QUOTE.search(text, pos)
+        if match is None:
+            break
+        start = match.start()
+        quote = text[start]
+        end = _find_string_end(text, start + 1, quote)
+        if end is None:
+            # Unterminated string: leave the rest for json_repair
+            break
+
+        operator = _MULTIPLY.match(text, end + 1) or _REPEAT.match(text, end + 1)
+        if operator is None:
+            out.append(text[pos:end + 1])
+            pos = end + 1
+            continue
+
+        content = text[start + 1:end]
+        if quote == "'":
+            content = _single_to_double_quoted(content)
+        count = min(int(operator.group(1)), max_repeat)
+        if content:
+            count = min(count, max(budget // len(content), 1))
+            budget = max(budget - len(content) * count, 0)
+        out.append(text[pos:start])
+        out.append(f'"{content * count}"')
+        pos = operator.end()
+
+    out.append(text[pos:])
+    return "".join(out)
+
+def _find_string_end(text: str, pos: int, quote: str):
+    """Returns the index of the closing quote, or None if the string never closes."""
+    pattern = _STRING_END[quote]
+    while True:
+        match = pattern.search(text, pos)
+        if match is None:
+            return None
+        if text[match.start()] == "\\":
+            pos = match.start() + 2
+            continue
+        return match.start()
+
+def _single_to_double_quoted(content: str) -> str:
+    """Converts the body of a single-quoted literal to a valid double-quoted JSON body."""
+    return re.sub(r'\\(.)|"', lambda m: "\\\"" if m.group(0) == '"' else (m.group(1) if m.group(1) == "'" else m.group(0)), content)
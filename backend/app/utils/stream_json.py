@@ -0,0 +1,76 @@
+from typing import List
+
+class IncrementalArrayParser:
+    """
+    从流式输出中增量提取顶层 JSON 数组的元素。
+
+    文本块到达时逐块喂入；第一个顶层数组中的对象元素每闭合一个，就返回其原始文本，
+    调用方可以在流的其余部分仍在生成时解析并处理该元素。
+
+    只跟踪结构 (方括号、花括号、字符串边界与转义)，元素文本原样返回，
+    以便 `robust_json_parse` 仍能修复元素内 `"A" * 10` 之类的模型输出习惯。
+    第一个 `[` 之前的文本 (说明文字、Markdown 代码块标记) 被忽略。
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._quote = ""
+        self._escape = False
+        self._started = False
+        self._finished = False
+        self._capturing = False
+        self.elements_emitted = 0
+
+    @property
+    def finished(self) -> bool:
+        """顶层数组是否已经闭合"""
+        return self._finished
+
+    def feed(self, chunk: str) -> List[str]:
+        """
+        消费一个文本块，返回该块中闭合的所有元素的原始文本。
+        """
+        completed: List[str] = []
+        if self._finished:
+            return completed
+
+        for ch in chunk:
+            if not self._started:
+                if ch == "[":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._capturing:
+                self._buffer.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == self._quote:
+                    self._in_string = False
+                continue
+
+            if ch in ('"', "'") and self._depth >= 2:
+                self._in_string = True
+                self._quote = ch
+            elif ch in "[{":
+                if self._depth == 1 and ch == "{":
+                    self._capturing = True
+                    self._buffer = [ch]
+                self._depth += 1
+            elif ch in "]}":
+                self._depth -= 1
+                if self._depth == 1 and self._capturing:
+                    completed.append("".join(self._buffer))
+                    self._buffer = []
+                    self._capturing = False
+                    self.elements_emitted += 1
+                elif self._depth <= 0:
+                    self._finished = True
+                    break
+        return completed
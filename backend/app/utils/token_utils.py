@@ -0,0 +1,13 @@
+import re
+
+# CJK 字符通常单独占用约 1 个 token，其余文本约 4 个字符 1 个 token
+_CJK_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]")
+
+def estimate_tokens(text: str) -> int:
+    """
+    本地低成本估算文本的 Token 数，用于发送 Prompt 前的预算检查。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
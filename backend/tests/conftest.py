@@ -0,0 +1,151 @@
+import asyncio
+import json
+import threading
+import time
+from contextlib import nullcontext
+import pytest
+from app.core import llm as llm_module
+from app.core.resilience import provider_guards
+from app.api.v1 import endpoints as endpoints_module
+from app.services import task_manager as task_manager_module
+
+SPEC = json.dumps({
+    "openapi": "3.0.0",
+    "info": {"title": "Pets", "version": "1.0"},
+    "paths": {"/pets": {"get": {"summary": "List pets", "responses": {"200": {}}}}}
+})
+
+PLAN = [
+    {
+        "id": f"test_pets_{i:03d}",
+        "name": f"case {i}",
+        "description": "list pets",
+        "endpoint": "/pets",
+        "method": "GET",
+        "type": "positive",
+        "expected_status": 200
+    }
+    for i in range(6)
+]
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+
+class FakeLLM:
+    """按 Prompt 内容返回计划或代码，并记录最大并发数"""
+
+    def __init__(self, delay=0.0, fail_ids=(), batch_drop_ids=()):
+        self.delay = delay
+        self.fail_ids = set(fail_ids)
+        self.batch_drop_ids = set(batch_drop_ids)
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def _batch_reply(self, prompt):
+        # 批量 Prompt: 为每个出现的用例返回一个分隔的代码块，batch_drop_ids 中的用例缺失
+        return FakeMessage("\n".join(
+            f"### CASE: {c['id']}\necho {c['id']}\n### END CASE"
+            for c in PLAN if c["id"] in prompt and c["id"] not in self.batch_drop_ids
+        ))
+
+    async def ainvoke(self, messages):
+        prompt = messages[-1].content
+        self.calls += 1
+        if "测试计划" in prompt:
+            return FakeMessage(json.dumps(PLAN))
+        if "### CASE:" in prompt:
+            return self._batch_reply(prompt)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            case_id = next(c["id"] for c in PLAN if c["name"] in prompt)
+            return FakeMessage(f"echo {case_id}")
+        finally:
+            self.active -= 1
+
+    async def astream(self, messages):
+        # 以小块形式流式返回计划，模拟逐 token 输出
+        text = json.dumps(PLAN)
+        for i in range(0, len(text), 7):
+            await asyncio.sleep(self.delay / 10)
+            yield FakeMessage(text[i:i + 7])
+
+    def invoke(self, messages):
+        prompt = messages[-1].content
+        self.calls += 1
+        if "测试计划" in prompt:
+            return FakeMessage(json.dumps(PLAN))
+        if "### CASE:" in prompt:
+            return self._batch_reply(prompt)
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            case_id = next(c["id"] for c in PLAN if c["name"] in prompt)
+            if case_id in self.fail_ids:
+                raise RuntimeError("boom")
+            return FakeMessage(f"echo {case_id}")
+        finally:
+            with self.lock:
+                self.active -= 1
+
+def _initial_state():
+    return {
+        "openapi_spec_content": SPEC,
+        "user_preferences": {
+            "target_language": "curl",
+            "llm_config": {"base_url": "http://llm", "api_key": "k", "model_name": "m", "tier": "high"},
+            "include_boundary": False,
+            "include_negative": True,
+            # 默认走 LLM 生成路径，模板生成在 test_code_templates.py 中单独覆盖
+            "template_codegen": False
+        },
+        "parse_result": {},
+        "spec_summary": "",
+        "operation_index": {},
+        "operation_hashes": {},
+        "spec_diff": {},
+        "test_plan": [],
+        "generated_code_map": {},
+        "token_usage": {},
+        "budget_skipped": [],
+        "final_output": "",
+        "error": None
+    }
+
+@pytest.fixture
+def initial_state():
+    """返回一个新的 LangGraph 初始状态"""
+    return _initial_state()
+
+@pytest.fixture(autouse=True)
+def disable_llm_cache(monkeypatch):
+    """测试默认不读写磁盘上的 LLM 缓存"""
+    monkeypatch.setattr(llm_module, "get_llm_cache", lambda: None)
+
+@pytest.fixture(autouse=True)
+def disable_result_store(monkeypatch):
+    """测试默认不写入磁盘上的任务结果存储"""
+    monkeypatch.setattr(task_manager_module, "get_result_store", lambda: None)
+    monkeypatch.setattr(endpoints_module, "get_result_store", lambda: None)
+
+@pytest.fixture(autouse=True)
+def reset_provider_guards():
+    """每个测试使用独立的限流 / 熔断状态"""
+    provider_guards.reset()
+    yield
+    provider_guards.reset()
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """创建 FakeLLM 并替换 LLM 调用层中的 lease_llm"""
+    def factory(**kwargs):
+        llm = FakeLLM(**kwargs)
+        monkeypatch.setattr(llm_module, "lease_llm", lambda config: nullcontext(llm))
+        return llm
+    return factory
@@ -0,0 +1,53 @@
+from app.services.code_aggregator import CodeAggregator, split_go_header, split_java_header
+
+GO_SNIPPETS = [
+    ("create", "c1", 'package main\n\nimport (\n\t"testing"\n\t"net/http"\n\t"encoding/json"\n)\n\n// 创建宠物\nfunc TestCreate(t *testing.T) {\n\tresp, _ := http.Get("http://x")\n\tjson.NewDecoder(resp.Body)\n}'),
+    ("list", "c2", 'import "testing"\nimport h "net/http"\n\nfunc TestList(t *testing.T) {\n\th.Get("http://x")\n}'),
+    ("bare", "c3", 'func TestBare(t *testing.T) {\n\t// strings.Split 只出现在注释中\n\tt.Log(fmt.Sprintf("%d", 1))\n}'),
+    ("failed", "c4", None)
+]
+
+def _entries(snippets):
+    return lambda: iter(snippets)
+
+def test_go_imports_are_merged_into_one_block():
+    output = CodeAggregator.render("go", _entries(GO_SNIPPETS))
+
+    assert output.startswith("package main\n\nimport (\n")
+    assert output.count("package main") == 1 and output.count("import") == 1
+    header = output.split(")\n\n", 1)[0]
+    # 只保留实际用到的包；别名导入单独保留；注释与字符串中的引用不计入
+    assert header.split("(\n", 1)[1].split("\n") == [
+        '\t"encoding/json"', '\t"fmt"', '\t"net/http"', '\th "net/http"', '\t"testing"', ""
+    ]
+    assert "// Test Case: create (c1)\n// 创建宠物\nfunc TestCreate" in output
+    assert "c4" not in output
+
+def test_split_headers_keep_code_and_comments():
+    imports, body = split_go_header('// 说明\nfunc TestX(t *testing.T) {}')
+    assert imports == [] and body == '// 说明\nfunc TestX(t *testing.T) {}'
+    imports, body = split_go_header('package main\nimport (\n\tf "fmt" // 格式化\n\t_ "embed"\n)\nfunc A() {}')
+    assert imports == [("f", "fmt"), ("_", "embed")] and body == "func A() {}"
+
+    imports, body = split_java_header("package demo;\nimport java.util.List;\n\n@Test\npublic void a() {}")
+    assert imports == ["import java.util.List;"] and body == "@Test\npublic void a() {}"
+
+def test_java_imports_hoisted_and_deduplicated():
+    snippets = [
+        ("a", "c1", "import org.junit.Test;\nimport java.util.Map;\n@Test\npublic void a() {}"),
+        ("b", "c2", "import java.util.Map;\n@Test\npublic void b() {}")
+    ]
+    output = CodeAggregator.render("java", _entries(snippets))
+
+    assert output.count("import java.util.Map;") == 1 and output.count("import org.junit.Test;") == 1
+    assert "public class ApiTest {\n\n    // Test Case: a (c1)\n    @Test\n    public void a() {}" in output
+    assert output.endswith("}\n")
+
+def test_large_plans_are_aggregated_in_chunks():
+    snippets = [(f"case {i}", f"c{i}", f"curl http://x/{i}") for i in range(5000)]
+
+    chunks = list(CodeAggregator.iter_chunks("curl", _entries(snippets)))
+
+    assert len(chunks) == 10000
+    assert "".join(chunks) == CodeAggregator.render("curl", _entries(snippets))
+    assert "".join(chunks).count("# Test Case:") == 5000
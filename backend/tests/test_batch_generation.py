@@ -0,0 +1,40 @@
+import asyncio
+from app.agent.graph import agent_app
+from app.agent.nodes import _split_batch_code
+from app.models.schemas import TestCase
+from conftest import PLAN
+
+CASES = [TestCase(**item) for item in PLAN[:3]]
+
+def test_split_batch_code_tolerates_fences_and_missing_end_marker():
+    content = (
+        "preamble\n"
+        "### CASE: test_pets_000\n```bash\necho 0\n```\n### END CASE\n"
+        "### CASE: unknown\necho x\n### END CASE\n"
+        "### CASE: test_pets_001\n\n### END CASE\n"
+        "### CASE: test_pets_002\necho 2\n"
+    )
+    assert _split_batch_code(content, CASES) == {"test_pets_000": "echo 0", "test_pets_002": "echo 2"}
+
+def test_batched_generation_groups_cases_per_operation(fake_llm, initial_state):
+    llm = fake_llm()
+    initial_state["user_preferences"]["batch_size"] = 4
+
+    final_state = agent_app.invoke(initial_state, config={"max_concurrency": 4})
+
+    code_map = final_state["generated_code_map"]
+    assert code_map == {f"test_pets_{i:03d}": f"echo test_pets_{i:03d}" for i in range(6)}
+    # 1 次规划 + 2 次批量调用 (4 + 2)
+    assert llm.calls == 3
+    assert set(final_state["token_usage"]) == {"planner", *code_map}
+
+def test_batched_generation_falls_back_to_single_case(fake_llm, initial_state):
+    llm = fake_llm(batch_drop_ids={"test_pets_001", "test_pets_004"})
+    initial_state["user_preferences"]["batch_size"] = 6
+
+    final_state = asyncio.run(agent_app.ainvoke(initial_state, config={"max_concurrency": 4}))
+
+    code_map = final_state["generated_code_map"]
+    assert code_map == {f"test_pets_{i:03d}": f"echo test_pets_{i:03d}" for i in range(6)}
+    # 1 次规划 + 1 次批量调用 + 2 次单用例回退
+    assert llm.calls == 4
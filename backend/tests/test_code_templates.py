@@ -0,0 +1,90 @@
+import json
+from app.agent.graph import agent_app
+from app.models.schemas import TestCase
+from app.services.code_templates import CodeTemplateService
+from app.services.parser_service import ParserService
+from app.services.rule_planner import RulePlanner
+from test_rule_planner import SPEC
+
+INDEX = ParserService.build_operation_index({**SPEC, "servers": [{"url": "https://api.example.com/v1"}]}, ref_mode="inline")
+
+def _case(**overrides):
+    fields = {
+        "id": "test_get_pet", "name": "get pet", "description": "查询宠物", "endpoint": "/pets/{petId}",
+        "method": "GET", "type": "positive", "expected_status": 200
+    }
+    fields.update(overrides)
+    return TestCase(**fields)
+
+def _render(case, language):
+    return CodeTemplateService.render(case, language, ParserService.lookup_operation(INDEX, case.endpoint, case.method))
+
+def test_renders_rule_cases_for_each_language():
+    case = next(c for c in RulePlanner.plan(SPEC) if c.method == "POST" and c.type == "positive")
+
+    curl = _render(case, "curl")
+    assert "-X POST https://api.example.com/v1/pets \\\n" in curl
+    assert "-H 'Content-Type: application/json'" in curl
+    assert '''-d '{"name": "string", "kind": "cat", "age": 0}')''' in curl
+    assert '[ "$status" = "201" ]' in curl
+
+    go = _render(case, "go")
+    assert go.startswith("func TestRulePostPets000(t *testing.T) {")
+    assert "package" not in go and "import" not in go
+    assert 'body := strings.NewReader("{\\"name\\": \\"string\\", \\"kind\\": \\"cat\\", \\"age\\": 0}")' in go
+    assert "if resp.StatusCode != 201 {" in go
+
+    java = _render(case, "java")
+    assert java.startswith("@Test\npublic void test_rule_post_pets_000() {")
+    assert '.baseUri("https://api.example.com/v1")' in java
+    assert '.request("POST", "/pets")' in java and ".statusCode(201);" in java
+
+def test_simple_positive_case_is_derived_from_schema():
+    code = _render(_case(), "curl")
+    assert "-X GET 'https://api.example.com/v1/pets/1?verbose=true'" in code
+
+def test_llm_planned_case_with_filled_data_requirements_is_templated():
+    # Planner Prompt 要求 LLM 总是填写 data_requirements (例如 "无需特殊数据" / "无")
+    for requirement in ("无需特殊数据", "无"):
+        case = TestCase(**{
+            "id": "test_get_pet_success", "name": "查询宠物成功", "description": "根据 ID 查询宠物",
+            "endpoint": "/pets/{petId}", "method": "GET", "type": "positive", "expected_status": 200,
+            "data_requirements": requirement
+        })
+        assert "if resp.StatusCode != 200 {" in _render(case, "go")
+
+def test_complex_cases_fall_back_to_llm():
+    # 需要特定数据、逆向用例、请求体由 LLM 构造的用例都不由模板覆盖
+    assert _render(_case(data_requirements="需要已存在的宠物"), "curl") is None
+    assert _render(_case(data_requirements="需要先创建一个宠物"), "go") is None
+    assert _render(_case(type="negative", expected_status=404), "go") is None
+    assert _render(_case(endpoint="/pets", method="POST", expected_status=201), "java") is None
+    # request_data 缺少路径参数时无法完整渲染
+    assert _render(_case(request_data={"query": {"verbose": True}}), "curl") is None
+
+def test_templated_cases_skip_llm_generation(fake_llm, initial_state):
+    llm = fake_llm()
+    initial_state["user_preferences"]["template_codegen"] = True
+
+    final_state = agent_app.invoke(initial_state, config={"max_concurrency": 4})
+
+    # 只有 Planner 调用了 LLM，6 个 GET /pets 正向用例全部由模板生成
+    assert llm.calls == 1
+    assert set(final_state["generated_code_map"]) == {f"test_pets_{i:03d}" for i in range(6)}
+    assert "curl -s -o /dev/null" in final_state["final_output"]
+    assert set(final_state["token_usage"]) == {"planner"}
+
+def test_rules_mode_with_templates_makes_no_llm_calls(fake_llm, initial_state):
+    llm = fake_llm()
+    llm.invoke = llm.ainvoke = None
+    # 文档化的 409 需要 LLM 构造触发请求，这里只保留规则能完整确定的状态码
+    spec = json.loads(json.dumps(SPEC))
+    del spec["paths"]["/pets"]["post"]["responses"]["409"]
+    initial_state["openapi_spec_content"] = json.dumps(spec)
+    initial_state["user_preferences"].update({"planning_mode": "rules", "template_codegen": True, "target_language": "go"})
+
+    final_state = agent_app.invoke(initial_state, config={"max_concurrency": 4})
+
+    assert not final_state.get("error")
+    assert set(final_state["generated_code_map"]) == {case.id for case in final_state["test_plan"]}
+    assert all(code.startswith("func Test") for code in final_state["generated_code_map"].values())
@@ -0,0 +1,86 @@
+import json
+import queue
+from app.core.settings import AppSettings, SettingsManager
+from app.models.schemas import TestCase
+from app.services.debug_logger import DebugLogger, _DebugLogWriter
+
+def _use_settings(monkeypatch, **overrides):
+    settings = AppSettings(debug_mode=True, **overrides)
+    monkeypatch.setattr(SettingsManager, "load_settings", staticmethod(lambda: settings))
+    return settings
+
+def test_records_are_compact_jsonl_with_truncation(tmp_path, monkeypatch):
+    log_path = tmp_path / "debug.log"
+    _use_settings(monkeypatch, debug_log_path=str(log_path), debug_log_max_field_chars=10, debug_log_max_items=2)
+    case = TestCase(id="c1", name="n", description="d", endpoint="/p", method="GET", type="positive", expected_status=200)
+
+    DebugLogger.log_node_execution("planner", {}, {"test_plan": [case, case, case], "note": "x" * 50})
+    DebugLogger.log_request("POST", "http://x/api", {"a": 1})
+    DebugLogger.flush()
+
+    lines = log_path.read_text(encoding="utf-8").splitlines()
+    node, request = (json.loads(line) for line in lines[-2:])
+    assert node["node"] == "planner"
+    assert node["output_update"]["note"] == "x" * 10 + "...(truncated 40 chars)"
+    assert node["output_update"]["test_plan"][0]["id"] == "c1"
+    assert node["output_update"]["test_plan"][-1] == "... 1 more items"
+    assert request["type"] == "API_REQUEST"
+
+def test_parser_output_is_summarized_without_walking(tmp_path, monkeypatch):
+    log_path = tmp_path / "debug.log"
+    _use_settings(monkeypatch, debug_log_path=str(log_path))
+    paths = {f"/p{i}": {"get": {}} for i in range(500)}
+    update = {"parse_result": {"openapi": "3.0.0", "paths": paths}, "operation_index": {"GET /p0": "{}"}, "spec_summary": "s"}
+
+    DebugLogger.log_node_execution("parser", {}, update)
+    DebugLogger.flush()
+
+    logged = json.loads(log_path.read_text(encoding="utf-8").splitlines()[-1])["output_update"]
+    assert logged == {"parse_result": {"entries": 2, "paths": 500}, "operation_index": {"entries": 1}, "spec_summary": "s"}
+    # 图中的状态更新不被修改
+    assert update["parse_result"]["paths"] is paths
+
+def test_log_file_is_rotated_by_size(tmp_path, monkeypatch):
+    log_path = tmp_path / "debug.log"
+    _use_settings(monkeypatch, debug_log_path=str(log_path), debug_log_max_bytes=300, debug_log_backup_count=2)
+
+    for i in range(20):
+        DebugLogger.log_request("GET", f"http://x/{i}", {"payload": "y" * 100})
+        DebugLogger.flush()
+
+    assert (tmp_path / "debug.log.1").exists()
+    assert (tmp_path / "debug.log.2").exists()
+    assert not (tmp_path / "debug.log.3").exists()
+    assert log_path.stat().st_size <= 300
+
+def test_disabled_debug_mode_writes_nothing(tmp_path, monkeypatch):
+    settings = AppSettings(debug_mode=False, debug_log_path=str(tmp_path / "debug.log"))
+    monkeypatch.setattr(SettingsManager, "load_settings", staticmethod(lambda: settings))
+    DebugLogger.log_request("GET", "http://x", {})
+    DebugLogger.flush()
+    assert not (tmp_path / "debug.log").exists()
+
+def test_full_queue_drops_instead_of_blocking():
+    writer = _DebugLogWriter.__new__(_DebugLogWriter)
+    writer.queue = queue.Queue(maxsize=1)
+    writer.dropped = 0
+    writer.submit({"a": 1})
+    writer.submit({"a": 2})
+    assert writer.dropped == 1
+
+def test_record_is_snapshotted_before_enqueue(tmp_path, monkeypatch):
+    log_path = tmp_path / "debug.log"
+    _use_settings(monkeypatch, debug_log_path=str(log_path))
+    update = {"generated_code_map": {"c1": "echo 1"}}
+
+    DebugLogger.log_node_execution("generator", {}, update)
+    update["generated_code_map"]["c1"] = "changed"
+    DebugLogger.flush()
+
+    node = json.loads(log_path.read_text(encoding="utf-8").splitlines()[-1])
+    assert node["output_update"]["generated_code_map"]["c1"] == "echo 1"
+
+def test_queue_size_follows_settings(tmp_path, monkeypatch):
+    _use_settings(monkeypatch, debug_log_path=str(tmp_path / "debug.log"), debug_log_queue_size=7)
+    DebugLogger.log_request("GET", "http://x", {})
+    assert DebugLogger._writer.queue.maxsize == 7
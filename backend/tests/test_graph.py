@@ -0,0 +1,76 @@
+import asyncio
+import json
+from app.agent.graph import agent_app
+
+def test_generator_fan_out_is_parallel_and_bounded(fake_llm, initial_state):
+    llm = fake_llm(delay=0.05, fail_ids={"test_pets_003"})
+
+    final_state = agent_app.invoke(initial_state, config={"max_concurrency": 3})
+
+    code_map = final_state["generated_code_map"]
+    assert set(code_map) == {f"test_pets_{i:03d}" for i in range(6)}
+    assert code_map["test_pets_000"] == "echo test_pets_000"
+    assert code_map["test_pets_003"] == "// Error generating code: boom"
+    assert 1 < llm.max_active <= 3
+    assert "# Test Case: case 5 (test_pets_005)" in final_state["final_output"]
+
+def test_async_pipeline_does_not_block_event_loop(fake_llm, initial_state):
+    llm = fake_llm(delay=0.05)
+
+    async def run():
+        ticks = 0
+        task = asyncio.create_task(
+            agent_app.ainvoke(initial_state, config={"max_concurrency": 4})
+        )
+        while not task.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        return await task, ticks
+
+    final_state, ticks = asyncio.run(run())
+    assert len(final_state["generated_code_map"]) == 6
+    assert 1 < llm.max_active <= 4
+    # 事件循环在整个执行期间仍能调度其他协程
+    assert ticks > 5
+
+def test_pipelined_planner_generates_while_streaming(fake_llm, initial_state):
+    fake_llm(delay=0.01)
+    initial_state["user_preferences"]["pipelined"] = True
+
+    async def run():
+        events = []
+        async for mode, chunk in agent_app.astream(
+            initial_state, config={"max_concurrency": 4}, stream_mode=["updates", "custom"]
+        ):
+            events.append((mode, chunk))
+        return events
+
+    events = asyncio.run(run())
+    custom = [chunk["event"] for mode, chunk in events if mode == "custom"]
+    assert custom.count("plan_case") == 6 and custom.count("case") == 6
+    # 首个用例的代码在计划流结束前就已生成完成
+    last_plan_case = len(custom) - 1 - custom[::-1].index("plan_case")
+    assert custom.index("case") < last_plan_case
+    # 所有用例已在 Planner 内生成，不再经过 generator 节点
+    nodes_run = [next(iter(chunk)) for mode, chunk in events if mode == "updates"]
+    assert nodes_run == ["parser", "planner", "aggregator"]
+    planner_update = next(chunk["planner"] for mode, chunk in events if mode == "updates" and "planner" in chunk)
+    assert len(planner_update["generated_code_map"]) == 6
+
+def test_sharded_planning_merges_plans_with_unique_ids(fake_llm, initial_state, monkeypatch):
+    from app.core.settings import AppSettings, SettingsManager
+    settings = AppSettings().model_copy(update={"plan_shard_token_budget": 10})
+    monkeypatch.setattr(SettingsManager, "load_settings", staticmethod(lambda: settings))
+    spec = json.loads(initial_state["openapi_spec_content"])
+    spec["paths"]["/stores"] = {"get": {"summary": "List stores", "responses": {"200": {}}}}
+    initial_state["openapi_spec_content"] = json.dumps(spec)
+    initial_state["user_preferences"]["planning_mode"] = "sharded"
+    fake_llm()
+
+    final_state = agent_app.invoke(initial_state, config={"max_concurrency": 4})
+
+    ids = [case.id for case in final_state["test_plan"]]
+    # 两个分片各返回 6 个用例，重复的 ID 被重命名
+    assert len(ids) == len(set(ids)) == 12
+    assert "test_pets_000_2" in ids
+    assert len(final_state["generated_code_map"]) == 12
@@ -0,0 +1,65 @@
+import json
+from app.agent.graph import agent_app
+from app.agent.runner import build_result
+from conftest import SPEC, FakeMessage
+
+def _run(initial_state, previous=None):
+    if previous is not None:
+        initial_state["user_preferences"]["previous_result"] = previous
+    return agent_app.invoke(initial_state, config={"max_concurrency": 4})
+
+def test_unchanged_spec_reuses_previous_result_without_llm_calls(fake_llm, initial_state):
+    llm = fake_llm()
+    previous = build_result(_run(initial_state))
+    calls_after_first_run = llm.calls
+
+    final_state = _run(initial_state, previous)
+
+    assert llm.calls == calls_after_first_run
+    assert final_state["generated_code_map"] == previous["generated_code"]
+    assert final_state["spec_diff"]["unchanged"] == ["GET /pets"]
+    assert "# Test Case: case 0 (test_pets_000)" in final_state["final_output"]
+
+def test_added_operation_is_planned_alone(fake_llm, initial_state):
+    llm = fake_llm()
+    previous = build_result(_run(initial_state))
+
+    spec = json.loads(SPEC)
+    spec["paths"]["/owners"] = {"get": {"summary": "List owners", "responses": {"200": {}}}}
+    initial_state["openapi_spec_content"] = json.dumps(spec)
+    prompts = []
+    owner_case = {
+        "id": "test_owners_000", "name": "owners", "description": "list owners",
+        "endpoint": "/owners", "method": "GET", "type": "positive", "expected_status": 200
+    }
+
+    def invoke(messages):
+        prompt = messages[-1].content
+        prompts.append(prompt)
+        if "测试计划" in prompt:
+            return FakeMessage(json.dumps([owner_case]))
+        return FakeMessage("echo owners")
+    llm.invoke = invoke
+
+    final_state = _run(initial_state, previous)
+
+    # 只为新增的 /owners 规划一次、生成一次
+    assert len(prompts) == 2
+    assert "/owners" in prompts[0] and "/pets" not in prompts[0]
+    assert final_state["spec_diff"]["added"] == ["GET /owners"]
+    code_map = final_state["generated_code_map"]
+    assert code_map["test_owners_000"] == "echo owners"
+    assert all(code_map[case_id] == code for case_id, code in previous["generated_code"].items())
+    assert [case.id for case in final_state["test_plan"]][:6] == [f"test_pets_{i:03d}" for i in range(6)]
+
+def test_failed_cases_are_regenerated_on_incremental_run(fake_llm, initial_state):
+    fake_llm(fail_ids={"test_pets_003"})
+    previous = build_result(_run(initial_state))
+    assert previous["generated_code"]["test_pets_003"].startswith("// Error generating code:")
+
+    llm = fake_llm()
+    final_state = _run(initial_state, previous)
+
+    # 只有上次失败的用例重新生成，无需重新规划
+    assert llm.calls == 1
+    assert final_state["generated_code_map"]["test_pets_003"] == "echo test_pets_003"
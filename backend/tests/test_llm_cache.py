@@ -0,0 +1,113 @@
+import json
+import time
+from app.agent.nodes import parser_node, planner_node
+from app.core import llm as llm_module
+from app.models.schemas import LLMConfig
+from app.services import llm_cache as llm_cache_module
+from app.services.llm_cache import LLMCache
+from conftest import FakeMessage, PLAN
+
+CONFIG = LLMConfig(base_url="http://llm/v1/chat/completions", api_key="k", model_name="m", tier="high")
+
+def test_key_depends_on_model_parameters():
+    key = LLMCache.make_key("prompt", "m", "http://llm/v1", 0.2)
+    assert key == LLMCache.make_key("prompt", "m", "http://llm/v1", 0.2)
+    assert key != LLMCache.make_key("prompt", "m2", "http://llm/v1", 0.2)
+    assert key != LLMCache.make_key("prompt", "m", "http://other/v1", 0.2)
+    assert key != LLMCache.make_key("prompt", "m", "http://llm/v1", 0.7)
+
+def test_memory_lru_and_disk_tier(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = LLMCache(path, memory_max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.set(key, key.upper())
+
+    # "a" 已被挤出内存，但仍可从 SQLite 读回
+    assert cache.get("c") == "C"
+    assert cache.get("a") == "A"
+    stats = cache.get_stats()
+    assert stats["memory_hits"] == 1 and stats["disk_hits"] == 1
+    cache.close()
+
+    reopened = LLMCache(path)
+    assert reopened.get("b") == "B"
+    assert reopened.get("missing") is None
+    assert reopened.get_stats()["misses"] == 1
+
+def test_ttl_and_disk_size_eviction(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.db"), disk_max_entries=2, ttl_seconds=60)
+    cache.set("old", "1")
+    cache._memory["old"] = ("1", time.time() - 120)
+    cache._db().execute("UPDATE llm_cache SET created_at = ? WHERE key = 'old'", (time.time() - 120,))
+    assert cache.get("old") is None
+
+    for key in ("x", "y", "z"):
+        cache.set(key, key)
+    assert cache._db().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] == 2
+    assert cache.get_stats()["evictions"] == 1
+
+def test_disk_entry_count_is_tracked_and_expired_rows_purged(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache_module, "PURGE_EVERY_WRITES", 3)
+    path = str(tmp_path / "cache.db")
+    cache = LLMCache(path, ttl_seconds=60)
+    cache.set("a", "1")
+    cache.set("a", "2")
+    assert cache.get_stats()["disk_entries"] == 1
+    cache._db().execute("UPDATE llm_cache SET created_at = ? WHERE key = 'a'", (time.time() - 120,))
+
+    # 第 3 次写入触发过期清理
+    cache.set("b", "1")
+    assert cache._db().execute("SELECT key FROM llm_cache").fetchall() == [("b",)]
+    assert cache.get_stats()["disk_entries"] == 1
+    cache.close()
+    assert LLMCache(path).get_stats()["disk_entries"] == 1
+
+def test_invoke_llm_hits_cache_and_honors_bypass(tmp_path, monkeypatch, fake_llm):
+    cache = LLMCache(str(tmp_path / "cache.db"))
+    monkeypatch.setattr(llm_module, "get_llm_cache", lambda: cache)
+    llm = fake_llm()
+    calls = []
+    original = llm.invoke
+    llm.invoke = lambda messages: calls.append(1) or original(messages)
+
+    prompt = "测试计划 please"
+    first, first_usage = llm_module.invoke_llm(CONFIG, prompt)
+    second, second_usage = llm_module.invoke_llm(CONFIG, prompt)
+    assert first == second
+    assert len(calls) == 1
+    assert first_usage["calls"] == 1 and first_usage["prompt_tokens"] > 0
+    assert second_usage["cached_calls"] == 1 and second_usage["prompt_tokens"] == 0
+
+    llm_module.invoke_llm(CONFIG, prompt, use_cache=False)
+    assert len(calls) == 2
+
+def test_rejected_output_is_not_cached(tmp_path, monkeypatch, fake_llm):
+    cache = LLMCache(str(tmp_path / "cache.db"))
+    monkeypatch.setattr(llm_module, "get_llm_cache", lambda: cache)
+    llm = fake_llm()
+    calls = []
+    original = llm.invoke
+    llm.invoke = lambda messages: calls.append(1) or original(messages)
+    prompt = "测试计划 please"
+
+    # 调用方的校验拒绝输出 (例如无法解析的计划) 时不写入缓存，重试会重新请求
+    llm_module.invoke_llm(CONFIG, prompt, validate=lambda content: False)
+    llm_module.invoke_llm(CONFIG, prompt, validate=lambda content: False)
+    assert len(calls) == 2 and cache.get_stats()["disk_entries"] == 0
+
+    # 已缓存但未通过校验的条目视为未命中
+    cache.set(llm_module._cache_key(CONFIG, prompt), "not a plan")
+    content, usage = llm_module.invoke_llm(CONFIG, prompt, validate=lambda content: content != "not a plan")
+    assert content != "not a plan" and usage["calls"] == 1 and len(calls) == 3
+    assert llm_module.invoke_llm(CONFIG, prompt)[1]["cached_calls"] == 1
+
+def test_unparsable_plan_is_retried_instead_of_served_from_cache(tmp_path, monkeypatch, fake_llm, initial_state):
+    cache = LLMCache(str(tmp_path / "cache.db"))
+    monkeypatch.setattr(llm_module, "get_llm_cache", lambda: cache)
+    llm = fake_llm()
+    replies = iter(["sorry, no plan", json.dumps(PLAN)])
+    llm.invoke = lambda messages: FakeMessage(next(replies))
+    state = {**initial_state, **parser_node(initial_state)}
+
+    assert planner_node(state)["error"].startswith("Planning failed")
+    assert len(planner_node(state)["test_plan"]) == len(PLAN)
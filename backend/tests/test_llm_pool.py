@@ -0,0 +1,91 @@
+import random
+from contextlib import nullcontext
+import pytest
+from app.agent.runner import build_run_config
+from app.core import llm as llm_module
+from app.core import resilience
+from app.core.llm import invoke_llm, resolve_backends
+from app.core.resilience import Failover, ProviderGuard, call_with_failover
+from app.core.settings import AppSettings
+from app.models.schemas import LLMBackend, LLMConfig
+from conftest import FakeMessage
+from test_llm_resilience import Flaky, _status_error
+
+CONFIG = LLMConfig(
+    base_url="http://primary/v1", api_key="k1", model_name="m", tier="low",
+    backends=[
+        LLMBackend(base_url="http://secondary/v1/chat/completions", api_key="k2", weight=2),
+        LLMBackend(base_url="http://primary/v1/", api_key="k1"),
+        LLMBackend(base_url="http://primary/v1", api_key="k3", model_name="m-fast")
+    ]
+)
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(resilience.time, "sleep", recorded.append)
+    return recorded
+
+def _guards(n):
+    settings = AppSettings(llm_retry_base_delay=5, llm_retry_max_delay=5)
+    return [ProviderGuard(f"b{i}", settings) for i in range(n)]
+
+def test_resolve_backends_dedupes_and_inherits_model():
+    backends = resolve_backends(CONFIG)
+
+    assert [(b.base_url, b.api_key, b.model_name) for b in backends] == [
+        ("http://primary/v1", "k1", "m"),
+        ("http://secondary/v1/chat/completions", "k2", "m"),
+        ("http://primary/v1", "k3", "m-fast")
+    ]
+    assert all(b.tier == "low" and b.backends is None for b in backends)
+    assert build_run_config(AppSettings(max_concurrency=4), CONFIG) == {"max_concurrency": 12}
+
+def test_failover_moves_to_healthy_backend_without_waiting(sleeps):
+    guards = _guards(2)
+    broken = Flaky(100, _status_error(503))
+    healthy = Flaky(0, None)
+
+    random.seed(0)
+    results = [call_with_failover(guards, 10, lambda i: (broken, healthy)[i]())[1] for _ in range(20)]
+
+    assert results == ["ok"] * 20
+    assert sleeps == []
+    assert healthy.calls == 20
+    assert guards[0].error_rate > 0 and guards[1].error_rate == 0.0
+
+def test_routing_prefers_low_latency_and_respects_weights():
+    guards = _guards(3)
+    for guard, latency in zip(guards, (0.1, 1.0, 1.0)):
+        guard.end(latency, True)
+    failover = Failover(guards, 10, weights=[1, 1, 3])
+
+    random.seed(1)
+    picks = [failover._choose([0, 1, 2]) for _ in range(3000)]
+
+    # 分数比例约为 10 : 1 : 3
+    assert picks.count(0) > 1800 and picks.count(2) > 2 * picks.count(1)
+
+def test_invoke_llm_fails_over_across_pool(monkeypatch, sleeps):
+    served = []
+
+    class Backend:
+        def __init__(self, config):
+            self.config = config
+
+        def invoke(self, messages):
+            served.append(self.config.base_url)
+            if self.config.base_url == "http://primary/v1":
+                raise _status_error(429, {"retry-after": "30"})
+            return FakeMessage(f"from {self.config.api_key}")
+
+    monkeypatch.setattr(llm_module, "lease_llm", lambda config: nullcontext(Backend(config)))
+    random.seed(2)
+    config = CONFIG.model_copy(update={"backends": [LLMBackend(base_url="http://secondary/v1", api_key="k2")]})
+
+    contents = [invoke_llm(config, f"prompt {i}")[0] for i in range(5)]
+
+    assert contents == ["from k2"] * 5
+    # Retry-After 对后续调用同样生效，主后端最多被请求一次
+    assert served.count("http://primary/v1") <= 1 and served.count("http://secondary/v1") == 5
+    assert sleeps == []
@@ -0,0 +1,47 @@
+from app.core.llm import LLMClientRegistry
+from app.models.schemas import LLMConfig
+
+def _config(**overrides):
+    data = {"base_url": "http://llm/v1/chat/completions", "api_key": "k", "model_name": "m", "tier": "high"}
+    data.update(overrides)
+    return LLMConfig(**data)
+
+def test_registry_reuses_clients_and_shares_provider_pool():
+    registry = LLMClientRegistry(pool_size=4, idle_seconds=60)
+    first = registry.get(_config())
+    # URL 规范化后相同的配置复用同一实例
+    assert registry.get(_config(base_url="http://llm/v1/")) is first
+
+    other_model = registry.get(_config(model_name="m2"))
+    assert other_model is not first
+    assert other_model.http_client is first.http_client
+    assert registry.size() == (2, 1)
+
+    registry.get(_config(base_url="http://other/v1"))
+    assert registry.size() == (3, 2)
+
+def test_registry_evicts_idle_clients_and_closes_pool():
+    registry = LLMClientRegistry(pool_size=4, idle_seconds=60)
+    first = registry.get(_config())
+    registry.idle_seconds = -1
+    registry.get(_config(base_url="http://other/v1"))
+
+    assert registry.size() == (1, 1)
+    assert first.http_client.is_closed
+
+def test_registry_uses_finite_timeouts():
+    registry = LLMClientRegistry(pool_size=4, idle_seconds=60, connect_timeout=3, read_timeout=30)
+    client = registry.get(_config()).http_client
+    assert client.timeout.connect == 3 and client.timeout.read == 30
+
+def test_leased_pool_is_closed_only_after_the_call_ends():
+    registry = LLMClientRegistry(pool_size=4, idle_seconds=60)
+    with registry.lease(_config()) as llm:
+        # 空闲淘汰与配置变化都不会关闭进行中调用的连接池
+        registry.idle_seconds = -1
+        registry.get(_config(base_url="http://other/v1"))
+        assert not llm.http_client.is_closed
+        registry.configure(pool_size=8, idle_seconds=60)
+        assert not llm.http_client.is_closed
+    assert llm.http_client.is_closed
+    assert llm.http_async_client.is_closed
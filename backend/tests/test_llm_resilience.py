@@ -0,0 +1,120 @@
+import asyncio
+import httpx
+import openai
+import pytest
+from app.core import resilience
+from app.core.llm import invoke_llm
+from app.core.resilience import LLMUnavailableError, ProviderGuard, TokenBucket, acall_with_failover, call_with_failover, retry_after_seconds
+from app.core.settings import AppSettings
+from app.models.schemas import LLMConfig
+
+def _status_error(status, headers=None):
+    response = httpx.Response(status, headers=headers or {}, request=httpx.Request("POST", "http://llm/chat/completions"))
+    error_class = openai.RateLimitError if status == 429 else openai.InternalServerError
+    return error_class("provider error", response=response, body=None)
+
+def _guard(**overrides):
+    settings = AppSettings(**{"llm_retry_base_delay": 0.01, "llm_retry_max_delay": 0.01, **overrides})
+    return ProviderGuard("test", settings)
+
+class Flaky:
+    """前 failures 次调用抛出 error，之后返回 "ok" """
+
+    def __init__(self, failures, error):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return "ok"
+
+def _call(guard, call):
+    # 单个 Provider 的后端池: 只有重试与熔断，没有转移目标
+    return call_with_failover([guard], 100, lambda index: call())[1]
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(resilience.time, "sleep", recorded.append)
+    return recorded
+
+def test_token_bucket_spaces_out_requests_beyond_capacity():
+    bucket = TokenBucket(per_minute=60)
+    assert [bucket.reserve() for _ in range(60)] == [0.0] * 60
+    waits = [bucket.reserve() for _ in range(3)]
+    assert waits[0] == pytest.approx(1.0, abs=0.05) and waits[2] == pytest.approx(3.0, abs=0.05)
+    assert TokenBucket(per_minute=0).reserve(10 ** 6) == 0.0
+
+def test_retry_after_header_formats():
+    assert retry_after_seconds(_status_error(429, {"retry-after": "7"})) == 7.0
+    assert retry_after_seconds(_status_error(429, {"retry-after-ms": "1500"})) == 1.5
+    assert retry_after_seconds(_status_error(429, {"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+    assert retry_after_seconds(RuntimeError("boom")) is None
+
+def test_retries_transient_errors_and_honors_retry_after(sleeps):
+    guard = _guard()
+    call = Flaky(2, _status_error(429, {"retry-after": "3"}))
+
+    assert _call(guard, call) == "ok"
+    assert call.calls == 3
+    assert sleeps == pytest.approx([3.0, 3.0], abs=0.05)
+    assert guard.breaker.state == "closed" and guard.breaker.failures == 0
+
+def test_non_retryable_errors_fail_immediately(sleeps):
+    guard = _guard()
+    call = Flaky(1, RuntimeError("bad request"))
+
+    with pytest.raises(RuntimeError):
+        _call(guard, call)
+    assert call.calls == 1 and sleeps == []
+    assert guard.breaker.failures == 0
+
+def test_circuit_opens_and_sheds_load_until_probe_succeeds(sleeps):
+    guard = _guard(llm_max_retries=1, llm_circuit_failure_threshold=2, llm_circuit_reset_seconds=60)
+    failing = Flaky(10, _status_error(503))
+
+    with pytest.raises(openai.InternalServerError):
+        _call(guard, failing)
+    assert guard.breaker.state == "open" and failing.calls == 2
+
+    healthy = Flaky(0, None)
+    with pytest.raises(LLMUnavailableError):
+        _call(guard, healthy)
+    assert healthy.calls == 0
+
+    # 冷却结束后放行一个探测请求，成功则恢复
+    guard.breaker.opened_at -= 60
+    assert _call(guard, healthy) == "ok"
+    assert guard.breaker.state == "closed"
+
+def test_async_calls_retry_without_blocking():
+    guard = _guard()
+    call = Flaky(1, _status_error(500))
+
+    async def run():
+        async def invoke():
+            return call()
+        return (await acall_with_failover([guard], 100, lambda index: invoke()))[1]
+
+    assert asyncio.run(run()) == "ok"
+    assert call.calls == 2
+
+def test_invoke_llm_retries_provider_errors(fake_llm, initial_state, sleeps):
+    llm = fake_llm()
+    original = llm.invoke
+    failures = [_status_error(503)]
+
+    def invoke(messages):
+        if failures:
+            raise failures.pop()
+        return original(messages)
+
+    llm.invoke = invoke
+    config = initial_state["user_preferences"]["llm_config"]
+    content, usage = invoke_llm(LLMConfig(**config), "生成测试计划")
+
+    assert "test_pets_000" in content and usage["calls"] == 1
+    assert len(sleeps) == 1
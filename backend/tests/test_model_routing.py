@@ -0,0 +1,125 @@
+import asyncio
+import json
+from contextlib import nullcontext
+import pytest
+from app.agent.graph import agent_app
+from app.agent.runner import summarize_usage
+from app.core import llm as llm_module
+from app.services.code_validator import CodeValidator
+from conftest import FakeMessage, PLAN
+
+STRONG = {"base_url": "http://strong", "api_key": "k", "model_name": "strong", "tier": "high"}
+FAST = {"base_url": "http://fast", "api_key": "k", "model_name": "fast", "tier": "low"}
+
+class RoutedLLM:
+    """按模型名返回不同输出的假 LLM: fast 模型对 bad_ids 中的用例输出无效代码，bad_plan 时输出无法解析的计划"""
+
+    def __init__(self, model_name, bad_ids=(), bad_plan=False):
+        self.model_name = model_name
+        self.bad_ids = set(bad_ids)
+        self.bad_plan = bad_plan
+        self.prompts = []
+
+    def _code(self, case_id):
+        if case_id in self.bad_ids:
+            return f"echo {case_id}"
+        return f"curl http://api/{case_id} # {self.model_name}"
+
+    def invoke(self, messages):
+        prompt = messages[-1].content
+        self.prompts.append(prompt)
+        if "### CASE:" in prompt:
+            return FakeMessage("\n".join(
+                f"### CASE: {c['id']}\n{self._code(c['id'])}\n### END CASE" for c in PLAN if c["id"] in prompt
+            ))
+        case = next((c for c in PLAN if c["name"] in prompt), None)
+        if case is None:
+            return FakeMessage("sorry, no plan" if self.bad_plan else json.dumps(PLAN))
+        return FakeMessage(self._code(case["id"]))
+
+    async def ainvoke(self, messages):
+        return self.invoke(messages)
+
+@pytest.fixture
+def routed_llms(monkeypatch):
+    def factory(**fast_kwargs):
+        llms = {"strong": RoutedLLM("strong"), "fast": RoutedLLM("fast", **fast_kwargs)}
+        monkeypatch.setattr(llm_module, "lease_llm", lambda config: nullcontext(llms[config.model_name]))
+        return llms
+    return factory
+
+def test_code_validator_checks_structure():
+    assert CodeValidator.check("  ", "curl") == "empty output"
+    assert CodeValidator.check("echo hi", "curl") == "missing curl command"
+    assert CodeValidator.check('func TestX(t *testing.T) {\n\tt.Log("}")\n}', "go") is None
+    assert CodeValidator.check("func TestX(t *testing.T) {\n", "go") == "unclosed '{'"
+    assert CodeValidator.check("public void a() {}", "java") == "missing @Test method"
+    assert CodeValidator.check("@Test\npublic void a() { char c = '}'; }", "java") is None
+
+def test_generator_stage_escalates_invalid_case_only(routed_llms, initial_state):
+    llms = routed_llms(bad_ids={"test_pets_002"})
+    prefs = initial_state["user_preferences"]
+    prefs["llm_config"] = STRONG
+    prefs["generator_llm_config"] = FAST
+
+    final_state = agent_app.invoke(initial_state, config={"max_concurrency": 4})
+
+    code_map = final_state["generated_code_map"]
+    assert code_map["test_pets_002"] == "curl http://api/test_pets_002 # strong"
+    assert all(code.endswith("# fast") for case_id, code in code_map.items() if case_id != "test_pets_002")
+    # 规划使用 llm_config，6 个用例由 fast 模型生成，只有 1 个升级
+    assert len(llms["strong"].prompts) == 2
+    assert len(llms["fast"].prompts) == 6
+    # 升级时沿用生成阶段 (低层级策略) 的 Prompt
+    assert llms["strong"].prompts[1] in llms["fast"].prompts
+    usage = final_state["token_usage"]
+    assert usage["test_pets_002"]["calls"] == 2 and usage["test_pets_002"]["escalations"] == 1
+    assert "escalations" not in usage["test_pets_000"]
+    assert summarize_usage(usage)["total"]["escalations"] == 1
+
+@pytest.mark.parametrize("run_async", [False, True])
+def test_batch_invalid_blocks_escalate_directly(routed_llms, initial_state, run_async):
+    llms = routed_llms(bad_ids={"test_pets_001"})
+    prefs = initial_state["user_preferences"]
+    prefs.update(llm_config=STRONG, generator_llm_config=FAST, batch_size=6)
+
+    config = {"max_concurrency": 4}
+    if run_async:
+        final_state = asyncio.run(agent_app.ainvoke(initial_state, config=config))
+    else:
+        final_state = agent_app.invoke(initial_state, config=config)
+
+    code_map = final_state["generated_code_map"]
+    assert code_map["test_pets_001"] == "curl http://api/test_pets_001 # strong"
+    assert code_map["test_pets_000"] == "curl http://api/test_pets_000 # fast"
+    # fast 模型只有 1 次批量调用，无效代码块直接升级，不再以 fast 模型单独重试
+    assert len(llms["fast"].prompts) == 1
+    assert len(llms["strong"].prompts) == 2
+    assert "### CASE:" not in llms["strong"].prompts[1]
+    usage = final_state["token_usage"]["test_pets_001"]
+    assert usage["escalations"] == 1 and usage["calls"] == 1
+
+def test_planner_stage_escalates_unparsable_plan(routed_llms, initial_state):
+    llms = routed_llms(bad_plan=True)
+    prefs = initial_state["user_preferences"]
+    prefs.update(llm_config=STRONG, planner_llm_config=FAST)
+
+    final_state = asyncio.run(agent_app.ainvoke(initial_state, config={"max_concurrency": 4}))
+
+    assert final_state.get("error") is None
+    assert [case.id for case in final_state["test_plan"]] == [c["id"] for c in PLAN]
+    assert final_state["token_usage"]["planner"]["escalations"] == 1
+    # 代码生成未单独配置，使用 llm_config
+    assert len(llms["fast"].prompts) == 1
+
+def test_escalation_can_be_disabled(routed_llms, initial_state):
+    routed_llms(bad_ids={"test_pets_002"}, bad_plan=True)
+    prefs = initial_state["user_preferences"]
+    prefs.update(llm_config=STRONG, generator_llm_config=FAST, escalate_on_failure=False)
+
+    final_state = agent_app.invoke(initial_state, config={"max_concurrency": 4})
+    assert final_state["generated_code_map"]["test_pets_002"] == "echo test_pets_002"
+
+    prefs["planner_llm_config"] = FAST
+    final_state = agent_app.invoke(initial_state, config={"max_concurrency": 4})
+    assert final_state["error"].startswith("Planning failed")
@@ -1,3 +1,4 @@
+import json
 import pytest
 from app.services.parser_service import ParserService
 from fastapi import HTTPException
@@ -40,3 +41,112 @@ def test_simplify_spec():
     assert "/test" in summary
     assert "GET" in summary
     assert "id" in summary
+
+REF_SPEC = {
+    "openapi": "3.0.0",
+    "servers": [{"url": "http://api.local"}],
+    "paths": {
+        "/pets/{petId}": {
+            "parameters": [{"name": "petId", "in": "path", "required": True}],
+            "get": {"responses": {"200": {"content": {"application/json": {"schema": {"$ref": "#/components/schemas/Pet"}}}}}}
+        },
+        "/stores": {
+            "get": {"responses": {"200": {"content": {"application/json": {"schema": {"$ref": "#/components/schemas/Store"}}}}}}
+        }
+    },
+    "components": {
+        "schemas": {
+            "Pet": {"type": "object", "properties": {"owner": {"$ref": "#/components/schemas/Owner"}}},
+            "Owner": {"type": "object", "properties": {"pets": {"type": "array", "items": {"$ref": "#/components/schemas/Pet"}}}},
+            "Store": {"type": "object"}
+        }
+    }
+}
+
+def test_operation_index_contains_only_referenced_components():
+    index = ParserService.build_operation_index(REF_SPEC)
+    assert set(index) == {("/pets/{petId}", "GET"), ("/stores", "GET")}
+
+    pet_slice = json.loads(index[("/pets/{petId}", "GET")])
+    assert set(pet_slice["shared_schemas"]) == {"#/components/schemas/Pet", "#/components/schemas/Owner"}
+    assert pet_slice["paths"]["/pets/{petId}"]["GET"]["parameters"][0]["name"] == "petId"
+    assert pet_slice["servers"] == [{"url": "http://api.local"}]
+    assert "/stores" not in pet_slice["paths"]
+
+def test_lookup_operation_matches_concrete_paths():
+    index = ParserService.build_operation_index(REF_SPEC)
+    expected = index[("/pets/{petId}", "GET")]
+    assert ParserService.lookup_operation(index, "/pets/{petId}", "get") == expected
+    assert ParserService.lookup_operation(index, "/pets/42?verbose=1", "GET") == expected
+    assert ParserService.lookup_operation(index, "/pets/42", "DELETE") is None
+    assert ParserService.lookup_operation(index, "/unknown", "GET") is None
+
+def test_shard_spec_groups_by_tag_and_respects_budget():
+    spec = {
+        "openapi": "3.0.0",
+        "paths": {
+            "/pets": {"get": {"tags": ["pets"], "description": "x" * 400}, "post": {"tags": ["pets"], "description": "x" * 400}},
+            "/stores": {"get": {"tags": ["stores"], "description": "y" * 400}},
+            "/users/{id}": {"get": {"description": "z" * 400}},
+            "/users": {"post": {"description": "z" * 400}}
+        }
+    }
+    # 预算足够时所有分组合并为一个分片
+    assert len(ParserService.shard_spec(spec, token_budget=100000)) == 1
+
+    shards = [json.loads(s) for s in ParserService.shard_spec(spec, token_budget=400)]
+    paths = [sorted(shard["paths"]) for shard in shards]
+    assert paths == [["/pets"], ["/stores"], ["/users", "/users/{id}"]]
+    # 同一 tag 下的操作没有被拆到不同分片
+    assert set(shards[0]["paths"]["/pets"]) == {"GET", "POST"}
+
+def test_operation_hashes_ignore_docs_but_track_referenced_schemas():
+    def spec(summary, pet_type):
+        return {
+            "openapi": "3.0.0",
+            "paths": {
+                "/pets": {"get": {"summary": summary, "responses": {"200": {"content": {"application/json": {"schema": {"$ref": "#/components/schemas/Pet"}}}}}}},
+                "/owners": {"get": {"responses": {"200": {}}}}
+            },
+            "components": {"schemas": {"Pet": {"type": "object", "properties": {"name": {"type": pet_type}}}}}
+        }
+
+    base = ParserService.operation_hashes(spec("List pets", "string"))
+    reworded = ParserService.operation_hashes(spec("List all pets", "string"))
+    retyped = ParserService.operation_hashes(spec("List pets", "integer"))
+
+    assert base == reworded
+    diff = ParserService.diff_operations(base, retyped)
+    assert diff["changed"] == ["GET /pets"] and diff["unchanged"] == ["GET /owners"]
+    assert ParserService.diff_operations({"GET /old": "x"}, base)["removed"] == ["GET /old"]
+
+def test_sniff_format_and_fallbacks():
+    assert ParserService.sniff_format('﻿  {"openapi": "3.0.0"}') == "json"
+    assert ParserService.sniff_format("openapi: 3.0.0") == "yaml"
+    # JSON 嗅探失败 (尾随逗号) 时回退到 YAML 解析
+    assert ParserService.parse_spec_content('{"openapi": "3.0.0", "paths": {},}')["openapi"] == "3.0.0"
+    with pytest.raises(HTTPException):
+        ParserService.parse_spec_content("openapi: [unclosed")
+
+def test_yaml_spec_skips_json_attempt(monkeypatch):
+    def fail(_):
+        raise AssertionError("json.loads should not be called for YAML content")
+    monkeypatch.setattr(json, "loads", fail)
+    assert ParserService.parse_spec_content("openapi: 3.0.0\npaths: {}\n")["paths"] == {}
+
+def test_parser_node_caches_by_content_hash(monkeypatch, initial_state):
+    from app.agent.nodes import parser_node
+    from app.services.spec_cache import spec_cache
+
+    spec_cache.clear()
+    calls = []
+    original = ParserService.parse_spec_content
+    monkeypatch.setattr(ParserService, "parse_spec_content", staticmethod(lambda content: calls.append(1) or original(content)))
+
+    first = parser_node(initial_state)
+    second = parser_node(initial_state)
+
+    assert len(calls) == 1
+    assert second["parse_result"] is first["parse_result"]
+    assert second["operation_index"] is first["operation_index"]
+    assert spec_cache.get_stats()["hits"] >= 2
@@ -0,0 +1,82 @@
+import json
+from app.services.parser_service import ParserService
+from app.services.ref_resolver import RefResolver
+
+SPEC = {
+    "openapi": "3.0.0",
+    "paths": {
+        "/nodes": {
+            "post": {
+                "requestBody": {"content": {"application/json": {"schema": {"$ref": "#/components/schemas/Node"}}}},
+                "parameters": [{"$ref": "#/components/parameters/Limit"}]
+            }
+        }
+    },
+    "components": {
+        "schemas": {
+            "Node": {"type": "object", "properties": {"children": {"type": "array", "items": {"$ref": "#/components/schemas/Node"}}, "meta": {"$ref": "#/components/schemas/Meta"}}},
+            "Meta": {"type": "object", "properties": {"a": {"$ref": "#/components/schemas/Leaf"}, "b": {"$ref": "#/components/schemas/Leaf"}}},
+            "Leaf": {"type": "string", "maxLength": 8},
+            "Unused": {"type": "integer"}
+        },
+        "parameters": {"Limit": {"name": "limit", "in": "query", "schema": {"type": "integer"}}}
+    }
+}
+
+def test_index_and_memoized_resolution():
+    resolver = RefResolver(SPEC)
+    assert "#/components/schemas/Leaf" in resolver.index
+    assert resolver.resolve("#/components/schemas/Meta/properties/a") == {"$ref": "#/components/schemas/Leaf"}
+    assert resolver.resolve("#/components/schemas/Missing") is None
+    assert resolver.collect_refs(SPEC["paths"]) == [
+        "#/components/schemas/Node",
+        "#/components/parameters/Limit",
+        "#/components/schemas/Meta",
+        "#/components/schemas/Leaf",
+    ]
+
+def test_inline_detects_cycles_and_respects_depth():
+    resolver = RefResolver(SPEC)
+    node = resolver.inline({"$ref": "#/components/schemas/Node"}, max_depth=5)
+    assert node["properties"]["children"]["items"] == {"$ref": "#/components/schemas/Node", "x-circular": True}
+    assert node["properties"]["meta"]["properties"]["a"] == {"type": "string", "maxLength": 8}
+
+    shallow = resolver.inline({"$ref": "#/components/schemas/Node"}, max_depth=1)
+    assert shallow["properties"]["meta"] == {"$ref": "#/components/schemas/Meta"}
+
+def test_inline_reuse_does_not_blow_up():
+    # 每一层都引用下一层两次，未记忆化时展开代价为 2^depth
+    schemas = {f"L{i}": {"type": "object", "properties": {"x": {"$ref": f"#/components/schemas/L{i + 1}"}, "y": {"$ref": f"#/components/schemas/L{i + 1}"}}} for i in range(40)}
+    schemas["L40"] = {"type": "string"}
+    resolver = RefResolver({"components": {"schemas": schemas}})
+    resolver.inline({"$ref": "#/components/schemas/L0"}, max_depth=50)
+    assert len(resolver._inline_cache) <= 41
+
+def test_simplify_spec_emits_shared_table_or_inlines():
+    shared = json.loads(ParserService.simplify_spec(SPEC))
+    assert set(shared["shared_schemas"]) == {
+        "#/components/schemas/Node", "#/components/schemas/Meta",
+        "#/components/schemas/Leaf", "#/components/parameters/Limit"
+    }
+    assert "#/components/schemas/Unused" not in shared["shared_schemas"]
+
+    inlined = json.loads(ParserService.simplify_spec(SPEC, ref_mode="inline", inline_depth=2))
+    assert "shared_schemas" not in inlined
+    assert inlined["paths"]["/nodes"]["POST"]["parameters"][0]["name"] == "limit"
+
+def test_inline_result_does_not_depend_on_expansion_order():
+    schemas = {
+        "Shop": {"type": "object", "properties": {"owner": {"$ref": "#/components/schemas/Owner"}}},
+        "Owner": {"type": "object", "properties": {"pet": {"$ref": "#/components/schemas/Pet"}}},
+        "Pet": {"type": "object", "properties": {"owner": {"$ref": "#/components/schemas/Owner"}}}
+    }
+    spec = {"components": {"schemas": schemas}}
+    shop = {"$ref": "#/components/schemas/Shop"}
+    expected = RefResolver(spec).inline(shop, max_depth=5)
+
+    # 共享的解析器先展开过 Pet，再展开 Shop 时结果不变
+    resolver = RefResolver(spec)
+    resolver.inline({"$ref": "#/components/schemas/Pet"}, max_depth=5)
+    assert resolver.inline(shop, max_depth=5) == expected
+    pet = expected["properties"]["owner"]["properties"]["pet"]
+    assert pet["properties"]["owner"] == {"$ref": "#/components/schemas/Owner", "x-circular": True}
@@ -0,0 +1,71 @@
+import asyncio
+import time
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import task_manager as task_manager_module
+from app.api.v1 import endpoints as endpoints_module
+from app.services.result_store import ResultStore
+from app.services.task_manager import TaskManager
+
+RESULT = {
+    "test_plan": [{"id": f"c{i}", "name": f"case {i}", "endpoint": "/pets", "method": "GET"} for i in range(5)],
+    "generated_code": {f"c{i}": f"echo {i}" for i in range(4)},
+    "token_usage": {"total": {"prompt_tokens": 10}},
+    "budget_skipped": ["c4"],
+    "operation_hashes": {"GET /pets": "abc"},
+    "spec_diff": {}
+}
+
+def test_store_round_trips_and_paginates(tmp_path):
+    store = ResultStore(str(tmp_path / "results.db"))
+    store.save("t1", "completed", RESULT, "final file", timings={"duration_seconds": 1.5})
+
+    assert store.get_result("t1") == RESULT
+    assert store.get_task("t1", ["final_output", "case_count"]) == {"task_id": "t1", "final_output": "final file", "case_count": 5}
+    page = store.list_cases("t1", offset=2, limit=2, fields=["id", "code"])
+    assert page == [{"id": "c2", "code": "echo 2"}, {"id": "c3", "code": "echo 3"}]
+    assert store.get_case("t1", "c4")["code"] is None
+    assert store.get_task("missing") is None
+    assert list(store.iter_final_output("t1", chunk_chars=4)) == ["fina", "l fi", "le"]
+
+def test_store_purges_expired_tasks(tmp_path):
+    store = ResultStore(str(tmp_path / "results.db"), retention_seconds=60)
+    store.save("old", "completed", RESULT)
+    store._db().execute("UPDATE tasks SET finished_at = ?", (time.time() - 120,))
+    store.save("new", "failed", error="boom")
+
+    assert store.get_task("old") is None
+    assert store.list_cases("old") == []
+    assert store.get_task("new", ["status", "error"]) == {"task_id": "new", "status": "failed", "error": "boom"}
+
+def test_finished_task_is_persisted_and_served_from_store(tmp_path, monkeypatch, fake_llm, initial_state):
+    fake_llm()
+    store = ResultStore(str(tmp_path / "results.db"))
+    monkeypatch.setattr(task_manager_module, "get_result_store", lambda: store)
+    monkeypatch.setattr(endpoints_module, "get_result_store", lambda: store)
+    manager = TaskManager(max_workers=1, ttl_seconds=60)
+    monkeypatch.setattr(endpoints_module, "task_manager", manager)
+
+    async def run():
+        manager.submit("task-1", initial_state, {"max_concurrency": 2})
+        while not manager.get("task-1").persisted:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    record = manager.get("task-1")
+    assert record.status == "completed" and record.result is None
+
+    with TestClient(app) as client:
+        result = client.get("/api/v1/tasks/task-1/result").json()
+        page = client.get("/api/v1/tasks/task-1/cases", params={"offset": 4, "limit": 10, "fields": "id,code"}).json()
+        artifacts = client.get("/api/v1/tasks/task-1/artifacts", params={"fields": "status,timings"}).json()
+        bad_fields = client.get("/api/v1/tasks/task-1/cases", params={"fields": "nope"})
+        output = client.get("/api/v1/tasks/task-1/output")
+
+    assert result["status"] == "completed" and len(result["result"]["generated_code"]) == 6
+    assert page["total"] == 6
+    assert page["items"] == [{"id": "test_pets_004", "code": "echo test_pets_004"}, {"id": "test_pets_005", "code": "echo test_pets_005"}]
+    assert artifacts["status"] == "completed"
+    assert "planner" in artifacts["timings"]["stages"]
+    assert bad_fields.status_code == 400
+    assert output.status_code == 200 and "# Test Case: case 5 (test_pets_005)" in output.text
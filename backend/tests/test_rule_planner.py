@@ -0,0 +1,138 @@
+import json
+from app.agent.graph import agent_app
+from app.services.rule_planner import RulePlanner, sample_value
+
+SPEC = {
+    "openapi": "3.0.0",
+    "info": {"title": "Pets", "version": "1.0"},
+    "paths": {
+        "/pets": {
+            "post": {
+                "summary": "Create pet",
+                "requestBody": {"content": {"application/json": {"schema": {"$ref": "#/components/schemas/NewPet"}}}},
+                "responses": {"201": {}, "400": {}, "409": {"description": "duplicate"}}
+            }
+        },
+        "/pets/{petId}": {
+            "parameters": [{"name": "petId", "in": "path", "required": True, "schema": {"type": "integer", "minimum": 1}}],
+            "get": {
+                "parameters": [{"name": "verbose", "in": "query", "required": True, "schema": {"type": "boolean"}}],
+                "responses": {"200": {}, "404": {}}
+            }
+        }
+    },
+    "components": {"schemas": {"NewPet": {
+        "type": "object",
+        "required": ["name", "kind"],
+        "properties": {
+            "name": {"type": "string", "minLength": 2, "maxLength": 8},
+            "kind": {"type": "string", "enum": ["cat", "dog"]},
+            "age": {"type": "integer", "minimum": 0, "maximum": 30}
+        }
+    }}}
+}
+
+def _by_name(cases):
+    return {case.name: case for case in cases}
+
+def test_positive_cases_use_schema_derived_requests():
+    cases = RulePlanner.plan(SPEC, include_boundary=False, include_negative=False)
+
+    assert [(c.endpoint, c.method, c.type, c.expected_status) for c in cases] == [
+        ("/pets", "POST", "positive", 201),
+        ("/pets/{petId}", "GET", "positive", 200)
+    ]
+    assert cases[0].request_data == {"body": {"name": "string", "kind": "cat", "age": 0}}
+    assert cases[1].request_data == {"path_params": {"petId": 1}, "query": {"verbose": True}}
+    assert cases[0].id == "rule_post_pets_000"
+
+def test_negative_and_boundary_rules():
+    cases = _by_name(RulePlanner.plan(SPEC, include_boundary=True, include_negative=True))
+
+    missing = cases["Create pet - 缺少必填字段 kind"]
+    assert missing.expected_status == 400 and "kind" not in missing.request_data["body"]
+    assert cases["Create pet - 字段 age 类型错误"].request_data["body"]["age"] == "not-a-number"
+    assert cases["Create pet - 字段 kind 枚举值越界"].request_data["body"]["kind"] == "INVALID_ENUM_VALUE"
+    conflict = cases["Create pet - 返回 409"]
+    # 规则无法构造触发 409 的请求，交给 LLM 按描述构造
+    assert conflict.expected_status == 409 and conflict.request_data is None and conflict.data_requirements == "duplicate"
+    over = cases["Create pet - name 长度超过 maxLength (9)"]
+    assert over.type == "boundary" and over.expected_status == 400 and over.request_data["body"]["name"] == "a" * 9
+    assert cases["Create pet - age 等于 maximum (30)"].expected_status == 201
+    assert "GET /pets/{petId} - 缺少必填参数 verbose" in cases
+    assert cases["GET /pets/{petId} - 返回 404"].request_data["path_params"] == {"petId": 999999999}
+    # 字符串类型的 query 参数传入数字仍是合法字符串，不生成类型错误用例
+    assert cases["GET /pets/{petId} - 字段 verbose 类型错误"].request_data["query"]["verbose"] == "not-a-boolean"
+
+def test_documented_statuses_without_distinct_request_fall_back_to_llm():
+    spec = {"openapi": "3.0.0", "paths": {"/pets": {"get": {
+        "parameters": [{"name": "q", "in": "query", "required": True, "schema": {"type": "string"}}],
+        "responses": {"200": {}, "403": {}, "409": {}}
+    }}}}
+    cases = _by_name(RulePlanner.plan(spec, include_negative=True))
+
+    assert "GET /pets - 字段 q 类型错误" not in cases
+    forbidden, conflict = cases["GET /pets - 返回 403"], cases["GET /pets - 返回 409"]
+    assert forbidden.request_data is None and forbidden.data_requirements == "使用无权限的身份调用"
+    assert conflict.request_data is None
+
+def test_include_flags_are_honored():
+    cases = RulePlanner.plan(SPEC, include_boundary=False, include_negative=False)
+    assert {c.type for c in cases} == {"positive"}
+    cases = RulePlanner.plan(SPEC, include_boundary=True, include_negative=False)
+    assert {c.type for c in cases} == {"positive", "boundary"}
+
+def test_sample_value_respects_formats_and_lengths():
+    assert sample_value({"type": "string", "format": "email"}) == "user@example.com"
+    assert sample_value({"type": "string", "minLength": 10}) == "stringaaaa"
+    assert sample_value({"type": "array", "items": {"type": "integer", "exclusiveMinimum": 5}}) == [6]
+
+def test_rules_mode_skips_llm_planning(fake_llm, initial_state):
+    llm = fake_llm()
+    initial_state["openapi_spec_content"] = json.dumps(SPEC)
+    initial_state["user_preferences"]["planning_mode"] = "rules"
+    plan_prompts = []
+    original = llm.invoke
+    llm.invoke = lambda messages: plan_prompts.append(1) if "测试计划" in messages[-1].content else original(messages)
+
+    state = {**initial_state}
+    from app.agent.nodes import parser_node, planner_node
+    state.update(parser_node(state))
+    update = planner_node(state)
+
+    assert plan_prompts == []
+    assert update["token_usage"]["planner"]["calls"] == 0
+    assert len(update["test_plan"]) == len(RulePlanner.plan(SPEC, include_negative=True))
+
+def test_rules_mode_with_enrichment_drops_duplicates(fake_llm, initial_state):
+    fake_llm()
+    initial_state["user_preferences"]["planning_mode"] = "rules"
+    initial_state["user_preferences"]["enrich_plan"] = True
+
+    final_state = agent_app.invoke(initial_state, config={"max_concurrency": 4})
+
+    # FakeLLM 的 6 个用例都是 GET /pets 200 positive，与规则生成的正向用例重复
+    assert [case.id for case in final_state["test_plan"]] == ["rule_get_pets_000"]
+
+def test_numeric_exclusive_bounds_and_long_strings():
+    spec = {
+        "openapi": "3.1.0",
+        "info": {"title": "T", "version": "1"},
+        "paths": {"/items": {"get": {
+            "summary": "List items",
+            "parameters": [
+                {"name": "limit", "in": "query", "required": True, "schema": {"type": "integer", "exclusiveMinimum": 0, "exclusiveMaximum": 100}},
+                {"name": "q", "in": "query", "required": True, "schema": {"type": "string", "maxLength": 10000000}}
+            ],
+            "responses": {"200": {}}
+        }}}
+    }
+    cases = _by_name(RulePlanner.plan(spec, include_boundary=True, include_negative=False))
+
+    assert cases["List items - 正常请求"].request_data["query"]["limit"] == 1
+    assert cases["List items - limit 等于 exclusiveMaximum (100)"].expected_status == 400
+    assert cases["List items - limit 略小于 exclusiveMaximum (100)"].request_data["query"]["limit"] == 99
+    assert cases["List items - limit 等于 exclusiveMinimum (0)"].request_data["query"]["limit"] == 0
+    # 超长的 maxLength 不生成边界用例
+    assert not any("maxLength" in name for name in cases)
+    assert sample_value({"type": "integer", "exclusiveMaximum": 0}) == -1
@@ -0,0 +1,40 @@
+import os
+import pytest
+from app.core import settings as settings_module
+from app.core.settings import AppSettings, SettingsManager
+
+@pytest.fixture
+def settings_file(tmp_path, monkeypatch):
+    path = tmp_path / "config.toml"
+    monkeypatch.setattr(settings_module, "SETTINGS_FILE", str(path))
+    monkeypatch.setattr(settings_module, "LEGACY_SETTINGS_FILE", str(tmp_path / "settings.json"))
+    monkeypatch.setattr(SettingsManager, "_cached", None)
+    monkeypatch.setattr(SettingsManager, "_cached_signature", None)
+    return path
+
+def test_load_settings_is_cached_until_file_changes(settings_file, monkeypatch):
+    settings_file.write_text('model_name = "a"\n', encoding="utf-8")
+    first = SettingsManager.load_settings()
+    assert first.model_name == "a"
+
+    reads = []
+    original = SettingsManager._read_settings
+    monkeypatch.setattr(SettingsManager, "_read_settings", staticmethod(lambda: reads.append(1) or original()))
+    assert SettingsManager.load_settings() is first
+    assert reads == []
+
+    settings_file.write_text('model_name = "bb"\n', encoding="utf-8")
+    assert SettingsManager.load_settings().model_name == "bb"
+    assert reads == [1]
+
+def test_save_settings_is_atomic_and_refreshes_cache(settings_file):
+    saved = AppSettings(model_name="saved", max_concurrency=3)
+    SettingsManager.save_settings(saved)
+
+    assert SettingsManager.load_settings() is saved
+    assert 'model_name = "saved"' in settings_file.read_text(encoding="utf-8")
+    # 不残留临时文件
+    assert os.listdir(settings_file.parent) == ["config.toml"]
+
+def test_missing_file_returns_defaults(settings_file):
+    assert SettingsManager.load_settings().model_name == AppSettings().model_name
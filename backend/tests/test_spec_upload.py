@@ -0,0 +1,86 @@
+import asyncio
+import gzip
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from app.core.settings import AppSettings, SettingsManager
+from app.main import app
+from app.services import spec_upload as spec_upload_module
+from app.services.spec_cache import spec_cache
+from app.services.spec_upload import SpecUploadService
+from conftest import SPEC
+
+@pytest.fixture
+def upload_settings(tmp_path, monkeypatch):
+    settings = AppSettings(upload_dir=str(tmp_path / "uploads"), upload_max_bytes=4096, upload_spool_max_memory=16)
+    monkeypatch.setattr(SettingsManager, "load_settings", staticmethod(lambda: settings))
+    spec_cache.clear()
+    return settings
+
+def test_raw_upload_then_generate_from_spec_id(upload_settings, fake_llm, initial_state):
+    fake_llm()
+    with TestClient(app) as client:
+        uploaded = client.post("/api/v1/specs", content=SPEC.encode(), headers={"Content-Type": "application/yaml"}).json()
+        response = client.post("/api/v1/generate", json={
+            "spec_id": uploaded["spec_id"],
+            "target_language": "curl",
+            "llm_config": initial_state["user_preferences"]["llm_config"]
+        })
+
+    assert uploaded["size"] == len(SPEC.encode()) and uploaded["format"] == "json"
+    body = response.json()
+    assert body["status"] == "completed"
+    assert len(body["result"]["generated_code"]) == 6
+
+def test_gzip_upload_is_decompressed_and_deduplicated(upload_settings):
+    yaml_spec = "openapi: 3.0.0\npaths: {}\n"
+    with TestClient(app) as client:
+        plain = client.post("/api/v1/specs", content=yaml_spec.encode()).json()
+        packed = client.post("/api/v1/specs", content=gzip.compress(yaml_spec.encode()), headers={"Content-Encoding": "gzip"}).json()
+        corrupt = client.post("/api/v1/specs", content=b"not gzip", headers={"Content-Encoding": "gzip"})
+
+    assert packed == plain and plain["format"] == "yaml"
+    assert corrupt.status_code == 400
+
+def test_upload_limit_applies_to_decompressed_size(upload_settings):
+    bomb = gzip.compress(b"a" * 100_000)
+    assert len(bomb) < upload_settings.upload_max_bytes
+    with TestClient(app) as client:
+        response = client.post("/api/v1/specs", content=bomb, headers={"Content-Encoding": "gzip"})
+        too_long = client.post("/api/v1/specs", content=b"x" * 5000)
+    assert response.status_code == 413
+    assert too_long.status_code == 413
+
+def test_multipart_upload_is_rejected(upload_settings):
+    with TestClient(app) as client:
+        response = client.post("/api/v1/specs", content=b"--x\r\n", headers={"Content-Type": "multipart/form-data; boundary=x"})
+    assert response.status_code == 415
+
+def test_generate_request_requires_exactly_one_spec_source(initial_state):
+    payload = {"target_language": "curl", "llm_config": initial_state["user_preferences"]["llm_config"]}
+    with TestClient(app) as client:
+        assert client.post("/api/v1/generate", json=payload).status_code == 422
+        both = {**payload, "openapi_content": SPEC, "spec_id": "0" * 64}
+        assert client.post("/api/v1/generate", json=both).status_code == 422
+
+def test_chunks_are_written_off_the_event_loop(upload_settings, monkeypatch):
+    threads = []
+    original = spec_upload_module.tempfile.SpooledTemporaryFile
+
+    class RecordingSpool(original):
+        def write(self, data):
+            threads.append(threading.get_ident())
+            return super().write(data)
+
+    monkeypatch.setattr(spec_upload_module.tempfile, "SpooledTemporaryFile", RecordingSpool)
+
+    async def chunks():
+        for i in range(0, len(SPEC), 32):
+            yield SPEC[i:i + 32].encode()
+
+    async def run():
+        return threading.get_ident(), await SpecUploadService.receive(chunks())
+
+    loop_thread, result = asyncio.run(run())
+    assert result["size"] == len(SPEC.encode())
+    assert threads and loop_thread not in threads
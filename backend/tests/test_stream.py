@@ -0,0 +1,44 @@
+import json
+from fastapi.testclient import TestClient
+from app.main import app
+
+def _parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def test_stream_emits_events_in_pipeline_order(fake_llm, initial_state):
+    fake_llm(delay=0.01)
+    payload = {
+        "openapi_content": initial_state["openapi_spec_content"],
+        "target_language": "curl",
+        "llm_config": initial_state["user_preferences"]["llm_config"]
+    }
+
+    with TestClient(app) as client:
+        response = client.post("/api/v1/generate/stream", json=payload)
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _parse_sse(response.text)
+    names = [name for name, _ in events]
+    assert names[:3] == ["task", "parser", "plan"]
+    assert names[3:-1] == ["case"] * 6
+    assert names[-1] == "final"
+    assert len(events[2][1]["test_plan"]) == 6
+    assert "# Test Case: case 0 (test_pets_000)" in events[-1][1]["final_output"]
+
+def test_stream_reports_parser_error(fake_llm):
+    fake_llm()
+    payload = {
+        "openapi_content": '{"info": {}}',
+        "target_language": "curl",
+        "llm_config": {"base_url": "http://llm", "api_key": "k", "model_name": "m", "tier": "low"}
+    }
+
+    with TestClient(app) as client:
+        response = client.post("/api/v1/generate/stream", json=payload)
+
+    events = _parse_sse(response.text)
+    assert [name for name, _ in events] == ["task", "error"]
@@ -0,0 +1,21 @@
+import json
+from app.utils.stream_json import IncrementalArrayParser
+
+def test_elements_are_emitted_as_soon_as_they_close():
+    text = 'Here is the plan:\n```json\n[{"id": "a", "note": "brace } and [ in string \\" quote"}, {"id": "b", "nested": {"x": [1, {"y": 2}]}}]\n```'
+    parser = IncrementalArrayParser()
+    emitted = []
+    for i, ch in enumerate(text):
+        for raw in parser.feed(ch):
+            emitted.append((i, raw))
+
+    assert [json.loads(raw)["id"] for _, raw in emitted] == ["a", "b"]
+    # 第一个元素在第二个元素开始之前就已产出
+    assert emitted[0][0] < text.index('{"id": "b"')
+    assert parser.finished
+
+def test_python_style_repetition_is_kept_verbatim():
+    parser = IncrementalArrayParser()
+    out = parser.feed('[{"name": "a" * 3}, ')
+    assert out == ['{"name": "a" * 3}']
+    assert not parser.finished
@@ -0,0 +1,51 @@
+import asyncio
+import time
+from app.services.task_manager import JobStore, TaskManager, TaskRecord
+
+def test_job_store_evicts_only_expired_finished_tasks():
+    store = JobStore(ttl_seconds=60)
+    running = TaskRecord("running")
+    fresh = TaskRecord("fresh")
+    stale = TaskRecord("stale")
+    fresh.finish("completed", result={})
+    stale.finish("failed", error="boom")
+    stale.finished_at = time.time() - 120
+    for record in (running, fresh, stale):
+        store.put(record)
+
+    assert store.get("stale") is None
+    assert store.get("fresh") is fresh
+    assert store.get("running") is running
+    assert len(store) == 2
+
+def test_submit_returns_immediately_and_tracks_progress(fake_llm, initial_state):
+    fake_llm(delay=0.02)
+    manager = TaskManager(max_workers=2, ttl_seconds=60)
+
+    async def run():
+        record = manager.submit("task-1", initial_state, {"max_concurrency": 2})
+        assert record.status == "processing"
+        assert record.progress.stage == "queued"
+        while manager.get("task-1").status == "processing":
+            await asyncio.sleep(0.01)
+        return manager.get("task-1")
+
+    record = asyncio.run(run())
+    assert record.status == "completed"
+    assert record.progress.completed == record.progress.total == 6
+    assert len(record.result["generated_code"]) == 6
+    assert record.to_status().progress.stage == "done"
+
+def test_budget_skipped_cases_are_excluded_from_total():
+    record = TaskRecord("budget")
+    TaskManager._track_progress(record, {"planner": {"test_plan": [object()] * 6, "budget_skipped": ["a", "b", "c", "d"]}})
+    TaskManager._track_progress(record, {"generator": {"generated_code_map": {"x": "1"}}})
+    TaskManager._track_progress(record, {"generator": {"generated_code_map": {"y": "2"}}})
+    assert record.progress.completed == record.progress.total == 2
+
+def test_code_written_by_planner_counts_as_completed():
+    record = TaskRecord("incremental")
+    plan = [object()] * 3
+    TaskManager._track_progress(record, {"planner": {"test_plan": plan, "generated_code_map": {"a": "1", "b": "2"}}})
+    TaskManager._track_progress(record, {"generator": {"generated_code_map": {"c": "3"}}})
+    assert record.progress.completed == record.progress.total == 3
@@ -0,0 +1,80 @@
+import asyncio
+from fastapi.testclient import TestClient
+from app.agent.graph import agent_app
+from app.agent.nodes import estimate_case_tokens, parser_node, planner_node
+from app.agent.runner import build_result
+from app.main import app
+
+def test_usage_is_recorded_per_node_and_per_case(fake_llm, initial_state):
+    fake_llm()
+
+    final_state = agent_app.invoke(initial_state, config={"max_concurrency": 4})
+    usage = build_result(final_state)["token_usage"]
+
+    assert usage["by_node"]["planner"]["calls"] == 1
+    assert set(usage["by_case"]) == {f"test_pets_{i:03d}" for i in range(6)}
+    assert usage["by_node"]["generator"]["calls"] == 6
+    # FakeLLM 不返回 usage_metadata，用量来自本地估算
+    assert usage["total"]["estimated"] is True
+    assert usage["total"]["prompt_tokens"] == (
+        usage["by_node"]["planner"]["prompt_tokens"] + usage["by_node"]["generator"]["prompt_tokens"]
+    )
+
+def test_token_budget_caps_generated_cases(fake_llm, initial_state):
+    fake_llm()
+    state = {**initial_state, **parser_node(initial_state)}
+    planned = planner_node(state)
+    plan = planned["test_plan"]
+    planner_cost = planned["token_usage"]["planner"]
+    per_case = estimate_case_tokens({**state, "test_plan": plan}, plan[0])
+    # 预算只够 Planner 加两个用例
+    initial_state["user_preferences"]["token_budget"] = (
+        planner_cost["prompt_tokens"] + planner_cost["completion_tokens"] + 2 * per_case + 1
+    )
+
+    final_state = agent_app.invoke(initial_state, config={"max_concurrency": 4})
+
+    assert len(final_state["test_plan"]) == 6
+    assert set(final_state["generated_code_map"]) == {"test_pets_000", "test_pets_001"}
+    assert final_state["budget_skipped"] == [f"test_pets_{i:03d}" for i in range(2, 6)]
+
+def test_token_budget_below_planner_prompt_fails_early(fake_llm, initial_state):
+    llm = fake_llm()
+    calls = []
+    llm.invoke = lambda messages: calls.append(1)
+    initial_state["user_preferences"]["token_budget"] = 10
+
+    final_state = agent_app.invoke(initial_state)
+
+    assert "exceed the token budget" in final_state["error"]
+    assert calls == []
+
+def test_pipelined_planner_respects_token_budget(fake_llm, initial_state):
+    fake_llm()
+    initial_state["user_preferences"]["pipelined"] = True
+    initial_state["user_preferences"]["token_budget"] = 2000
+
+    final_state = asyncio.run(agent_app.ainvoke(initial_state, config={"max_concurrency": 4}))
+
+    skipped = final_state["budget_skipped"]
+    assert 0 < len(skipped) < 6
+    assert len(final_state["generated_code_map"]) == 6 - len(skipped)
+    assert not set(skipped) & set(final_state["generated_code_map"])
+
+def test_estimate_endpoint_does_not_call_llm(fake_llm, initial_state):
+    llm = fake_llm()
+    llm.invoke = llm.ainvoke = None
+    payload = {
+        "openapi_content": initial_state["openapi_spec_content"],
+        "target_language": "curl",
+        "llm_config": initial_state["user_preferences"]["llm_config"]
+    }
+
+    with TestClient(app) as client:
+        response = client.post("/api/v1/generate/estimate", json=payload)
+
+    assert response.status_code == 200
+    estimate = response.json()
+    assert estimate["planner_prompts"] == 1 and estimate["planner_prompt_tokens"] > 0
+    assert [(op["endpoint"], op["method"]) for op in estimate["operations"]] == [("/pets", "GET")]
+    assert estimate["operations"][0]["estimated_tokens"] > estimate["estimated_completion_tokens_per_case"]